@@ -0,0 +1,455 @@
+"""
+Async (ASGI) entry point, served by uvicorn or gunicorn's UvicornWorker (see the root asgi.py).
+
+The I/O-bound routes are coroutines: generation (job queue and SSE stream), job status,
+the website listing, reading a website and serving exported previews. They use Motor and
+the async Gemini client, so a generation waiting on the model holds no thread and one
+process can keep thousands in flight. Every other route (auth, writes, batch, admin,
+/metrics and the frontend) is the unchanged Flask app, mounted as a WSGI app and run in a
+thread pool; the async handlers return the same JSON and status codes as their Flask
+counterparts.
+"""
+import asyncio
+import contextlib
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import wraps
+
+import jwt as pyjwt
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.routing import Mount, Route
+
+from app import create_app, mongo
+from app.middleware.acl import permission_cache
+from app.middleware.compression import choose_encoding, compress, encoded_etag, etag_matches, response_compressor
+from app.middleware.identity import Identity, token_cache
+from app.middleware.rate_limit import rate_limiter
+from app.routes.website import (
+    LIST_PROJECTION, WEBSITE_PROJECTION, build_list_query, serialize_site_summary, serialize_website, sse_event
+)
+from app.services.async_db import async_mongo
+from app.services.generation import is_valid_generation
+from app.services.jobs import async_generation_jobs, serialize_job
+from app.services.json_provider import dumps_bytes
+from app.services.llm_client import CircuitOpenError
+from app.services.metrics import HTTP_REQUEST_DURATION, RATE_LIMITED_REQUESTS
+from app.services.pagination import aread_page, find_page, parse_page_args
+from app.services.site_export import export_website_safely, site_exporter
+from app.services.view_model import attach_view_model
+
+logger = logging.getLogger(__name__)
+
+class JSONResponse(StarletteJSONResponse):
+    """JSON response encoded like the Flask app's (ObjectId and datetime included, orjson if installed)."""
+
+    def render(self, content):
+        return dumps_bytes(content)
+
+# --- Authentication ---
+
+def _unauthorized(msg):
+    # Same bodies as the JWT error loaders registered in create_app
+    return JSONResponse({'msg': msg}, status_code=401)
+
+async def authorize(request, permission):
+    """
+    Async counterpart of permission_required. Returns (Identity, None) if the request's
+    access token is valid and its role has 'permission', else (None, error response).
+    Tokens go through the same per-worker token cache; on a miss the token is verified by
+    flask_jwt_extended's decode_token, with the app's algorithms, audience, issuer and leeway.
+    The permission mapping is read without a thread hop while it is fresh, and refreshed from
+    MongoDB in a thread otherwise.
+    """
+    flask_app = request.app.state.flask_app
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) != 2 or parts[0] != 'Bearer':
+        return None, _unauthorized('Missing Authorization Header or Token')
+
+    digest = token_cache.digest(parts[1])
+    current_user = token_cache.get(digest)
+    if current_user is None:
+        try:
+            with flask_app.app_context():
+                claims = decode_token(parts[1])
+        except pyjwt.ExpiredSignatureError:
+            return None, _unauthorized('Token has expired')
+        except (pyjwt.InvalidTokenError, JWTExtendedException):
+            return None, _unauthorized('Signature verification failed or token is malformed')
+        current_user = claims.get(flask_app.config['JWT_IDENTITY_CLAIM'])
+        # Refresh tokens are not accepted in place of access tokens
+        if claims.get('type') != 'access' or not isinstance(current_user, dict):
+            return None, _unauthorized('Signature verification failed or token is malformed')
+        token_cache.put(digest, current_user, claims.get('exp'))
+
+    user_role = current_user.get('role')
+    fresh, role_permissions = permission_cache.peek(user_role)
+    if not fresh:
+        role_permissions = await run_in_threadpool(permission_cache.get_role_permissions, user_role, mongo.db)
+
+    if role_permissions is None:
+        return None, JSONResponse({"msg": f"Role '{user_role}' not recognized or has no defined permissions."}, status_code=403)
+    if permission not in role_permissions:
+        return None, JSONResponse({"msg": f"Permission denied: Missing '{permission}' permission for role '{user_role}'"}, status_code=403)
+    return Identity(current_user.get('id'), user_role, role_permissions), None
+
+async def throttle(scope, key):
+    """
+    Async counterpart of rate_limited: returns the 429 response if (scope, key) is over its
+    limit, else None. Shared buckets are updated in a thread; memory buckets only take a lock.
+    """
+    if rate_limiter.store is rate_limiter.memory:
+        allowed, retry_after = rate_limiter.hit(scope, key)
+    else:
+        allowed, retry_after = await run_in_threadpool(rate_limiter.hit, scope, key)
+    if allowed:
+        return None
+    RATE_LIMITED_REQUESTS.labels(scope).inc()
+    seconds = max(1, math.ceil(retry_after))
+    return JSONResponse(
+        {'msg': 'Too many requests. Please try again later.', 'retry_after': seconds},
+        status_code=429, headers={'Retry-After': str(seconds)}
+    )
+
+def _accept_encodings(header):
+    # 'br;q=1.0, gzip;q=0.5' -> {'br': 1.0, 'gzip': 0.5}; missing encodings read as 0
+    accepted = defaultdict(float)
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+def compress_response(request, response):
+    """
+    Async counterpart of ResponseCompressor.after_request, for the buffered responses of the
+    async routes (streamed ones are sent as they are).
+    """
+    if not response_compressor.enabled or isinstance(response, StreamingResponse):
+        return response
+    if not response_compressor.compressible(response.status_code, response.media_type,
+                                            response.headers.get('Content-Encoding'), len(response.body)):
+        return response
+
+    response.headers.append('Vary', 'Accept-Encoding')
+    encoding = choose_encoding(_accept_encodings(request.headers.get('Accept-Encoding', '')))
+    if encoding is None:
+        return response
+    response.body = compress(response.body, encoding, response_compressor.gzip_level, response_compressor.brotli_quality)
+    response.headers['Content-Length'] = str(len(response.body))
+    response.headers['Content-Encoding'] = encoding
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        tag = encoded_etag(etag.strip('"'), encoding)
+        response.headers['ETag'] = f'"{tag}"'
+    return response
+
+def async_route(endpoint, permission=None, rate_limit=None):
+    """
+    Decorates an async handler: times it under the Flask endpoint name it replaces, so
+    /metrics series are the same in both serving modes, and authorizes it if 'permission'
+    is given (the handler then receives the Identity as its second argument). 'rate_limit'
+    names the scope whose per-user limit applies, as rate_limited does for the Flask route.
+    Large JSON bodies are compressed as the Flask app's are.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        async def handler(request):
+            started = time.perf_counter()
+            if permission is None:
+                response = await fn(request)
+            else:
+                identity, response = await authorize(request, permission)
+                if identity is not None and rate_limit is not None:
+                    response = await throttle(rate_limit, identity.id)
+                if identity is not None and response is None:
+                    response = await fn(request, identity)
+            response = compress_response(request, response)
+            HTTP_REQUEST_DURATION.labels(endpoint, request.method, str(response.status_code)).observe(
+                time.perf_counter() - started
+            )
+            return response
+        return handler
+    return wrapper
+
+async def _json_body(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+# --- Website routes ---
+
+@async_route('website.generate_website', 'create_site', rate_limit='generate')
+async def generate_website(request, identity):
+    data = await _json_body(request)
+    business_type = data.get('business_type')
+    industry = data.get('industry')
+
+    if not business_type or not industry:
+        return JSONResponse({'msg': 'Business type and industry are required'}, status_code=400)
+
+    try:
+        job_id = await async_generation_jobs.submit(identity.id, business_type, industry)
+    except Exception as e:
+        logger.exception("generate_website failed: %s", e)
+        return JSONResponse({'msg': 'Internal Server Error queuing website generation', 'error_details': str(e)}, status_code=500)
+
+    return JSONResponse(
+        {'msg': 'Website generation started', 'job_id': job_id, 'status': 'queued'},
+        status_code=202, headers={'Location': f"/api/jobs/{job_id}"}
+    )
+
+@async_route('website.generate_website_stream', 'create_site', rate_limit='generate')
+async def generate_website_stream(request, identity):
+    data = await _json_body(request)
+    business_type = data.get('business_type')
+    industry = data.get('industry')
+
+    if not business_type or not industry:
+        return JSONResponse({'msg': 'Business type and industry are required'}, status_code=400)
+
+    flask_app = request.app.state.flask_app
+    backend = flask_app.extensions['generation_backend']
+
+    async def events():
+        generated_content = {}
+        try:
+            async for section, value in backend.astream_sections(business_type, industry):
+                generated_content[section] = value
+                yield sse_event('section', {'section': section, 'value': value})
+        except CircuitOpenError:
+            yield sse_event('error', {'msg': 'AI generation is temporarily unavailable. Please try again shortly.'})
+            return
+        except Exception as e:
+            logger.exception("generate_website_stream failed: %s", e)
+            yield sse_event('error', {'msg': 'AI generation failed. Please try again.'})
+            return
+
+        if not is_valid_generation(generated_content):
+            yield sse_event('error', {'msg': 'AI failed to generate valid services. Please try again or retry with different inputs.'})
+            return
+
+        try:
+            site_data = {
+                'owner': identity.id,
+                'business_type': business_type,
+                'industry': industry,
+                'content': generated_content,
+                'created_at': datetime.utcnow(),
+                'last_updated': datetime.utcnow()
+            }
+            result = await async_mongo.db.websites.insert_one(attach_view_model(site_data))
+            await asyncio.to_thread(_export_in_app_context, flask_app, site_data)
+            yield sse_event('done', {'msg': 'Website created successfully', 'id': str(result.inserted_id)})
+        except Exception as e:
+            logger.exception("generate_website_stream failed: %s", e)
+            yield sse_event('error', {'msg': 'Internal Server Error saving website'})
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _export_in_app_context(flask_app, site_data):
+    with flask_app.app_context():
+        export_website_safely(site_data)
+
+@async_route('website.get_generation_job', 'create_site')
+async def get_generation_job(request, identity):
+    try:
+        job = await async_generation_jobs.get(request.path_params['job_id'])
+        if not job:
+            return JSONResponse({'msg': 'Job not found'}, status_code=404)
+
+        if identity.role != 'Admin' and job.get('owner') != identity.id:
+            return JSONResponse({'msg': 'Permission denied'}, status_code=403)
+
+        return JSONResponse(serialize_job(job))
+    except Exception as e:
+        logger.exception("get_generation_job failed: %s", e)
+        return JSONResponse({'msg': 'Internal Server Error retrieving job', 'error_details': str(e)}, status_code=500)
+
+@async_route('website.list_websites', 'list_all_sites')
+async def list_websites(request, identity):
+    try:
+        limit, after = parse_page_args(request.query_params)
+        query = build_list_query(identity, request.query_params)
+    except ValueError as e:
+        return JSONResponse({'msg': str(e)}, status_code=400)
+
+    try:
+        # find_page only chains find/sort/limit, which Motor collections provide too
+        websites_cursor = find_page(async_mongo.db_for('website').websites, query, LIST_PROJECTION, limit, after)
+        return JSONResponse(await aread_page(websites_cursor, limit, serialize_site_summary))
+    except Exception as e:
+        logger.exception("list_websites failed: %s", e)
+        return JSONResponse({"msg": "Internal Server Error loading websites", "error_details": str(e)}, status_code=500)
+
+@async_route('website.get_website', 'read_site')
+async def get_website(request, identity):
+    try:
+        site = await async_mongo.db.websites.find_one({'_id': ObjectId(request.path_params['id'])}, WEBSITE_PROJECTION)
+        if not site:
+            return JSONResponse({'msg': 'Website not found'}, status_code=404)
+
+        site = serialize_website(site)
+        # PATCH accepts this back in If-Match to detect concurrent edits
+        return JSONResponse(site, headers={'ETag': f'"{site["version"]}"'})
+    except Exception as e:
+        logger.exception("get_website failed: %s", e)
+        return JSONResponse({'msg': 'Internal Server Error retrieving website', 'error_details': str(e)}, status_code=500)
+
+# --- Preview ---
+
+def _not_modified(request, etag, last_modified):
+    # Mirrors preview._not_modified: If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get('If-Modified-Since')
+    if last_modified is not None and if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+class PreviewEndpoint:
+    """
+    /preview/<website_id>: exported pages are sent from disk by the event loop once the
+    site's timestamp shows they are current; sites that are not exported, whose export is
+    out of date (e.g. edited through another host) or whose files have gone are handed to
+    the Flask route, which renders and exports them (or answers 404).
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        started = time.perf_counter()
+        request = Request(scope, receive)
+        response = self._send_export(request, await self._current_pointer(scope['path_params']['website_id']))
+        if response is None:
+            await self.fallback(scope, receive, send)
+            return
+        await response(scope, receive, send)
+        HTTP_REQUEST_DURATION.labels('preview_bp.preview_website', request.method, str(response.status_code)).observe(
+            time.perf_counter() - started
+        )
+
+    async def _current_pointer(self, website_id):
+        pointer = site_exporter.lookup(website_id)
+        if not pointer:
+            return None
+        stamp = await async_mongo.db_for('preview_bp').websites.find_one(
+            {'_id': ObjectId(website_id)}, {'last_updated': 1, 'created_at': 1}
+        )
+        if not stamp or not site_exporter.current(pointer, stamp.get('last_updated') or stamp.get('created_at')):
+            return None
+        return pointer
+
+    def _send_export(self, request, pointer):
+        if not pointer:
+            return None
+        digest = pointer['digest']
+        last_modified = datetime.fromisoformat(pointer['last_updated']) if pointer.get('last_updated') else None
+        headers = {'ETag': f'"{digest}"', 'Cache-Control': 'public, no-cache', 'Vary': 'Accept-Encoding'}
+        if last_modified is not None:
+            headers['Last-Modified'] = last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')
+
+        if _not_modified(request, digest, last_modified):
+            return Response(status_code=304, headers=headers)
+
+        path, encoding = site_exporter.pick_encoding(digest, _accept_encodings(request.headers.get('Accept-Encoding', '')))
+        try:
+            # FileResponse stats here; a pruned file falls back to rendering like the Flask route
+            response = FileResponse(path, media_type='text/html; charset=utf-8', headers=headers, stat_result=os.stat(path))
+        except OSError as e:
+            logger.warning("Exported preview %s is unreadable, rendering instead: %s", digest, e)
+            return None
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+# --- Application ---
+
+class DefaultCORSMiddleware:
+    """
+    Adds 'Access-Control-Allow-Origin: *' (flask_cors's default) to responses of the async
+    routes. Responses from the mounted Flask app already carry it and are left alone.
+    Preflight requests fall through to the Flask app, whose CORS handling answers them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                if not any(name.lower() == b'access-control-allow-origin' for name, _ in headers):
+                    headers.append((b'access-control-allow-origin', b'*'))
+                    message['headers'] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+def create_asgi_app(config=None):
+    """
+    Creates the Flask app (same configuration and extensions as run.py) and wraps it in a
+    Starlette app serving the async routes. Unmatched methods and paths, such as PUT or
+    DELETE on /api/<id>, fall through to the Flask app.
+    """
+    flask_app = create_app(config)
+    async_generation_jobs.init_app(flask_app)
+    wsgi_app = WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_THREADS'])
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        # Motor binds to the running loop, so the client is created here and not at import
+        async_mongo.connect(flask_app)
+        try:
+            yield
+        finally:
+            await async_generation_jobs.shutdown()
+            async_mongo.close()
+
+    routes = [
+        Route('/api/generate', generate_website, methods=['POST']),
+        Route('/api/generate/stream', generate_website_stream, methods=['POST']),
+        Route('/api/jobs/{job_id}', get_generation_job, methods=['GET']),
+        Route('/api/', list_websites, methods=['GET']),
+        Route('/api/{id}', get_website, methods=['GET']),
+        Route('/preview/{website_id}', PreviewEndpoint(wsgi_app)),
+        Mount('/', app=wsgi_app)
+    ]
+    app = Starlette(routes=routes, lifespan=lifespan)
+    app.state.flask_app = flask_app
+    app.add_middleware(DefaultCORSMiddleware)
+    return app
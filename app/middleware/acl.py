@@ -1,9 +1,15 @@
 from functools import wraps
-from flask import jsonify, current_app, request
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+import logging
+import threading
+import time
+from flask import jsonify, current_app, request, g
 from pymongo.errors import PyMongoError
 # Import the global mongo instance directly
 from app import mongo # <--- MODIFIED: Import mongo directly from app
+from app.middleware.identity import Identity, verify_request_identity
+from app.services.metrics import record_cache
+
+logger = logging.getLogger(__name__)
 
 # Default permissions if database is empty or connection fails
 DEFAULT_ROLE_PERMISSIONS = {
@@ -38,48 +44,144 @@ def get_permissions_from_db(mongo_instance=None):
         db_permissions = roles_collection.find_one({"_id": "role_mappings"})
 
         if db_permissions and db_permissions.get("permissions"):
-            print("ACL: Loaded permissions from DB.")
+            logger.info("ACL: Loaded permissions from DB.")
             return db_permissions["permissions"]
         else:
-            print("ACL: No permissions found in DB, using default and inserting.")
+            logger.info("ACL: No permissions found in DB, using default and inserting.")
             # If no permissions found, insert defaults
             roles_collection.insert_one({
                 "_id": "role_mappings",
-                "permissions": DEFAULT_ROLE_PERMISSIONS
+                "permissions": DEFAULT_ROLE_PERMISSIONS,
+                "version": 1
             })
             return DEFAULT_ROLE_PERMISSIONS
     except PyMongoError as e:
-        print(f"ACL Error: Could not connect to MongoDB or fetch permissions: {e}")
-        print("ACL: Falling back to default permissions.")
+        logger.error("ACL: Could not connect to MongoDB or fetch permissions, falling back to defaults: %s", e)
         return DEFAULT_ROLE_PERMISSIONS
     except Exception as e:
-        print(f"ACL Error: An unexpected error occurred while fetching permissions: {e}")
-        print("ACL: Falling back to default permissions.")
+        logger.exception("ACL: Unexpected error while fetching permissions, falling back to defaults: %s", e)
         return DEFAULT_ROLE_PERMISSIONS
 
+def get_permissions_version(mongo_instance=None):
+    """
+    Returns the version counter of the role_mappings document, or None if it cannot be read.
+    Only the 'version' field is projected, so this is much cheaper than a full load.
+    """
+    db_instance = mongo_instance if mongo_instance is not None else mongo.db
+
+    try:
+        doc = db_instance.roles_permissions.find_one({"_id": "role_mappings"}, {"version": 1})
+        if not doc:
+            return None
+        return doc.get("version", 0)
+    except PyMongoError as e:
+        logger.error("ACL: Could not read permissions version: %s", e)
+        return None
+
+class PermissionCache:
+    """
+    Per-worker cache of the role -> permissions mapping.
+    Permissions are stored as frozensets so the ACL check is a plain set lookup.
+    While an entry is younger than 'ttl' seconds it is served without touching MongoDB.
+    After that, only the 'version' counter of the role_mappings document is fetched;
+    the full mapping is reloaded only when that version has changed, so every writer of
+    roles_permissions must $inc 'version' along with its update.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._roles = None # role -> frozenset of permissions, None until first load
+        self._version = None
+        self._checked_at = 0.0
+
+    def init_app(self, app):
+        """Reads the cache TTL from the app config."""
+        self.ttl = app.config.get('ACL_CACHE_TTL', self.ttl)
+        self.invalidate()
+
+    def invalidate(self):
+        """Forces the next lookup to reload the mapping from MongoDB."""
+        with self._lock:
+            self._roles = None
+            self._version = None
+            self._checked_at = 0.0
+
+    def _load(self, mongo_instance):
+        # Read the version first so a concurrent update can only make us reload too often, never too rarely
+        version = get_permissions_version(mongo_instance)
+        all_permissions = get_permissions_from_db(mongo_instance)
+        self._roles = {role: frozenset(perms) for role, perms in all_permissions.items()}
+        self._version = version
+        self._checked_at = time.monotonic()
+
+    def get_role_permissions(self, role, mongo_instance=None):
+        """
+        Returns the frozenset of permissions for 'role', or None if the role is not defined.
+        """
+        roles = self._roles
+        if roles is not None and time.monotonic() - self._checked_at < self.ttl:
+            record_cache('acl', True)
+            return roles.get(role)
+
+        with self._lock:
+            # Another thread may have refreshed the mapping while we waited for the lock
+            if self._roles is not None and time.monotonic() - self._checked_at < self.ttl:
+                record_cache('acl', True)
+                return self._roles.get(role)
+
+            db_instance = mongo_instance if mongo_instance is not None else mongo.db
+            if self._roles is not None:
+                version = get_permissions_version(db_instance)
+                if version is not None and version == self._version:
+                    self._checked_at = time.monotonic()
+                    record_cache('acl', True)
+                    return self._roles.get(role)
+
+            record_cache('acl', False)
+            self._load(db_instance)
+            return self._roles.get(role)
+
+    def peek(self, role):
+        """
+        Returns (True, permissions) if the mapping is fresh enough to answer without MongoDB,
+        else (False, None). Lets async callers skip a thread hop for the common case.
+        """
+        roles = self._roles
+        if roles is not None and time.monotonic() - self._checked_at < self.ttl:
+            record_cache('acl', True)
+            return True, roles.get(role)
+        return False, None
+
+# One cache per worker process
+permission_cache = PermissionCache()
+
 def permission_required(permission):
     """
-    Decorator to check if the current user has the required permission.
-    Permissions are fetched dynamically from the database.
+    Decorator authenticating the request and checking that the user has the required permission.
+    This is the only auth stage a route needs (no separate @jwt_required): the access token is
+    verified once, through the per-worker token cache, and the user's Identity (id, role and
+    resolved permissions) is stored on g.identity for the handler.
+    Permissions are read from the per-worker permission cache, which is kept
+    in sync with the database through the role_mappings version counter.
     """
     def wrapper(fn):
         @wraps(fn)
         def decorator(*args, **kwargs):
-            verify_jwt_in_request()
-            current_user = get_jwt_identity()
+            current_user = verify_request_identity()
             user_role = current_user.get('role')
 
-            # Get permissions dynamically, passing the globally imported mongo.db instance
-            all_permissions = get_permissions_from_db(mongo.db) # <--- MODIFIED: Use global mongo.db
-            
+            role_permissions = permission_cache.get_role_permissions(user_role)
+
             # Check if the user's role exists in our defined permissions
-            if user_role not in all_permissions:
+            if role_permissions is None:
                 return jsonify({"msg": f"Role '{user_role}' not recognized or has no defined permissions."}), 403
 
             # Check if the role has the required permission
-            if permission not in all_permissions[user_role]:
+            if permission not in role_permissions:
                 return jsonify({"msg": f"Permission denied: Missing '{permission}' permission for role '{user_role}'"}), 403
 
+            g.identity = Identity(current_user.get('id'), user_role, role_permissions)
             return fn(*args, **kwargs)
         return decorator
     return wrapper
@@ -91,6 +193,6 @@ def initialize_permissions(mongo_instance):
     Initializes default permissions in the database if they don't exist.
     This should be called after the Flask app and MongoDB are initialized.
     """
-    print("Initializing default permissions...")
+    logger.info("Initializing default permissions...")
     get_permissions_from_db(mongo_instance)
-    print("Default permissions initialization complete.")
+    logger.info("Default permissions initialization complete.")
@@ -0,0 +1,123 @@
+import gzip
+import logging
+
+from flask import request
+
+try:
+    import brotli # Optional: without it responses are only gzipped
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Media types worth compressing; images and exports are already compressed
+COMPRESSIBLE_TYPES = frozenset({
+    'application/json', 'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript'
+})
+
+def choose_encoding(accepted):
+    """
+    Picks the encoding for a response from the client's Accept-Encoding qualities
+    ({encoding: q}, e.g. werkzeug's request.accept_encodings): brotli when available and
+    accepted, else gzip, else None. Ties go to brotli, which is smaller at a similar cost.
+    """
+    candidates = (('br', 'gzip') if brotli is not None else ('gzip',))
+    best, best_quality = None, 0
+    for encoding in candidates:
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def encoded_etag(etag, encoding):
+    """
+    The strong ETag of a compressed representation: each encoding is a different sequence of
+    bytes, so it may not share the identity representation's strong validator (RFC 9110 8.8.3).
+    """
+    return f"{etag}-{encoding}"
+
+def strip_encoding_suffix(etag):
+    """Returns the ETag a compressed representation's ETag was derived from by encoded_etag."""
+    for encoding in ('br', 'gzip'):
+        if etag.endswith(f"-{encoding}"):
+            return etag[:-len(encoding) - 1]
+    return etag
+
+def if_none_match_tags(header):
+    # '"a", W/"b-gzip"' -> ['a', 'b-gzip']; If-None-Match uses the weak comparison
+    return [tag.strip().removeprefix('W/').strip('"') for tag in header.split(',') if tag.strip()]
+
+def etag_matches(header, etag):
+    """
+    Whether an If-None-Match header names 'etag', in any of its encodings, or is '*'.
+    A client may hold the page in any encoding; all of them are still current.
+    """
+    return any(tag == '*' or strip_encoding_suffix(tag) == etag for tag in if_none_match_tags(header))
+
+def compress(body, encoding, gzip_level=6, brotli_quality=4):
+    """
+    Compresses a response body. The defaults favour speed over ratio, as every dynamic
+    response pays for it; precompressed static files use the highest levels instead.
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+class ResponseCompressor:
+    """
+    Compresses JSON, HTML and other text responses larger than COMPRESSION_MIN_SIZE bytes
+    with brotli or gzip, as negotiated from Accept-Encoding. A strong ETag gets the
+    encoding appended (encoded_etag); the routes' etag_matches accepts either form.
+    Left alone: streamed responses (SSE, sent files), which must reach the client chunk by
+    chunk, responses that already have a Content-Encoding (exported previews and
+    fingerprinted assets are precompressed), and bodiless ones such as 304s.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 4
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESSION_ENABLED', True)
+        self.min_size = app.config.get('COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = app.config.get('COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESSION_BROTLI_QUALITY', 4)
+        if self.enabled:
+            app.after_request(self.after_request)
+            logger.info("Response compression on above %d bytes (%s)", self.min_size,
+                        'br, gzip' if brotli is not None else 'gzip')
+
+    def compressible(self, status, mimetype, content_encoding, length):
+        return (
+            200 <= status < 300 and status != 204
+            and not content_encoding
+            and mimetype in COMPRESSIBLE_TYPES
+            and length is not None and length >= self.min_size
+        )
+
+    def after_request(self, response):
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        if not self.compressible(response.status_code, response.mimetype,
+                                 response.headers.get('Content-Encoding'), response.content_length):
+            return response
+        if 'no-transform' in response.headers.get('Cache-Control', ''):
+            return response
+
+        # The representation now depends on Accept-Encoding, whether or not this client gets it compressed
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        response.set_data(compress(response.get_data(), encoding, self.gzip_level, self.brotli_quality))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(encoded_etag(etag, encoding))
+        return response
+
+# One compressor per worker process
+response_compressor = ResponseCompressor()
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+
+from app.services.metrics import record_cache
+
+class Identity:
+    """
+    The authenticated user of the current request, as stored on g.identity by
+    permission_required: user id, role and the role's resolved permission set.
+    """
+
+    __slots__ = ('id', 'role', 'permissions')
+
+    def __init__(self, id, role, permissions):
+        self.id = id
+        self.role = role
+        self.permissions = permissions
+
+    @property
+    def is_admin(self):
+        return self.role == 'Admin'
+
+    def __repr__(self):
+        return f"Identity(id={self.id!r}, role={self.role!r})"
+
+class TokenCache:
+    """
+    Per-worker LRU of already verified access tokens, keyed by the SHA-256 digest of the
+    raw token so the tokens themselves are never kept. An entry holds the token's identity
+    claim and is only used until the token's 'exp', so an expired token is always verified
+    (and rejected) again. Tokens signed with a rotated key stay accepted by a worker until
+    they expire or fall out of the cache.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # digest -> (identity claim, expires at as a Unix time)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('JWT_VERIFY_CACHE_SIZE', self.max_entries)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, digest):
+        """Returns the cached identity claim for a token digest, or None."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(digest)
+                record_cache('jwt', True)
+                return entry[0]
+            if entry is not None:
+                del self._entries[digest]
+        record_cache('jwt', False)
+        return None
+
+    def put(self, digest, identity, expires_at):
+        if self.max_entries <= 0 or expires_at is None:
+            return
+        with self._lock:
+            self._entries[digest] = (identity, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+# One cache per worker process
+token_cache = TokenCache()
+
+def _bearer_token():
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) == 2 and parts[0] == 'Bearer':
+        return parts[1]
+    return None
+
+def verify_request_identity():
+    """
+    Returns the identity claim ({'id', 'role'}) of the request's access token, verifying
+    the token at most once per worker until it expires.
+    On a cache miss flask_jwt_extended does the verification, so missing, malformed and
+    expired tokens raise its usual errors and get the responses registered in create_app.
+    """
+    token = _bearer_token()
+    if token is not None:
+        digest = token_cache.digest(token)
+        identity = token_cache.get(digest)
+        if identity is not None:
+            return identity
+
+    verify_jwt_in_request()
+    identity = get_jwt_identity()
+    if token is not None:
+        token_cache.put(digest, identity, get_jwt().get('exp'))
+    return identity
+
+def current_identity():
+    """Returns the Identity that permission_required stored for this request."""
+    return g.identity
@@ -0,0 +1,173 @@
+import logging
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import g, jsonify, request
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app import mongo
+from app.services.metrics import RATE_LIMITED_REQUESTS
+from app.services.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Units accepted in limits such as '10/minute'
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_limit(value):
+    """
+    Parses '<count>/<second|minute|hour|day>' into (tokens per second, bucket capacity), or None
+    for an empty value (no limit). A client may burst up to <count> requests, then gets one
+    more every period/<count>. Raises ValueError for anything else.
+    """
+    if not value:
+        return None
+    count, _, period = value.partition('/')
+    try:
+        count = int(count)
+    except ValueError:
+        raise ValueError(f"Invalid rate limit '{value}', expected e.g. '10/minute'")
+    if count < 1 or period.strip() not in PERIODS:
+        raise ValueError(f"Invalid rate limit '{value}', expected e.g. '10/minute'")
+    return count / PERIODS[period.strip()], count
+
+class MemoryStore:
+    """
+    Token buckets in the worker's memory, one per (scope, key). Fast and dependency-free,
+    but every worker counts separately, so the effective limit is multiplied by the number
+    of workers. The least recently used buckets are dropped beyond 'max_keys'.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, bucket_id, rate, capacity, cost):
+        with self._lock:
+            bucket = self._buckets.get(bucket_id)
+            if bucket is None:
+                bucket = self._buckets[bucket_id] = TokenBucket(rate, capacity)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(bucket_id)
+        return bucket.try_acquire(cost)
+
+class MongoStore:
+    """
+    Token buckets shared by all workers in the 'rate_limits' collection.
+    Each hit is one atomic find_one_and_update whose update pipeline refills the bucket for
+    the time elapsed since its last use, then takes the tokens if there are enough, so
+    concurrent requests from any worker never over-spend. Idle buckets carry an 'expires_at'
+    once they would be full again, and the TTL index removes them.
+    """
+
+    def hit(self, bucket_id, rate, capacity, cost):
+        now = datetime.utcnow()
+        elapsed = {'$divide': [{'$subtract': [now, {'$ifNull': ['$updated_at', now]}]}, 1000]}
+        pipeline = [
+            {'$set': {'tokens': {'$min': [capacity, {'$add': [
+                {'$ifNull': ['$tokens', capacity]}, {'$multiply': [elapsed, rate]}
+            ]}]}}},
+            {'$set': {'allowed': {'$gte': ['$tokens', cost]}}},
+            {'$set': {
+                'tokens': {'$cond': ['$allowed', {'$subtract': ['$tokens', cost]}, '$tokens']},
+                'updated_at': now,
+                'expires_at': now + timedelta(seconds=capacity / rate)
+            }}
+        ]
+        try:
+            bucket = mongo.db.rate_limits.find_one_and_update(
+                {'_id': bucket_id}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two first hits raced to create the bucket; the second one now finds it
+            bucket = mongo.db.rate_limits.find_one_and_update(
+                {'_id': bucket_id}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        if bucket['allowed']:
+            return True, 0.0
+        return False, (cost - bucket['tokens']) / rate
+
+class RateLimiter:
+    """
+    Admission control per route scope ('generate', 'login', ...), keyed by the caller's
+    identity or IP address. The limit of a scope comes from RATE_LIMIT_<SCOPE> (see
+    parse_limit); scopes without one are not limited. RATE_LIMIT_BACKEND selects where the
+    buckets live: 'memory' (per worker) or 'mongo' (shared by all workers). If MongoDB is
+    unavailable the worker's memory buckets are used instead, so limits degrade rather
+    than block requests.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.app = None
+        self.memory = MemoryStore()
+        self.store = self.memory
+        self._limits = {}
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.memory = MemoryStore(app.config.get('RATE_LIMIT_MAX_KEYS', 10000))
+        backend = app.config.get('RATE_LIMIT_BACKEND', 'memory')
+        if backend not in ('memory', 'mongo'):
+            raise ValueError(f"Unknown RATE_LIMIT_BACKEND '{backend}', expected 'memory' or 'mongo'")
+        self.store = MongoStore() if backend == 'mongo' else self.memory
+        self._limits = {}
+
+    def limit_for(self, scope):
+        """Returns (rate, capacity) for a scope, or None if it is not limited."""
+        if scope not in self._limits:
+            self._limits[scope] = parse_limit(self.app.config.get(f"RATE_LIMIT_{scope.upper()}"))
+        return self._limits[scope]
+
+    def hit(self, scope, key, cost=1):
+        """
+        Takes 'cost' tokens from the bucket of (scope, key).
+        Returns (allowed, seconds until the request would be allowed).
+        """
+        limit = self.limit_for(scope) if self.enabled else None
+        if limit is None:
+            return True, 0.0
+        rate, capacity = limit
+        bucket_id = f"{scope}:{key}"
+        try:
+            return self.store.hit(bucket_id, rate, capacity, cost)
+        except PyMongoError as e:
+            logger.warning("Shared rate limit store unavailable, using this worker's: %s", e)
+            return self.memory.hit(bucket_id, rate, capacity, cost)
+
+# One limiter per worker process
+rate_limiter = RateLimiter()
+
+def too_many_requests(retry_after):
+    """The 429 response for a throttled request; Retry-After is in whole seconds."""
+    seconds = max(1, math.ceil(retry_after))
+    response = jsonify({'msg': 'Too many requests. Please try again later.', 'retry_after': seconds})
+    response.headers['Retry-After'] = str(seconds)
+    return response, 429
+
+def rate_limited(scope, by='identity'):
+    """
+    Decorator applying the rate limit of 'scope' to a route.
+    by='identity' keys the bucket by the authenticated user and must be placed below
+    @permission_required; by='ip' keys it by the client address (see PROXY_FIX_X_FOR when
+    behind a proxy).
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            key = g.identity.id if by == 'identity' else request.remote_addr
+            allowed, retry_after = rate_limiter.hit(scope, key)
+            if not allowed:
+                RATE_LIMITED_REQUESTS.labels(scope).inc()
+                return too_many_requests(retry_after)
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
@@ -1,39 +1,50 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import mongo, bcrypt # Import mongo and bcrypt
 from app.middleware.acl import permission_required
+from app.middleware.identity import current_identity
+from app.services.pagination import parse_page_args, find_page, read_page, PaginationError
+from app.services.read_routing import read_db
 from bson import ObjectId # For working with MongoDB ObjectIds
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Create an admin blueprint with a URL prefix '/admin'
 admin_bp = Blueprint('admin', __name__)
 
+# Fields returned per user by the listing; the password hash is never read
+USER_LIST_PROJECTION = {'email': 1, 'role': 1, 'created_at': 1, 'last_login': 1}
+
+def serialize_user(user):
+    return {
+        '_id': user['_id'],
+        'email': user['email'],
+        'role': user['role'],
+        'created_at': user.get('created_at'),
+        'last_login': user.get('last_login')
+    }
+
 @admin_bp.route('/users', methods=['GET'])
-@jwt_required()
 @permission_required('read_user')
 def list_users():
     """
-    Lists all users in the system. Only accessible by Admins.
+    Lists users one page at a time. Only accessible by Admins.
+    Query parameters: 'limit' (page size) and 'after' (the 'next_after' value of the previous page).
+    Responds with {"items": [...], "next_after": <id or null>}.
     """
     try:
-        users_cursor = mongo.db.users.find({})
-        users_list = []
-        for user in users_cursor:
-            user['_id'] = str(user['_id']) # Convert ObjectId to string
-            # Exclude sensitive information like password hash
-            users_list.append({
-                '_id': user['_id'],
-                'email': user['email'],
-                'role': user['role'],
-                'created_at': user['created_at'].isoformat() if 'created_at' in user else None,
-                'last_login': user['last_login'].isoformat() if 'last_login' in user else None
-            })
-        return jsonify(users_list), 200
+        limit, after = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({'msg': str(e)}), 400
+
+    try:
+        users_cursor = find_page(read_db().users, {}, USER_LIST_PROJECTION, limit, after)
+        return jsonify(read_page(users_cursor, limit, serialize_user)), 200
     except Exception as e:
-        print(f"ERROR in list_users: {e}")
+        logger.exception("list_users failed: %s", e)
         return jsonify({'msg': 'Internal Server Error listing users', 'error_details': str(e)}), 500
 
 @admin_bp.route('/assign-role', methods=['PUT'])
-@jwt_required()
 @permission_required('assign_role')
 def assign_role():
     """
@@ -54,8 +65,7 @@ def assign_role():
 
     try:
         # Prevent an admin from changing their own role via this endpoint (optional, but good practice)
-        current_user_identity = get_jwt_identity()
-        if str(current_user_identity['id']) == user_id:
+        if current_identity().id == user_id:
             return jsonify({'msg': 'Cannot change your own role via this interface'}), 403
 
         # Update the user's role in the database
@@ -71,20 +81,16 @@ def assign_role():
         else:
             return jsonify({'msg': 'User role updated successfully'}), 200
     except Exception as e:
-        print(f"ERROR in assign_role: {e}")
+        logger.exception("assign_role failed: %s", e)
         return jsonify({'msg': 'Internal Server Error assigning role', 'error_details': str(e)}), 500
 
 @admin_bp.route('/users/<id>', methods=['DELETE'])
-@jwt_required()
 @permission_required('delete_user')
 def delete_user(id):
     """
     Deletes a user by ID. Only accessible by Admins.
     """
-    current_user_identity = get_jwt_identity()
-    current_user_id = current_user_identity['id']
-
-    if current_user_id == id:
+    if current_identity().id == id:
         return jsonify({'msg': 'Cannot delete your own user account via this interface'}), 403
 
     try:
@@ -95,5 +101,5 @@ def delete_user(id):
         else:
             return jsonify({'msg': 'User not found'}), 404
     except Exception as e:
-        print(f"ERROR in delete_user: {e}")
+        logger.exception("delete_user failed: %s", e)
         return jsonify({'msg': 'Internal Server Error deleting user', 'error_details': str(e)}), 500
\ No newline at end of file
@@ -1,13 +1,23 @@
 from flask import Blueprint, request, jsonify
-from app import mongo, bcrypt # Import mongo and bcrypt from the app instance
+from app import mongo # Import mongo from the app instance
+from app.middleware.rate_limit import rate_limited
+from app.services.hashing import password_hasher, HasherBusy
 from flask_jwt_extended import create_access_token # Import create_access_token
 from bson import ObjectId # For working with MongoDB ObjectIds
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime # For timestamps
 
 # Create an authentication blueprint with a URL prefix '/auth'
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+def busy_response():
+    """Response for when the password hashing pool is saturated."""
+    response = jsonify({'msg': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/signup', methods=['POST'])
+@rate_limited('signup', by='ip')
 def signup():
     """
     Handles user registration.
@@ -21,13 +31,16 @@ def signup():
     if not email or not password:
         return jsonify({'msg': 'Email and password are required'}), 400
 
-    # Hash the password for secure storage
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
-
-    # Check if a user with the given email already exists
-    if mongo.db.users.find_one({'email': email}):
+    # Check if a user with the given email already exists (before paying for a hash)
+    if mongo.db.users.find_one({'email': email}, {'_id': 1}):
         return jsonify({'msg': 'Email already exists'}), 400
 
+    # Hash the password for secure storage
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HasherBusy:
+        return busy_response()
+
     # Insert the new user into the 'users' collection
     # Default role is 'Viewer'
     user_data = {
@@ -37,11 +50,16 @@ def signup():
         'created_at': datetime.utcnow(),
         'last_login': datetime.utcnow()
     }
-    result = mongo.db.users.insert_one(user_data)
+    try:
+        result = mongo.db.users.insert_one(user_data)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent signup for the same email (users.email is unique)
+        return jsonify({'msg': 'Email already exists'}), 400
 
     return jsonify({'msg': 'User created successfully', 'user_id': str(result.inserted_id)}), 201
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limited('login', by='ip')
 def login():
     """
     Handles user login.
@@ -60,7 +78,12 @@ def login():
     user = mongo.db.users.find_one({'email': email})
 
     # Verify user existence and password
-    if user and bcrypt.check_password_hash(user['password'], password):
+    try:
+        password_ok = bool(user) and password_hasher.verify(user['password'], password)
+    except HasherBusy:
+        return busy_response()
+
+    if password_ok:
         # Create a JWT access token
         # The identity payload will be a dictionary containing user's ID and role
         access_token = create_access_token(identity={
@@ -69,9 +92,18 @@ def login():
         })
 
         # Update last login timestamp
+        login_update = {'last_login': datetime.utcnow()}
+
+        # Transparently upgrade hashes made with an older cost; the plain password is only available now
+        if password_hasher.needs_rehash(user['password']):
+            try:
+                login_update['password'] = password_hasher.hash(password)
+            except HasherBusy:
+                pass # Not worth failing the login over; retried on the next one
+
         mongo.db.users.update_one(
             {'_id': user['_id']},
-            {'$set': {'last_login': datetime.utcnow()}}
+            {'$set': login_update}
         )
 
         return jsonify(access_token=access_token), 200
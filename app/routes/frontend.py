@@ -1,20 +1,53 @@
-from flask import Blueprint, send_from_directory
-import os
+from flask import Blueprint, abort, make_response, request
 
-frontend_bp = Blueprint('frontend', __name__, static_folder='../../frontend')
+from app.middleware.compression import choose_encoding, etag_matches
+from app.services.assets import frontend_assets
 
-@frontend_bp.route('/login.html')
-def serve_login():
-    return send_from_directory(frontend_bp.static_folder, 'login.html')
+# Create the blueprint serving the frontend pages and their scripts
+frontend_bp = Blueprint('frontend', __name__)
 
-@frontend_bp.route('/signup.html')
-def serve_signup():
-    return send_from_directory(frontend_bp.static_folder, 'signup.html')
+def _asset_response(asset, cache_control):
+    if etag_matches(request.headers.get('If-None-Match', ''), asset.digest):
+        response = make_response(b'', 304)
+    else:
+        body, encoding = asset.encoded(choose_encoding(request.accept_encodings))
+        response = make_response(body)
+        response.mimetype = asset.mimetype
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    if asset.variants:
+        response.vary.add('Accept-Encoding')
+    response.set_etag(asset.digest)
+    response.headers['Cache-Control'] = cache_control
+    return response
 
-@frontend_bp.route('/dashboard.html')
-def serve_dashboard():
-    return send_from_directory(frontend_bp.static_folder, 'dashboard.html')
+@frontend_bp.route('/')
+def serve_index():
+    """
+    Serves index.html when the root URL is accessed.
+    """
+    return serve_frontend_static('index.html')
 
-@frontend_bp.route('/scripts.js')
-def serve_scripts():
-    return send_from_directory(frontend_bp.static_folder, 'scripts.js')
+@frontend_bp.route('/assets/<path:filename>')
+def serve_fingerprinted(filename):
+    """
+    Serves a fingerprinted script or stylesheet (e.g. /assets/scripts.<digest>.js), as
+    referenced by the pages. The current fingerprint is cached for a year as immutable;
+    pages still pointing at an older one get the current file, revalidated on every use.
+    """
+    asset, current = frontend_assets.by_fingerprint(filename)
+    if asset is None:
+        abort(404)
+    return _asset_response(asset, 'public, max-age=31536000, immutable' if current else 'public, no-cache')
+
+# This route will catch requests for files like /login.html, /signup.html, /scripts.js etc.
+@frontend_bp.route('/<path:filename>')
+def serve_frontend_static(filename):
+    """
+    Serves the HTML pages, and the other frontend files under their plain names, from memory.
+    Browsers may keep them but must revalidate, which ends in a 304 while they are unchanged.
+    """
+    asset = frontend_assets.get(filename)
+    if asset is None:
+        abort(404)
+    return _asset_response(asset, 'public, no-cache')
@@ -0,0 +1,23 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+
+from app.services.metrics import render_metrics
+
+# Create the blueprint for the Prometheus scrape endpoint
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """
+    Exposes request, MongoDB, LLM and cache metrics in the Prometheus text format.
+    If METRICS_TOKEN is set, scrapers must send it as a bearer token.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f'Bearer {token}'):
+            abort(401)
+
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
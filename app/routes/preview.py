@@ -1,41 +1,165 @@
-from flask import Blueprint, render_template, abort
+from flask import Blueprint, render_template, abort, request, make_response, send_file
+from werkzeug.exceptions import HTTPException
 from bson.objectid import ObjectId
-from app import mongo # Import mongo from the app instance
+from app.middleware.compression import etag_matches
+from app.services.read_routing import read_db
+from app.services.render_cache import preview_cache, make_etag
+from app.services.site_export import site_exporter, export_website_safely
+from app.services.templating import preview_stylesheet
+from app.services.view_model import view_for
 from datetime import datetime # Import datetime to get the current year
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Create the blueprint for the public preview route
 preview_bp = Blueprint('preview_bp', __name__)
 
+def _not_modified(etag, last_modified):
+    """
+    Checks the conditional request headers against the page's validators.
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    if request.headers.get('If-None-Match'):
+        return etag_matches(request.headers['If-None-Match'], etag)
+    if last_modified is not None and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+def _page_response(body, status, etag, last_modified):
+    response = make_response(body, status)
+    if etag is not None:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Browsers and proxies may keep the page but must revalidate it, which usually ends in a 304
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
+def _send_export(pointer):
+    """
+    Serves an exported page straight from disk, choosing a precompressed variant if the client accepts one.
+    Raises OSError if the files have disappeared (e.g. pruned), so the caller can fall back to rendering.
+    """
+    digest = pointer['digest']
+    last_modified = datetime.fromisoformat(pointer['last_updated']) if pointer.get('last_updated') else None
+
+    if _not_modified(digest, last_modified):
+        return _page_response(b'', 304, digest, last_modified)
+
+    path, encoding = site_exporter.pick_encoding(digest, request.accept_encodings)
+    # send_file hands the open file to the WSGI server's file wrapper (sendfile where available)
+    response = send_file(path, mimetype='text/html; charset=utf-8', conditional=False, etag=False)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(digest)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
+@preview_bp.route('/preview/assets/preview-<digest>.css')
+def preview_stylesheet_file(digest):
+    """
+    Serves the stylesheet shared by all preview pages. The current fingerprint is cached
+    for a year as immutable; pages still pointing at an older one get the current file,
+    revalidated on every use.
+    """
+    use_gzip = bool(request.accept_encodings['gzip'])
+    response = make_response(preview_stylesheet.gzipped if use_gzip else preview_stylesheet.body)
+    response.mimetype = 'text/css'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.set_etag(preview_stylesheet.digest)
+    if digest == preview_stylesheet.digest:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
 @preview_bp.route('/preview/<website_id>')
 def preview_website(website_id):
     """
     Renders a live preview of a generated website.
     Fetches the website's structured content from MongoDB and populates a basic HTML
     template.
+    Exported sites are served from precompiled files once their timestamp shows the export
+    is current, without loading the content or touching Jinja. Otherwise rendered pages are cached per (website_id, last_updated), and the ETag/Last-Modified
+    validators let clients revalidate without the page being rendered again.
     This route does NOT require authentication.
     """
     try:
-        # Find the website by its ID
-        website = mongo.db.websites.find_one({"_id": ObjectId(website_id)})
+        # Fetch only the timestamp first; it decides whether the export (or a render) is current
+        stamp = read_db().websites.find_one(
+            {"_id": ObjectId(website_id)},
+            {"last_updated": 1, "created_at": 1}
+        )
 
-        if not website:
+        if not stamp:
             abort(404, description="Website not found")
 
-        # Extract the structured content. If 'content' key is missing or not a dict, default to empty.
-        content_data = website.get('content', {})
-        if not isinstance(content_data, dict):
-            content_data = {} # Ensure it's a dictionary for template access
+        last_modified = stamp.get('last_updated') or stamp.get('created_at')
+
+        # The export may predate an edit made through another host, which only exported it there
+        pointer = site_exporter.lookup(website_id)
+        if pointer and site_exporter.current(pointer, last_modified):
+            try:
+                return _send_export(pointer)
+            except OSError as e:
+                logger.warning("Exported preview for %s is unreadable, rendering instead: %s", website_id, e)
 
         # Get the current year to pass to the template for the footer
         current_year = datetime.utcnow().year
 
-        # Pass the structured content and current year directly to the template
-        return render_template('preview.html', website_data=content_data, current_year=current_year)
+        # The page is fully determined by the stored content version and the footer year
+        version = (last_modified, current_year)
+        etag = None
+
+        if last_modified is not None:
+            etag = make_etag(website_id, last_modified.isoformat(), current_year)
+            if _not_modified(etag, last_modified):
+                return _page_response(b'', 304, etag, last_modified)
+
+            cached = preview_cache.get(website_id, version)
+            if cached is not None:
+                return _page_response(cached[1], 200, cached[0], last_modified)
+
+        # Find the website by its ID
+        website = read_db().websites.find_one({"_id": ObjectId(website_id)})
+
+        if not website:
+            abort(404, description="Website not found")
+
+        # The site may have been updated since the timestamp was read; tag the render with what it was built from
+        last_modified = website.get('last_updated') or website.get('created_at')
+        version = (last_modified, current_year)
+        etag = make_etag(website_id, last_modified.isoformat(), current_year) if last_modified else None
+
+        # Not exported yet (e.g. created before exporting was enabled): export it now and serve the files
+        if site_exporter.enabled and export_website_safely(website):
+            pointer = site_exporter.lookup(website_id)
+            if pointer:
+                try:
+                    return _send_export(pointer)
+                except OSError:
+                    pass
+
+        # The view model stored with the content already has every default applied
+        body = render_template('preview.html', view=view_for(website), current_year=current_year).encode('utf-8')
 
+        # Sites without a timestamp can't be validated, so they are rendered every time
+        if last_modified is not None:
+            preview_cache.put(website_id, version, etag, body)
+
+        return _page_response(body, 200, etag, last_modified)
+
+    except HTTPException:
+        raise
     except Exception as e:
         # Construct the full error message as a plain string first
         full_error_message = f"Internal Server Error: Could not generate preview. Details: {str(e)}"
-        print(f"ERROR: Preview generation failed for ID {website_id}. Exception type: {type(e)}. Exception: {e}")
+        logger.exception("Preview generation failed for ID %s: %s", website_id, e)
         # Pass the pre-formatted string directly to the description argument
         abort(500, description=full_error_message)
-
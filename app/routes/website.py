@@ -1,130 +1,35 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app import mongo
 from app.middleware.acl import permission_required
+from app.middleware.identity import current_identity
+from app.middleware.rate_limit import rate_limited
+from app.services.jobs import generation_jobs, serialize_job
+from app.services.json_provider import dumps
+from app.services.batch import batch_generator
+from app.services.backends import current_backend
+from app.services.generation import SECTION_MAX_OUTPUT_TOKENS, is_valid_generation
+from app.services.llm_client import CircuitOpenError
+from app.services.pagination import parse_page_args, find_page, read_page
+from app.services.read_routing import read_db
+from app.services.patching import (
+    JSON_PATCH, PatchError, apply_update, json_patch_to_update, merge_patch_to_update, parse_if_match
+)
+from app.services.render_cache import preview_cache
+from app.services.site_export import site_exporter, export_website_safely
+from app.services.view_model import attach_view_model, build_view_model
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 from bson import ObjectId
 from datetime import datetime
-import os
-import json
+import logging
 
-import google.generativeai as genai
-from google.api_core.exceptions import GoogleAPIError, InvalidArgument, ResourceExhausted
+logger = logging.getLogger(__name__)
 
 website_bp = Blueprint('website', __name__)
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-def generate_gemini_content(business_type, industry):
-    model = genai.GenerativeModel('gemini-1.5-flash')
-
-    prompt_text = (
-        f"Generate a detailed JSON structure for a website for a '{business_type}' business "
-        f"in the '{industry}' industry. The JSON should follow this exact schema for easy parsing. "
-        f"The 'services_section.items' array must contain at least 3 service items. Each item must include a 'title' and a 'description'. "
-        f"Do not return an empty array. If unsure, make up relevant sample services based on the business type. "
-        f"Make the content engaging and relevant to the business and industry. "
-        f"Additionally, generate a 'theme' object with distinct color palettes and a suitable font family "
-        f"for this type of business. The colors should be in hexadecimal format (e.g., '#RRGGBB'). "
-        f"The entire response MUST be a valid JSON object."
-    )
-
-    response_schema = {
-        "type": "OBJECT",
-        "properties": {
-            "title": {"type": "STRING"},
-            "hero_section": {
-                "type": "OBJECT",
-                "properties": {
-                    "heading": {"type": "STRING"},
-                    "subheading": {"type": "STRING"},
-                    "image_description": {"type": "STRING"}
-                }
-            },
-            "about_section": {
-                "type": "OBJECT",
-                "properties": {
-                    "heading": {"type": "STRING"},
-                    "text": {"type": "STRING"}
-                }
-            },
-            "services_section": {
-                "type": "OBJECT",
-                "properties": {
-                    "heading": {"type": "STRING"},
-                    "items": {
-                        "type": "ARRAY",
-                        "items": {
-                            "type": "OBJECT",
-                            "properties": {
-                                "title": {"type": "STRING"},
-                                "description": {"type": "STRING"}
-                            }
-                        }
-                    }
-                }
-            },
-            "contact_section": {
-                "type": "OBJECT",
-                "properties": {
-                    "heading": {"type": "STRING"},
-                    "email": {"type": "STRING"},
-                    "phone": {"type": "STRING"},
-                    "address": {"type": "STRING"}
-                }
-            },
-            "theme": {
-                "type": "OBJECT",
-                "properties": {
-                    "primary_color": {"type": "STRING"},
-                    "secondary_color": {"type": "STRING"},
-                    "background_color": {"type": "STRING"},
-                    "text_color": {"type": "STRING"},
-                    "heading_color": {"type": "STRING"},
-                    "font_family": {"type": "STRING"},
-                    "section_bg_color": {"type": "STRING"},
-                    "service_item_bg_color": {"type": "STRING"},
-                    "border_color": {"type": "STRING"},
-                    "shadow_color": {"type": "STRING"}
-                },
-                "required": [
-                    "primary_color", "secondary_color", "background_color", "text_color",
-                    "heading_color", "font_family", "section_bg_color", "service_item_bg_color",
-                    "border_color", "shadow_color"
-                ]
-            }
-        },
-        "required": [
-            "title", "hero_section", "about_section", "services_section", "contact_section", "theme"
-        ]
-    }
-
-    try:
-        response = model.generate_content(
-            prompt_text,
-            generation_config={
-                "response_mime_type": "application/json",
-                "response_schema": response_schema,
-                "temperature": 0.7,
-                "max_output_tokens": 1500
-            }
-        )
-        generated_json_str = response.text
-        print("🔎 Gemini JSON Response (raw):")
-        print(generated_json_str)
-        return json.loads(generated_json_str)
-
-    except (InvalidArgument, ResourceExhausted, GoogleAPIError) as e:
-        print(f"Gemini API Error: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from Gemini API: {e}. Raw response: {generated_json_str}")
-        return None
-    except Exception as e:
-        print(f"Unexpected error during Gemini content generation: {e}")
-        return None
 
 @website_bp.route('/generate', methods=['POST'])
-@jwt_required()
 @permission_required('create_site')
+@rate_limited('generate')
 def generate_website():
     data = request.get_json()
     business_type = data.get('business_type')
@@ -133,103 +38,289 @@ def generate_website():
     if not business_type or not industry:
         return jsonify({'msg': 'Business type and industry are required'}), 400
 
-    current_user_identity = get_jwt_identity()
-    owner_id = current_user_identity['id']
-
-    generated_content = generate_gemini_content(business_type, industry)
-
-    if generated_content and \
-       'services_section' in generated_content and \
-       isinstance(generated_content['services_section'].get('items'), list) and \
-       len(generated_content['services_section']['items']) > 0:
-
-        site_data = {
-            'owner': owner_id,
-            'business_type': business_type,
-            'industry': industry,
-            'content': generated_content,
-            'created_at': datetime.utcnow(),
-            'last_updated': datetime.utcnow()
-        }
-        result = mongo.db.websites.insert_one(site_data)
-        return jsonify({'msg': 'Website created successfully', 'id': str(result.inserted_id)}), 201
-    else:
-        return jsonify({'msg': 'AI failed to generate valid services. Please try again or retry with different inputs.'}), 500
+    current_user_identity = current_identity()
+    owner_id = current_user_identity.id
+
+    # Generation runs on the job queue; the client polls /api/jobs/<job_id> for the result
+    try:
+        job_id = generation_jobs.submit(owner_id, business_type, industry)
+    except Exception as e:
+        logger.exception("generate_website failed: %s", e)
+        return jsonify({'msg': 'Internal Server Error queuing website generation', 'error_details': str(e)}), 500
+
+    response = jsonify({'msg': 'Website generation started', 'job_id': job_id, 'status': 'queued'})
+    response.headers['Location'] = f"/api/jobs/{job_id}"
+    return response, 202
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event."""
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+@website_bp.route('/generate/stream', methods=['POST'])
+@permission_required('create_site')
+@rate_limited('generate')
+def generate_website_stream():
+    """
+    Generates a website and streams it as Server-Sent Events while the model writes it.
+    Expects the same JSON body as /generate. Emits one 'section' event per completed top-level
+    section ({"section": ..., "value": ...}), then 'done' with the new website id, or 'error'.
+    """
+    data = request.get_json(silent=True) or {}
+    business_type = data.get('business_type')
+    industry = data.get('industry')
+
+    if not business_type or not industry:
+        return jsonify({'msg': 'Business type and industry are required'}), 400
+
+    owner_id = current_identity().id
+    stream_sections = current_backend().stream_sections
+
+    def events():
+        generated_content = {}
+        try:
+            for section, value in stream_sections(business_type, industry):
+                generated_content[section] = value
+                yield sse_event('section', {'section': section, 'value': value})
+        except CircuitOpenError:
+            yield sse_event('error', {'msg': 'AI generation is temporarily unavailable. Please try again shortly.'})
+            return
+        except Exception as e:
+            logger.exception("generate_website_stream failed: %s", e)
+            yield sse_event('error', {'msg': 'AI generation failed. Please try again.'})
+            return
+
+        if not is_valid_generation(generated_content):
+            yield sse_event('error', {'msg': 'AI failed to generate valid services. Please try again or retry with different inputs.'})
+            return
+
+        try:
+            site_data = {
+                'owner': owner_id,
+                'business_type': business_type,
+                'industry': industry,
+                'content': generated_content,
+                'created_at': datetime.utcnow(),
+                'last_updated': datetime.utcnow()
+            }
+            result = mongo.db.websites.insert_one(attach_view_model(site_data))
+            export_website_safely(site_data)
+            yield sse_event('done', {'msg': 'Website created successfully', 'id': str(result.inserted_id)})
+        except Exception as e:
+            logger.exception("generate_website_stream failed: %s", e)
+            yield sse_event('error', {'msg': 'Internal Server Error saving website'})
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@website_bp.route('/generate/batch', methods=['POST'])
+@permission_required('create_site')
+@rate_limited('generate_batch')
+def generate_websites_batch():
+    """
+    Generates several websites in one request.
+    Expects JSON body {"items": [{"business_type": ..., "industry": ...}, ...]}.
+    Items are generated concurrently under the batch concurrency and rate limits, and all
+    successful ones are stored with a single insert_many. The response lists a status per item.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+
+    if not isinstance(items, list) or not items:
+        return jsonify({'msg': 'A non-empty list of items is required'}), 400
+    if len(items) > batch_generator.max_items:
+        return jsonify({'msg': f'At most {batch_generator.max_items} items can be generated per batch'}), 400
+
+    owner_id = current_identity().id
+
+    results = [None] * len(items)
+    pairs = []
+    positions = []
+    for index, item in enumerate(items):
+        business_type = item.get('business_type') if isinstance(item, dict) else None
+        industry = item.get('industry') if isinstance(item, dict) else None
+        if not business_type or not industry:
+            results[index] = {'index': index, 'status': 'invalid', 'msg': 'Business type and industry are required'}
+            continue
+        pairs.append((business_type, industry))
+        positions.append(index)
+
+    try:
+        generated = batch_generator.generate(pairs)
+
+        site_docs = []
+        site_positions = []
+        for (business_type, industry), index, (content, error) in zip(pairs, positions, generated):
+            if error:
+                results[index] = {'index': index, 'status': 'failed', 'msg': error}
+                continue
+            now = datetime.utcnow()
+            site_docs.append(attach_view_model({
+                'owner': owner_id,
+                'business_type': business_type,
+                'industry': industry,
+                'content': content,
+                'created_at': now,
+                'last_updated': now
+            }))
+            site_positions.append(index)
+
+        if site_docs:
+            mongo.db.websites.insert_many(site_docs)
+            for site, index in zip(site_docs, site_positions):
+                # insert_many added each document's '_id' in place
+                export_website_safely(site)
+                results[index] = {'index': index, 'status': 'created', 'id': str(site['_id'])}
+    except Exception as e:
+        logger.exception("generate_websites_batch failed: %s", e)
+        return jsonify({'msg': 'Internal Server Error generating websites', 'error_details': str(e)}), 500
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    return jsonify({
+        'msg': f'{created} of {len(items)} websites created',
+        'created': created,
+        'failed': len(items) - created,
+        'items': results
+    }), 201 if created else 200
+
+@website_bp.route('/jobs/<job_id>', methods=['GET'])
+@permission_required('create_site')
+def get_generation_job(job_id):
+    """
+    Reports the state of a generation job: queued, running, done or failed.
+    Once done, 'website_id' holds the id of the created website.
+    """
+    current_user_identity = current_identity()
+
+    try:
+        job = generation_jobs.get(job_id)
+        if not job:
+            return jsonify({'msg': 'Job not found'}), 404
+
+        if current_user_identity.role != 'Admin' and job.get('owner') != current_user_identity.id:
+            return jsonify({'msg': 'Permission denied'}), 403
+
+        return jsonify(serialize_job(job)), 200
+    except Exception as e:
+        logger.exception("get_generation_job failed: %s", e)
+        return jsonify({'msg': 'Internal Server Error retrieving job', 'error_details': str(e)}), 500
+
+# Fields returned per website by the listing; everything else (notably 'content') stays in MongoDB
+LIST_PROJECTION = {'business_type': 1, 'industry': 1, 'owner': 1}
+
+def serialize_site_summary(site):
+    return {
+        '_id': site['_id'],
+        'business_type': site.get('business_type', 'N/A'),
+        'industry': site.get('industry', 'N/A'),
+        'owner_id': site.get('owner', 'N/A')
+    }
+
+def build_list_query(identity, args):
+    """
+    Builds the MongoDB filter for the website listing.
+    Non-admins see the sites they own plus those shared with them through 'shared_with';
+    both branches are served by the (owner, _id) and (shared_with, _id) indexes.
+    Admins see every site and may filter by 'industry', 'business_type' and a
+    'created_from'/'created_to' date range (ISO 8601).
+    Raises ValueError for malformed filters.
+    """
+    if identity.role != 'Admin':
+        return {'$or': [{'owner': identity.id}, {'shared_with': identity.id}]}
+
+    query = {}
+    for field in ('industry', 'business_type'):
+        if args.get(field):
+            query[field] = args[field]
+
+    created_range = {}
+    for param, operator in (('created_from', '$gte'), ('created_to', '$lte')):
+        if args.get(param):
+            try:
+                created_range[operator] = datetime.fromisoformat(args[param])
+            except ValueError:
+                raise ValueError(f"'{param}' must be an ISO 8601 date")
+    if created_range:
+        query['created_at'] = created_range
+    return query
 
 @website_bp.route('/', methods=['GET'])
-@jwt_required()
 @permission_required('list_all_sites')
 def list_websites():
+    """
+    Lists websites one page at a time, ordered by id.
+    Non-admins only get their own and shared sites; admins can filter (see build_list_query).
+    Query parameters: 'limit' (page size) and 'after' (the 'next_after' value of the previous page).
+    Responds with {"items": [...], "next_after": <id or null>}.
+    """
     try:
-        current_user_identity = get_jwt_identity()
-        user_role = current_user_identity['role']
-        current_user_id = current_user_identity['id']
+        limit, after = parse_page_args(request.args)
+        query = build_list_query(current_identity(), request.args)
+    except ValueError as e:
+        return jsonify({'msg': str(e)}), 400
 
-        if user_role == 'Admin':
-            websites_cursor = mongo.db.websites.find({})
-        else:
-            websites_cursor = mongo.db.websites.find({})
-
-        websites_list = []
-        for site in websites_cursor:
-            site['_id'] = str(site['_id'])
-            websites_list.append({
-                '_id': site['_id'],
-                'business_type': site.get('business_type', 'N/A'),
-                'industry': site.get('industry', 'N/A'),
-                'owner_id': site.get('owner', 'N/A')
-            })
-        return jsonify(websites_list), 200
+    try:
+        websites_cursor = find_page(read_db().websites, query, LIST_PROJECTION, limit, after)
+        return jsonify(read_page(websites_cursor, limit, serialize_site_summary)), 200
 
     except Exception as e:
-        print(f"ERROR in list_websites: {e}")
+        logger.exception("list_websites failed: %s", e)
         return jsonify({"msg": "Internal Server Error loading websites", "error_details": str(e)}), 500
 
+# The stored view model only serves the preview page
+WEBSITE_PROJECTION = {'view': 0}
+
+def serialize_website(site):
+    """
+    Gives a website document the shape returned by GET /api/<id>. ObjectId and datetime
+    values are left to the JSON provider.
+    """
+    site.setdefault('created_at', None)
+    site.setdefault('last_updated', None)
+    # Sites saved before versioning count as version 0
+    site['version'] = site.get('version', 0)
+    return site
+
 @website_bp.route('/<id>', methods=['GET'])
-@jwt_required()
 @permission_required('read_site')
 def get_website(id):
     try:
-        site = mongo.db.websites.find_one({'_id': ObjectId(id)})
+        site = mongo.db.websites.find_one({'_id': ObjectId(id)}, WEBSITE_PROJECTION)
         if not site:
             return jsonify({'msg': 'Website not found'}), 404
 
-        site['_id'] = str(site['_id'])
-        site['created_at'] = site['created_at'].isoformat() if 'created_at' in site else None
-        site['last_updated'] = site['last_updated'].isoformat() if 'last_updated' in site else None
-
-        return jsonify(site), 200
+        site = serialize_website(site)
+        response = jsonify(site)
+        # PATCH accepts this back in If-Match to detect concurrent edits
+        response.set_etag(str(site['version']))
+        return response, 200
     except Exception as e:
-        print(f"ERROR in get_website: {e}")
+        logger.exception("get_website failed: %s", e)
         return jsonify({'msg': 'Internal Server Error retrieving website', 'error_details': str(e)}), 500
 
+# Top-level fields a PUT or PATCH may change; owner, version, view and timestamps are the server's
+PATCHABLE_FIELDS = ('business_type', 'industry', 'content')
+
 @website_bp.route('/<id>', methods=['PUT'])
-@jwt_required()
 @permission_required('update_site')
 def update_website(id):
     data = request.get_json()
     if not data:
         return jsonify({'msg': 'No data provided for update'}), 400
 
-    current_user_identity = get_jwt_identity()
-    user_id = current_user_identity['id']
-    user_role = current_user_identity['role']
+    current_user_identity = current_identity()
 
     try:
-        site = mongo.db.websites.find_one({'_id': ObjectId(id)})
-        if not site:
-            return jsonify({'msg': 'Website not found'}), 404
-
-        if user_role == 'Editor' and site.get('owner') != user_id:
-            return jsonify({'msg': 'Permission denied'}), 403
-
         update_fields = {}
         if 'content' in data and isinstance(data['content'], dict):
             for key, value in data['content'].items():
                 update_fields[f"content.{key}"] = value
         else:
+            # Clients may send back a whole document from GET, including fields they cannot change
             for key, value in data.items():
-                if key != '_id':
+                if key in PATCHABLE_FIELDS:
                     update_fields[key] = value
 
         if not update_fields:
@@ -237,23 +328,232 @@ def update_website(id):
 
         update_fields['last_updated'] = datetime.utcnow()
 
-        mongo.db.websites.update_one(
-            {'_id': ObjectId(id)},
-            {'$set': update_fields}
-        )
+        query = {'_id': ObjectId(id)}
+        if current_user_identity.role == 'Editor':
+            query['owner'] = current_user_identity.id
+        updated_site, failure = write_with_view(query, {'$set': update_fields}, current_user_identity)
+        if failure is not None:
+            return failure
+        # The new last_updated already makes cached renderings stale; free this worker's copy now
+        preview_cache.invalidate(id)
+        export_website_safely(updated_site)
         return jsonify({'msg': 'Website updated successfully'}), 200
 
     except Exception as e:
-        print(f"ERROR in update_website: {e}")
+        logger.exception("update_website failed: %s", e)
+        return jsonify({'msg': 'Internal Server Error updating website', 'error_details': str(e)}), 500
+
+# MongoDB errors for paths that don't fit the stored document (BadValue, PathNotViable, ConflictingUpdateOperators)
+PATCH_CONFLICT_CODES = (2, 28, 40)
+
+def version_filter(version):
+    # Documents written before versioning have no 'version' field; they count as version 0
+    return {'$in': [0, None]} if version == 0 else version
+
+def explain_failed_update(site, identity, expected_version):
+    """
+    Returns the error response for a conditional write whose filter matched nothing, given
+    the site as it is now: 404 if it is gone, 403 if the Editor doesn't own it, or 412 (with
+    the current version) if If-Match named another version. None if none of these apply.
+    """
+    if not site:
+        return jsonify({'msg': 'Website not found'}), 404
+    if identity.role == 'Editor' and site.get('owner') != identity.id:
+        return jsonify({'msg': 'Permission denied'}), 403
+    current_version = site.get('version', 0)
+    if expected_version is not None and current_version != expected_version:
+        response = jsonify({'msg': 'Website was modified by someone else', 'version': current_version})
+        response.set_etag(str(current_version))
+        return response, 412
+    return None
+
+# Attempts of a write whose view model was built from a version another writer got ahead of
+WRITE_ATTEMPTS = 3
+
+def write_with_view(query, update, identity, expected_version=None, on_conflict=None):
+    """
+    Applies 'update' to the website matched by 'query' and increments its version, storing
+    in the same find_one_and_update the view model of the content the update produces, so
+    readers never see new content next to an old view model. The view model is built from
+    the content as read just before, so the write is pinned to that version; when another
+    writer got in between it is rebuilt and retried (without If-Match) or fails with 412.
+    Returns (updated site, None) or (None, error response). on_conflict(site) makes the
+    response for a write that failed on the caller's own conditions (default: 404).
+    """
+    pinned_version = None
+    for _ in range(WRITE_ATTEMPTS):
+        site = mongo.db.websites.find_one({'_id': query['_id']}, {'owner': 1, 'version': 1, 'content': 1})
+        failure = explain_failed_update(site, identity, expected_version)
+        if failure is not None:
+            return None, failure
+        version = site.get('version', 0)
+        if version == pinned_version:
+            # Nobody else wrote in between, so one of the caller's conditions did not hold
+            return None, on_conflict(site) if on_conflict else (jsonify({'msg': 'Website not found'}), 404)
+        pinned_version = version
+
+        try:
+            content = apply_update({'content': site['content']} if 'content' in site else {}, update).get('content')
+        except PatchError as e:
+            return None, (jsonify({'msg': 'Update cannot be applied to this website', 'error_details': str(e)}), 409)
+        view = build_view_model(content)
+        view['version'] = version + 1
+
+        updated_site = mongo.db.websites.find_one_and_update(
+            {**query, 'version': version_filter(version)},
+            {**update, '$set': {**update.get('$set', {}), 'view': view}, '$inc': {'version': 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated_site is not None:
+            return updated_site, None
+
+    return None, (jsonify({'msg': 'Website is being modified by someone else, please retry', 'version': version}), 409)
+
+@website_bp.route('/<id>', methods=['PATCH'])
+@permission_required('update_site')
+def patch_website(id):
+    """
+    Applies a partial update in a single atomic write.
+    The body is a JSON merge patch (application/merge-patch+json, also assumed for plain JSON)
+    or a JSON Patch (application/json-patch+json). Only the patched fields are written, through
+    $set/$unset paths, and the document's 'version' is incremented.
+    With an If-Match header carrying the version from GET's ETag, the write only happens if
+    nobody changed the site in between; otherwise it fails with 412 and the current version.
+    """
+    try:
+        website_id = ObjectId(id)
+        expected_version = parse_if_match(request.headers.get('If-Match'))
+        body = request.get_json(silent=True)
+        if request.mimetype == JSON_PATCH:
+            update, conditions = json_patch_to_update(body, PATCHABLE_FIELDS)
+        else:
+            update, conditions = merge_patch_to_update(body, PATCHABLE_FIELDS)
+    except PatchError as e:
+        return jsonify({'msg': str(e)}), 400
+    except Exception:
+        return jsonify({'msg': 'Invalid website ID'}), 400
+
+    current_user_identity = current_identity()
+    user_id = current_user_identity.id
+    user_role = current_user_identity.role
+
+    # Ownership, version, 'test' operations and the paths to replace or remove are all part of
+    # the filter, so the check and the write are one operation
+    query = {'_id': website_id, **conditions}
+    if user_role == 'Editor':
+        query['owner'] = user_id
+
+    update.setdefault('$set', {})['last_updated'] = datetime.utcnow()
+
+    def patch_conflict(site):
+        return jsonify({
+            'msg': 'Patch cannot be applied: a test failed or a path to replace or remove does not exist',
+            'version': site.get('version', 0)
+        }), 409
+
+    try:
+        updated_site, failure = write_with_view(
+            query, update, current_user_identity, expected_version, on_conflict=patch_conflict
+        )
+        if failure is not None:
+            return failure
+
+        preview_cache.invalidate(id)
+        export_website_safely(updated_site)
+        response = jsonify({'msg': 'Website updated successfully', 'version': updated_site['version']})
+        response.set_etag(str(updated_site['version']))
+        return response, 200
+
+    except OperationFailure as e:
+        if e.code in PATCH_CONFLICT_CODES:
+            return jsonify({'msg': 'Patch cannot be applied to this website', 'error_details': str(e)}), 409
+        logger.exception("patch_website failed: %s", e)
+        return jsonify({'msg': 'Internal Server Error updating website', 'error_details': str(e)}), 500
+    except Exception as e:
+        logger.exception("patch_website failed: %s", e)
+        return jsonify({'msg': 'Internal Server Error updating website', 'error_details': str(e)}), 500
+
+@website_bp.route('/<id>/regenerate/<section>', methods=['POST'])
+@permission_required('update_site')
+@rate_limited('generate')
+def regenerate_section(id, section):
+    """
+    Regenerates one top-level section of a website (e.g. 'services_section' or 'theme').
+    Only that section is requested from the model, with a narrowed schema and the rest of
+    the site as context, and only that subtree is written ($set of content.<section>), so an
+    edit costs a fraction of a full generation. 'version' is incremented as for PATCH, and an
+    If-Match header with the version from GET's ETag makes the write conditional.
+    Responds with the new value of the section and the website's new version.
+    """
+    if section not in SECTION_MAX_OUTPUT_TOKENS:
+        return jsonify({'msg': f"Unknown section '{section}'; expected one of: {', '.join(SECTION_MAX_OUTPUT_TOKENS)}"}), 400
+    try:
+        website_id = ObjectId(id)
+        expected_version = parse_if_match(request.headers.get('If-Match'))
+    except PatchError as e:
+        return jsonify({'msg': str(e)}), 400
+    except Exception:
+        return jsonify({'msg': 'Invalid website ID'}), 400
+
+    current_user_identity = current_identity()
+
+    try:
+        site = mongo.db.websites.find_one(
+            {'_id': website_id}, {'owner': 1, 'version': 1, 'business_type': 1, 'industry': 1, 'content': 1}
+        )
+        failure = explain_failed_update(site, current_user_identity, expected_version)
+        if failure is not None:
+            return failure
+    except Exception as e:
+        logger.exception("regenerate_section failed: %s", e)
+        return jsonify({'msg': 'Internal Server Error retrieving website', 'error_details': str(e)}), 500
+
+    content = site.get('content') if isinstance(site.get('content'), dict) else {}
+    backend = current_backend()
+    try:
+        value = backend.generate_section(section, site.get('business_type'), site.get('industry'), content)
+    except CircuitOpenError:
+        return jsonify({'msg': 'AI generation is temporarily unavailable. Please try again shortly.'}), 503
+    except Exception as e:
+        # Upstream error details stay in the log, as for generation jobs
+        logger.error("regenerate_section: %s backend failed: %s", backend.name, e)
+        value = None
+    if value is None or (section == 'services_section' and not is_valid_generation({section: value})):
+        return jsonify({'msg': 'AI failed to regenerate this section. Please try again.'}), 502
+
+    query = {'_id': website_id}
+    if current_user_identity.role == 'Editor':
+        query['owner'] = current_user_identity.id
+
+    try:
+        # The site may have changed while the model was writing; the write re-reads it
+        updated_site, failure = write_with_view(
+            query, {'$set': {f"content.{section}": value, 'last_updated': datetime.utcnow()}},
+            current_user_identity, expected_version
+        )
+        if failure is not None:
+            return failure
+
+        preview_cache.invalidate(id)
+        export_website_safely(updated_site)
+        response = jsonify({
+            'msg': 'Section regenerated successfully',
+            'section': section,
+            'value': value,
+            'version': updated_site['version']
+        })
+        response.set_etag(str(updated_site['version']))
+        return response, 200
+    except Exception as e:
+        logger.exception("regenerate_section failed: %s", e)
         return jsonify({'msg': 'Internal Server Error updating website', 'error_details': str(e)}), 500
 
 @website_bp.route('/<id>', methods=['DELETE'])
-@jwt_required()
 @permission_required('delete_site')
 def delete_website(id):
-    current_user_identity = get_jwt_identity()
-    user_id = current_user_identity['id']
-    user_role = current_user_identity['role']
+    current_user_identity = current_identity()
+    user_id = current_user_identity.id
+    user_role = current_user_identity.role
 
     try:
         site = mongo.db.websites.find_one({'_id': ObjectId(id)})
@@ -266,10 +566,12 @@ def delete_website(id):
         result = mongo.db.websites.delete_one({'_id': ObjectId(id)})
 
         if result.deleted_count == 1:
+            preview_cache.invalidate(id)
+            site_exporter.remove(id)
             return jsonify({'msg': 'Website deleted successfully'}), 200
         else:
             return jsonify({'msg': 'Website not found or already deleted'}), 404
 
     except Exception as e:
-        print(f"ERROR in delete_website: {e}")
+        logger.exception("delete_website failed: %s", e)
         return jsonify({'msg': 'Internal Server Error deleting website', 'error_details': str(e)}), 500
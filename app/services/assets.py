@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+try:
+    import brotli # Optional: without it only gzip variants are kept
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# The pages and scripts of the single-page frontend, served by frontend_bp
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'frontend')
+
+# src/href attributes of the HTML pages that may point at a local asset
+_REFERENCE_RE = re.compile(r'''(\b(?:src|href)=["'])([^"'#?]+)(["'])''', re.IGNORECASE)
+
+# Variants smaller than this are not worth a Content-Encoding
+MIN_COMPRESS_SIZE = 256
+
+class Asset:
+    """
+    One frontend file held in memory with its fingerprint (a digest of the body) and its
+    gzip and brotli variants, compressed once with the highest levels.
+    """
+
+    def __init__(self, name, body, mtime=None):
+        self.name = name
+        self.body = body
+        self.mtime = mtime
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self._add_variant('gzip', gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._add_variant('br', brotli.compress(body, quality=11))
+
+    def _add_variant(self, encoding, compressed):
+        # Already compressed formats (images, fonts) don't shrink any further
+        if len(compressed) < len(self.body):
+            self.variants[encoding] = compressed
+
+    @property
+    def is_page(self):
+        return self.mimetype == 'text/html'
+
+    @property
+    def fingerprinted_name(self):
+        stem, ext = os.path.splitext(self.name)
+        return f"{stem}.{self.digest}{ext}"
+
+    @property
+    def url(self):
+        return f"/assets/{self.fingerprinted_name}"
+
+    def encoded(self, encoding):
+        """Returns (body, Content-Encoding) for the negotiated encoding, or the plain body."""
+        if encoding in self.variants:
+            return self.variants[encoding], encoding
+        return self.body, None
+
+class FrontendAssets:
+    """
+    The frontend directory, loaded into memory when the app is created (with preload_app,
+    once in the gunicorn master).
+    Scripts, stylesheets and images are fingerprinted and served under /assets/ as immutable,
+    so browsers keep them until a deploy changes their content. The HTML pages keep their
+    URLs, which users bookmark; their references to local assets are rewritten to the
+    fingerprinted URLs, and they are revalidated on each visit (a 304 while unchanged).
+    With FRONTEND_ASSETS_RELOAD (for development), changed files are picked up from disk.
+    """
+
+    def __init__(self, directory=FRONTEND_DIR):
+        self.directory = directory
+        self.reload = False
+        self.assets = {}
+
+    def init_app(self, app):
+        self.reload = app.config.get('FRONTEND_ASSETS_RELOAD', False)
+        self.load()
+        app.extensions['frontend_assets'] = self
+        logger.info("Loaded %d frontend files from %s", len(self.assets), self.directory)
+
+    def load(self):
+        assets = {}
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                with open(path, 'rb') as asset_file:
+                    assets[name] = Asset(name, asset_file.read(), os.path.getmtime(path))
+
+        # Pages are rewritten once every other file has its fingerprint
+        for name, asset in assets.items():
+            if asset.is_page:
+                body = self.rewrite_references(asset.body.decode('utf-8'), name, assets)
+                assets[name] = Asset(name, body.encode('utf-8'), asset.mtime)
+        self.assets = assets
+
+    @staticmethod
+    def rewrite_references(html, page_name, assets):
+        """Points the page's src/href attributes at the fingerprinted URLs of local, non-HTML files."""
+        base = os.path.dirname(page_name)
+
+        def fingerprint(match):
+            # Root-relative references ('/scripts.js') name the same files as relative ones
+            target = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, '/').lstrip('/')
+            asset = assets.get(target)
+            if asset is None or asset.is_page:
+                return match.group(0)
+            return f"{match.group(1)}{asset.url}{match.group(3)}"
+
+        return _REFERENCE_RE.sub(fingerprint, html)
+
+    def _stale(self):
+        for name, asset in self.assets.items():
+            try:
+                if os.path.getmtime(os.path.join(self.directory, name)) != asset.mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def get(self, name):
+        """Returns the Asset for a path relative to the frontend directory, or None."""
+        if self.reload and self._stale():
+            self.load()
+        return self.assets.get(name)
+
+    def by_fingerprint(self, fingerprinted_name):
+        """
+        Resolves an /assets/ name ('scripts.<digest>.js') to (Asset, whether the digest is
+        current), or (None, False) for a file that does not exist.
+        """
+        stem, ext = os.path.splitext(fingerprinted_name)
+        stem, _, digest = stem.rpartition('.')
+        asset = self.get(stem + ext)
+        if asset is None or asset.is_page:
+            return None, False
+        return asset, digest == asset.digest
+
+# One copy of the frontend per worker process (shared with the master when preloaded)
+frontend_assets = FrontendAssets()
@@ -0,0 +1,56 @@
+import logging
+
+from app.services.metrics import mongo_command_metrics, mongo_pool_metrics
+from app.services.read_routing import read_routing
+
+logger = logging.getLogger(__name__)
+
+class AsyncMongo:
+    """
+    Motor (asyncio MongoDB driver) client used by the ASGI entry point.
+    One client, and so one connection pool of ASYNC_MONGO_MAX_POOL_SIZE connections (with
+    the WSGI client's minimum size and wait timeout), is shared by every coroutine of the
+    process. The client must be created on the event loop that uses it, so app.asgi calls
+    connect() from the lifespan startup, not at import.
+    Motor is only needed for ASGI serving and is imported on connect().
+    """
+
+    def __init__(self):
+        self.client = None
+        self.db = None
+        self._databases = {}
+
+    def connect(self, app):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        self.client = AsyncIOMotorClient(
+            app.config['MONGO_URI'],
+            maxPoolSize=app.config.get('ASYNC_MONGO_MAX_POOL_SIZE', 100),
+            minPoolSize=app.config.get('MONGO_MIN_POOL_SIZE', 0),
+            waitQueueTimeoutMS=app.config.get('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+            event_listeners=[mongo_command_metrics, mongo_pool_metrics]
+        )
+        # Same database as flask_pymongo: the one named in MONGO_URI
+        self.db = self.client.get_default_database()
+        logger.info("Async MongoDB client connected (max pool size %s)", self.client.max_pool_size)
+        return self.db
+
+    def db_for(self, blueprint):
+        """Async counterpart of ReadRouting.db_for: the database with the blueprint's read preference."""
+        preference = read_routing.preference_for(blueprint)
+        if preference is None:
+            return self.db
+        database = self._databases.get(blueprint)
+        if database is None:
+            database = self._databases[blueprint] = self.db.with_options(read_preference=preference)
+        return database
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.db = None
+        self._databases = {}
+
+# One client per worker process
+async_mongo = AsyncMongo()
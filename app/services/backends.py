@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+
+from flask import current_app
+
+from app.services.generation import (
+    arequest_gemini_content, astream_gemini_sections, request_gemini_content, request_section_content,
+    stream_gemini_sections
+)
+from app.services.generation_cache import normalize_text
+
+class GenerationBackend:
+    """
+    Interface of the content generators behind the generate routes, jobs and batches.
+    generate() returns the website content dict and raises on failure; stream_sections()
+    yields (section, value) pairs as they become available. Backends that cannot stream
+    get stream_sections() for free from generate(). generate_section() returns a new value
+    for one top-level section, given the site's current content; by default it takes the
+    section from a full generation.
+    agenerate() and astream_sections() are the coroutine versions used by the ASGI entry
+    point; by default they run the synchronous methods in a thread.
+    """
+
+    name = None
+
+    def init_app(self, app):
+        pass
+
+    def generate(self, business_type, industry):
+        raise NotImplementedError
+
+    def stream_sections(self, business_type, industry):
+        yield from self.generate(business_type, industry).items()
+
+    def generate_section(self, section, business_type, industry, content):
+        return self.generate(business_type, industry)[section]
+
+    async def agenerate(self, business_type, industry):
+        return await asyncio.to_thread(self.generate, business_type, industry)
+
+    async def astream_sections(self, business_type, industry):
+        content = await self.agenerate(business_type, industry)
+        for section, value in content.items():
+            yield section, value
+
+class GeminiBackend(GenerationBackend):
+    """
+    Google Gemini, through the generation cache and the resilient client.
+    """
+
+    name = 'gemini'
+
+    def generate(self, business_type, industry):
+        return request_gemini_content(business_type, industry)
+
+    def stream_sections(self, business_type, industry):
+        return stream_gemini_sections(business_type, industry)
+
+    def generate_section(self, section, business_type, industry, content):
+        return request_section_content(section, business_type, industry, content)
+
+    async def agenerate(self, business_type, industry):
+        return await arequest_gemini_content(business_type, industry)
+
+    def astream_sections(self, business_type, industry):
+        return astream_gemini_sections(business_type, industry)
+
+# Small corpus for the local backend's word-level Markov chain.
+# {business} and {industry} are filled in after a sentence has been generated.
+_CORPUS = (
+    "We are a {business} that puts people first in everything we do. "
+    "Our team brings years of {industry} experience to every project we take on. "
+    "Every client gets a plan built around their goals and their budget. "
+    "We believe great service starts with listening to what you need. "
+    "Our {business} has grown by word of mouth and honest work. "
+    "We combine modern tools with a personal touch that clients remember. "
+    "From the first call to the final result we keep you in the loop. "
+    "Quality and reliability are at the heart of our {industry} work. "
+    "We are proud to serve our local community and beyond. "
+    "Our experts are ready to help you get more from every visit. "
+    "We make {industry} simple, friendly and affordable for everyone. "
+    "Every detail matters to us because it matters to you."
+)
+
+def _build_chain(corpus):
+    chain = {}
+    words = corpus.split()
+    for current, following in zip(words, words[1:]):
+        if not current.endswith('.'):
+            chain.setdefault(current, []).append(following)
+    starts = [word for previous, word in zip(words, words[1:]) if previous.endswith('.')]
+    return chain, [words[0]] + starts
+
+_CHAIN, _STARTS = _build_chain(_CORPUS)
+
+_HEADLINES = (
+    "Welcome to your {business}",
+    "Your trusted {business}",
+    "{industry} done right",
+    "Better {industry}, closer to home"
+)
+
+_SERVICES = (
+    ("Consultation", "Talk to our {business} experts about what you need."),
+    ("Custom Orders", "Products and services built around your needs."),
+    ("Support", "Friendly help whenever you need it."),
+    ("Planning", "A clear plan and timeline before any work begins."),
+    ("Maintenance", "Regular check-ins that keep everything running smoothly."),
+    ("Workshops", "Hands-on sessions covering the basics of {industry}."),
+    ("Express Service", "Same-day turnaround for urgent requests."),
+    ("Memberships", "Priority booking and member-only pricing.")
+)
+
+_PALETTES = (
+    ("#3498db", "#2c3e50", "#f4f7f6", "#333333"),
+    ("#e67e22", "#34495e", "#fdf6ec", "#2d2d2d"),
+    ("#27ae60", "#1e3d2f", "#f3faf5", "#263238"),
+    ("#8e44ad", "#2e1a47", "#f8f4fb", "#2b2b2b"),
+    ("#c0392b", "#3b1f1f", "#fcf3f2", "#303030")
+)
+
+_FONTS = ("Inter, sans-serif", "Georgia, serif", "Roboto, sans-serif", "Merriweather, serif")
+
+class LocalBackend(GenerationBackend):
+    """
+    Deterministic local generator for development, tests and load tests.
+    Content is schema-valid, derived from a template plus a tiny Markov chain, and seeded by
+    the normalized inputs, so the same request always yields the same website. It costs
+    microseconds and never touches the network; 'latency' (LOCAL_BACKEND_LATENCY_MS) can
+    simulate upstream response times.
+    """
+
+    name = 'local'
+
+    def __init__(self):
+        self.latency = 0.0
+
+    def init_app(self, app):
+        self.latency = app.config.get('LOCAL_BACKEND_LATENCY_MS', 0) / 1000.0
+
+    def _sentence(self, rng, max_words=24):
+        word = rng.choice(_STARTS)
+        words = [word]
+        while not word.endswith('.') and len(words) < max_words and word in _CHAIN:
+            word = rng.choice(_CHAIN[word])
+            words.append(word)
+        sentence = ' '.join(words)
+        return sentence if sentence.endswith('.') else sentence + '.'
+
+    def generate(self, business_type, industry):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._build(business_type, industry)
+
+    async def agenerate(self, business_type, industry):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._build(business_type, industry)
+
+    def generate_section(self, section, business_type, industry, content):
+        if self.latency:
+            time.sleep(self.latency)
+        # Seeded by the current value too, so every regeneration gives a different (but reproducible) variant
+        current = json.dumps((content or {}).get(section), sort_keys=True)
+        return self._build(business_type, industry, salt=current)[section]
+
+    def _build(self, business_type, industry, salt=''):
+        business = normalize_text(business_type)
+        industry_name = normalize_text(industry)
+        # Without a salt the seed is the one full generations have always used
+        key = f"{business}|{industry_name}" + (f"|{salt}" if salt else '')
+        seed = hashlib.sha256(key.encode('utf-8')).digest()
+        rng = random.Random(int.from_bytes(seed[:8], 'big'))
+        fill = lambda text: text.format(business=business, industry=industry_name)
+
+        services = rng.sample(_SERVICES, rng.randint(3, 5))
+        primary, secondary, background, text_color = rng.choice(_PALETTES)
+        return {
+            "title": f"{business.title()} | {industry_name.title()}",
+            "hero_section": {
+                "heading": fill(rng.choice(_HEADLINES)),
+                "subheading": fill(self._sentence(rng)),
+                "image_description": f"A bright photo of a {business} at work"
+            },
+            "about_section": {
+                "heading": "About Us",
+                "text": fill(' '.join(self._sentence(rng) for _ in range(3)))
+            },
+            "services_section": {
+                "heading": "Our Services",
+                "items": [{"title": title, "description": fill(description)} for title, description in services]
+            },
+            "contact_section": {
+                "heading": "Contact Us",
+                "email": "info@example.com",
+                "phone": "+1 (123) 456-7890",
+                "address": "123 Business Rd, City, Country"
+            },
+            "theme": {
+                "primary_color": primary,
+                "secondary_color": secondary,
+                "background_color": background,
+                "text_color": text_color,
+                "heading_color": secondary,
+                "font_family": rng.choice(_FONTS),
+                "section_bg_color": "#ffffff",
+                "service_item_bg_color": "#f9f9f9",
+                "border_color": "#eeeeee",
+                "shadow_color": "#cccccc"
+            }
+        }
+
+# Backends selectable through the GENERATION_BACKEND config value.
+# 'fake' is the previous name of the local backend and kept for existing deployments.
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'local': LocalBackend,
+    'fake': LocalBackend
+}
+
+def create_backend(app):
+    """
+    Creates and configures the backend named by GENERATION_BACKEND and registers it on the app.
+    Raises ValueError for an unknown name, so a typo fails at startup instead of per request.
+    """
+    name = app.config.get('GENERATION_BACKEND', 'gemini')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown GENERATION_BACKEND '{name}', expected one of: {', '.join(sorted(BACKENDS))}")
+    backend = BACKENDS[name]()
+    backend.init_app(app)
+    app.extensions['generation_backend'] = backend
+    return backend
+
+def current_backend():
+    """Returns the generation backend of the current app."""
+    return current_app.extensions['generation_backend']
@@ -0,0 +1,80 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from google.api_core.exceptions import ResourceExhausted
+
+from app.services.generation import is_valid_generation
+from app.services.llm_client import CircuitOpenError
+from app.services.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+class BatchGenerator:
+    """
+    Generates content for many (business_type, industry) pairs at once.
+    Items run concurrently, at most 'concurrency' at a time per batch, and every model call
+    first takes a token from a per-process bucket so parallel batches together stay under
+    the configured request rate. Quota errors are already retried with backoff by the
+    Gemini client (LLM_MAX_RETRIES); if they persist the item fails and the bucket is
+    drained, which slows every other in-flight item down.
+    """
+
+    def __init__(self):
+        self.concurrency = 8
+        self.max_items = 50
+        self.acquire_timeout = 60
+        self.backend = None
+        self.bucket = TokenBucket(rate=5, capacity=10)
+
+    def init_app(self, app):
+        self.concurrency = app.config.get('BATCH_CONCURRENCY', self.concurrency)
+        self.max_items = app.config.get('BATCH_MAX_ITEMS', self.max_items)
+        self.bucket.configure(app.config.get('LLM_RATE_PER_SECOND', 5), app.config.get('LLM_BURST', 10))
+        self.backend = app.extensions['generation_backend']
+
+    def _generate_one(self, business_type, industry):
+        """
+        Returns (content, error message). Exactly one of the two is None.
+        """
+        if not self.bucket.acquire(timeout=self.acquire_timeout):
+            return None, 'Rate limit wait exceeded'
+        try:
+            content = self.backend.generate(business_type, industry)
+        except ResourceExhausted as e:
+            # The client's own retries were not enough: leave the quota alone for a while
+            logger.warning("Batch generation: quota exhausted for '%s'/'%s': %s", business_type, industry, e)
+            self.bucket.drain()
+            return None, 'AI quota exhausted, please retry later'
+        except CircuitOpenError:
+            # Gemini is failing; don't spend the rest of the batch's budget on it
+            return None, 'AI generation temporarily unavailable, please retry later'
+        except Exception as e:
+            logger.error("Batch generation error for '%s'/'%s': %s", business_type, industry, e)
+            return None, 'AI generation failed'
+
+        if not is_valid_generation(content):
+            return None, 'AI failed to generate valid services'
+        return content, None
+
+    def generate(self, pairs):
+        """
+        Generates content for a list of (business_type, industry) pairs.
+        Returns a list of (content, error message) in the same order.
+        """
+        if not pairs:
+            return []
+
+        # Worker threads need their own app context (e.g. for the cache's MongoDB access)
+        app = current_app._get_current_object()
+
+        def generate_one(business_type, industry):
+            with app.app_context():
+                return self._generate_one(business_type, industry)
+
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(pairs)), thread_name_prefix='batch') as pool:
+            futures = [pool.submit(generate_one, business_type, industry) for business_type, industry in pairs]
+            return [future.result() for future in futures]
+
+# One rate limiter per worker process, shared by all batches
+batch_generator = BatchGenerator()
@@ -0,0 +1,371 @@
+import asyncio
+import logging
+import os
+import json
+import threading
+import time
+
+from google.api_core.exceptions import GoogleAPIError, InvalidArgument, ResourceExhausted
+
+from app.services.generation_cache import generation_cache, make_cache_key, normalize_text
+from app.services.json_stream import TopLevelMemberParser
+from app.services.llm_client import AsyncResilientClient, ResilientClient, CircuitOpenError, InvalidGenerationError, RETRYABLE_ERRORS
+from app.services.metrics import LLM_CIRCUIT_REJECTIONS, record_llm_call
+
+logger = logging.getLogger(__name__)
+
+# Schema the model must follow. Kept at module level so it is built once, not per call.
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "hero_section": {
+            "type": "OBJECT",
+            "properties": {
+                "heading": {"type": "STRING"},
+                "subheading": {"type": "STRING"},
+                "image_description": {"type": "STRING"}
+            }
+        },
+        "about_section": {
+            "type": "OBJECT",
+            "properties": {
+                "heading": {"type": "STRING"},
+                "text": {"type": "STRING"}
+            }
+        },
+        "services_section": {
+            "type": "OBJECT",
+            "properties": {
+                "heading": {"type": "STRING"},
+                "items": {
+                    "type": "ARRAY",
+                    "items": {
+                        "type": "OBJECT",
+                        "properties": {
+                            "title": {"type": "STRING"},
+                            "description": {"type": "STRING"}
+                        }
+                    }
+                }
+            }
+        },
+        "contact_section": {
+            "type": "OBJECT",
+            "properties": {
+                "heading": {"type": "STRING"},
+                "email": {"type": "STRING"},
+                "phone": {"type": "STRING"},
+                "address": {"type": "STRING"}
+            }
+        },
+        "theme": {
+            "type": "OBJECT",
+            "properties": {
+                "primary_color": {"type": "STRING"},
+                "secondary_color": {"type": "STRING"},
+                "background_color": {"type": "STRING"},
+                "text_color": {"type": "STRING"},
+                "heading_color": {"type": "STRING"},
+                "font_family": {"type": "STRING"},
+                "section_bg_color": {"type": "STRING"},
+                "service_item_bg_color": {"type": "STRING"},
+                "border_color": {"type": "STRING"},
+                "shadow_color": {"type": "STRING"}
+            },
+            "required": [
+                "primary_color", "secondary_color", "background_color", "text_color",
+                "heading_color", "font_family", "section_bg_color", "service_item_bg_color",
+                "border_color", "shadow_color"
+            ]
+        }
+    },
+    "required": [
+        "title", "hero_section", "about_section", "services_section", "contact_section", "theme"
+    ]
+}
+
+MODEL_NAME = 'gemini-1.5-flash'
+
+_model = None
+_model_pid = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """
+    Returns the process's GenerativeModel, shared by all requests.
+    google.generativeai (and the gRPC stack under it) is imported and configured on first
+    use rather than at import, so workers that never generate (e.g. preview-only traffic)
+    don't load it, and a preloading gunicorn master never opens gRPC channels that its
+    forked workers would inherit. A forked process builds its own model.
+    """
+    global _model, _model_pid
+    model = _model
+    if model is not None and _model_pid == os.getpid():
+        return model
+    with _model_lock:
+        if _model is None or _model_pid != os.getpid():
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _model = genai.GenerativeModel(MODEL_NAME)
+            _model_pid = os.getpid()
+        return _model
+
+# Shared Gemini client with retries, circuit breaker and optional hedging (configured in create_app)
+gemini_client = ResilientClient(get_model)
+# Its asyncio counterpart for the ASGI entry point, sharing the breaker, settings and counters
+gemini_async_client = AsyncResilientClient(gemini_client)
+
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": RESPONSE_SCHEMA,
+    "temperature": 0.7,
+    "max_output_tokens": 1500
+}
+
+def build_prompt(business_type, industry):
+    """
+    Builds the prompt sent to the model for a full website.
+    """
+    return (
+        f"Generate a detailed JSON structure for a website for a '{business_type}' business "
+        f"in the '{industry}' industry. The JSON should follow this exact schema for easy parsing. "
+        f"The 'services_section.items' array must contain at least 3 service items. Each item must include a 'title' and a 'description'. "
+        f"Do not return an empty array. If unsure, make up relevant sample services based on the business type. "
+        f"Make the content engaging and relevant to the business and industry. "
+        f"Additionally, generate a 'theme' object with distinct color palettes and a suitable font family "
+        f"for this type of business. The colors should be in hexadecimal format (e.g., '#RRGGBB'). "
+        f"The entire response MUST be a valid JSON object."
+    )
+
+def prompt_and_cache_key(business_type, industry):
+    """
+    Returns the prompt for a full website and its generation cache key.
+    Inputs are normalized first so equivalent requests map onto the same key.
+    """
+    prompt_text = build_prompt(normalize_text(business_type), normalize_text(industry))
+    return prompt_text, make_cache_key(prompt_text, RESPONSE_SCHEMA, MODEL_NAME, GENERATION_CONFIG)
+
+# Sections that can be regenerated on their own, with the output budget each needs.
+# A whole site is given 1500 tokens; a single section needs a fraction of that.
+SECTION_MAX_OUTPUT_TOKENS = {
+    "title": 64,
+    "hero_section": 200,
+    "about_section": 400,
+    "services_section": 600,
+    "contact_section": 150,
+    "theme": 250
+}
+
+def _section_schema(section):
+    # The response is {"<section>": ...}, so a single STRING section (the title) is still a JSON object
+    return {
+        "type": "OBJECT",
+        "properties": {section: RESPONSE_SCHEMA["properties"][section]},
+        "required": [section]
+    }
+
+# Narrowed schema and generation config per section, built once like RESPONSE_SCHEMA
+SECTION_SCHEMAS = {section: _section_schema(section) for section in SECTION_MAX_OUTPUT_TOKENS}
+SECTION_GENERATION_CONFIGS = {
+    section: {
+        "response_mime_type": "application/json",
+        "response_schema": SECTION_SCHEMAS[section],
+        "temperature": 0.9,
+        "max_output_tokens": max_tokens
+    }
+    for section, max_tokens in SECTION_MAX_OUTPUT_TOKENS.items()
+}
+
+# Extra requirements per section, taken from the full-site prompt
+SECTION_RULES = {
+    "services_section": (
+        "The 'items' array must contain at least 3 service items, each with a 'title' and a 'description'. "
+        "Do not return an empty array. "
+    ),
+    "theme": (
+        "Choose a distinct color palette and a suitable font family for this type of business. "
+        "The colors should be in hexadecimal format (e.g., '#RRGGBB'). "
+    )
+}
+
+def build_section_prompt(section, business_type, industry, content):
+    """
+    Builds the prompt regenerating one section of an existing website.
+    The rest of the site is sent as context, so the new section fits it; the section being
+    replaced is left out, so the model writes it afresh instead of paraphrasing it.
+    """
+    context = {key: value for key, value in (content or {}).items() if key != section}
+    return (
+        f"You are editing the website of a '{business_type}' business in the '{industry}' industry. "
+        f"Here is the rest of its content as JSON: {json.dumps(context, separators=(',', ':'))} "
+        f"Write a new, different '{section}' that fits this content and make it engaging. "
+        f"{SECTION_RULES.get(section, '')}"
+        f"Respond with a JSON object whose only key is '{section}'."
+    )
+
+def request_section_content(section, business_type, industry, content):
+    """
+    Regenerates one section of a website with Gemini and returns its new value.
+    Not cached: every call is meant to produce a new variant. Errors are raised as in
+    request_gemini_content.
+    """
+    prompt_text = build_section_prompt(section, business_type, industry, content)
+    data = gemini_client.generate_json(prompt_text, SECTION_GENERATION_CONFIGS[section], SECTION_SCHEMAS[section])
+    return data[section]
+
+def request_gemini_content(business_type, industry):
+    """
+    Generates website content with Gemini, going through the generation cache.
+    Unlike generate_gemini_content, errors are raised to the caller: API errors once
+    retries are used up, CircuitOpenError while Gemini is failing, and
+    InvalidGenerationError for output that could not be repaired.
+    """
+    prompt_text, cache_key = prompt_and_cache_key(business_type, industry)
+
+    cached_content = generation_cache.get(cache_key)
+    if cached_content is not None:
+        return cached_content
+
+    # Retries, circuit breaking, hedging and JSON repair all happen in the client
+    generated_content = gemini_client.generate_json(prompt_text, GENERATION_CONFIG, RESPONSE_SCHEMA)
+    # Only cache content the routes would accept, never a bad generation
+    if is_valid_generation(generated_content):
+        generation_cache.put(cache_key, generated_content)
+    return generated_content
+
+def generate_gemini_content(business_type, industry):
+    try:
+        return request_gemini_content(business_type, industry)
+    except (InvalidArgument, ResourceExhausted, GoogleAPIError) as e:
+        logger.error("Gemini API error: %s", e)
+        return None
+    except CircuitOpenError as e:
+        logger.warning("Gemini circuit open, not calling the API: %s", e)
+        return None
+    except InvalidGenerationError as e:
+        logger.error("Invalid JSON from Gemini API: %s", e)
+        return None
+    except Exception as e:
+        logger.exception("Unexpected error during Gemini content generation: %s", e)
+        return None
+
+def stream_gemini_sections(business_type, industry):
+    """
+    Streams a generation: yields (section, value) for each top-level section of the
+    website JSON as soon as the model has finished writing it. API errors are raised.
+    A complete, valid result is cached like request_gemini_content's.
+    """
+    prompt_text, cache_key = prompt_and_cache_key(business_type, industry)
+
+    cached_content = generation_cache.get(cache_key)
+    if cached_content is not None:
+        yield from cached_content.items()
+        return
+
+    # A stream can't be retried once sections went out, but it still respects the breaker
+    breaker = gemini_client.breaker
+    ticket = breaker.allow()
+    if not ticket:
+        LLM_CIRCUIT_REJECTIONS.inc()
+        raise CircuitOpenError('Generation service temporarily unavailable')
+
+    model = get_model()
+    parser = TopLevelMemberParser()
+    generated_content = {}
+    started = time.monotonic()
+    try:
+        response = model.generate_content(
+            prompt_text,
+            generation_config=GENERATION_CONFIG,
+            stream=True
+        )
+        for chunk in response:
+            for section, value in parser.feed(chunk.text):
+                generated_content[section] = value
+                yield section, value
+    except RETRYABLE_ERRORS:
+        breaker.record_failure()
+        record_llm_call(time.monotonic() - started, 'error')
+        raise
+    except BaseException:
+        # Other API errors, unparsable output, or the client went away (GeneratorExit, CancelledError)
+        breaker.abandon(ticket)
+        raise
+    breaker.record_success()
+    # Usage metadata is complete once the stream has been consumed
+    record_llm_call(time.monotonic() - started, 'ok', response)
+
+    if is_valid_generation(generated_content):
+        generation_cache.put(cache_key, generated_content)
+
+async def arequest_gemini_content(business_type, industry):
+    """
+    Async version of request_gemini_content, for the ASGI entry point.
+    The model call is awaited; the cache's (synchronous) MongoDB tier runs in a thread.
+    """
+    prompt_text, cache_key = prompt_and_cache_key(business_type, industry)
+
+    cached_content = await asyncio.to_thread(generation_cache.get, cache_key)
+    if cached_content is not None:
+        return cached_content
+
+    generated_content = await gemini_async_client.generate_json(prompt_text, GENERATION_CONFIG, RESPONSE_SCHEMA)
+    if is_valid_generation(generated_content):
+        await asyncio.to_thread(generation_cache.put, cache_key, generated_content)
+    return generated_content
+
+async def astream_gemini_sections(business_type, industry):
+    """
+    Async version of stream_gemini_sections: an async generator of (section, value) pairs.
+    """
+    prompt_text, cache_key = prompt_and_cache_key(business_type, industry)
+
+    cached_content = await asyncio.to_thread(generation_cache.get, cache_key)
+    if cached_content is not None:
+        for section, value in cached_content.items():
+            yield section, value
+        return
+
+    breaker = gemini_client.breaker
+    ticket = breaker.allow()
+    if not ticket:
+        LLM_CIRCUIT_REJECTIONS.inc()
+        raise CircuitOpenError('Generation service temporarily unavailable')
+
+    model = get_model()
+    parser = TopLevelMemberParser()
+    generated_content = {}
+    started = time.monotonic()
+    try:
+        response = await model.generate_content_async(
+            prompt_text,
+            generation_config=GENERATION_CONFIG,
+            stream=True
+        )
+        async for chunk in response:
+            for section, value in parser.feed(chunk.text):
+                generated_content[section] = value
+                yield section, value
+    except RETRYABLE_ERRORS:
+        breaker.record_failure()
+        record_llm_call(time.monotonic() - started, 'error')
+        raise
+    except BaseException:
+        # Other API errors, unparsable output, or the client went away (GeneratorExit, CancelledError)
+        breaker.abandon(ticket)
+        raise
+    breaker.record_success()
+    record_llm_call(time.monotonic() - started, 'ok', response)
+
+    if is_valid_generation(generated_content):
+        await asyncio.to_thread(generation_cache.put, cache_key, generated_content)
+
+def is_valid_generation(generated_content):
+    """
+    Checks that generated content is usable, i.e. it has at least one service item.
+    """
+    return bool(generated_content) and \
+        isinstance(generated_content.get('services_section'), dict) and \
+        isinstance(generated_content['services_section'].get('items'), list) and \
+        len(generated_content['services_section']['items']) > 0
@@ -0,0 +1,149 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.services.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(value):
+    """
+    Normalizes user input so 'Bakery ', 'bakery' and 'BAKERY' share one cache entry.
+    """
+    return ' '.join(str(value).split()).lower()
+
+def make_cache_key(prompt, schema, model_name, generation_config):
+    """
+    Content-addressed key: SHA-256 over everything that influences the model output.
+    """
+    payload = json.dumps({
+        'prompt': prompt,
+        'schema': schema,
+        'model': model_name,
+        'config': generation_config
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class GenerationCache:
+    """
+    Two-tier cache for model generations.
+    The first tier is a per-worker LRU dict; the second is the 'generation_cache' collection,
+    shared by all workers, where entries carry an 'expires_at' date and are ignored once past it.
+    Each key holds up to 'variants' different generations. Until that many have been collected
+    a lookup misses (so the model is asked again); afterwards the variants are served round-robin.
+    """
+
+    def __init__(self, max_entries=256, ttl=86400, variants=1, enabled=True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.variants = variants
+        self.enabled = enabled
+        self._entries = OrderedDict() # key -> {'variants': [...], 'expires_at': epoch seconds, 'next': int}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('GENERATION_CACHE_ENABLED', self.enabled)
+        self.max_entries = app.config.get('GENERATION_CACHE_SIZE', self.max_entries)
+        self.ttl = app.config.get('GENERATION_CACHE_TTL', self.ttl)
+        self.variants = max(1, app.config.get('GENERATION_CACHE_VARIANTS', self.variants))
+        self.clear()
+
+    def clear(self):
+        """Empties the in-memory tier of this worker."""
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, variants, expires_at):
+        with self._lock:
+            entry = self._entries.get(key)
+            next_index = entry['next'] if entry else 0
+            self._entries[key] = {'variants': variants, 'expires_at': expires_at, 'next': next_index}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _pick(self, key):
+        # Returns the next variant of a complete, unexpired in-memory entry, or None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= time.time():
+                del self._entries[key]
+                return None
+            if len(entry['variants']) < self.variants:
+                return None
+            self._entries.move_to_end(key)
+            content = entry['variants'][entry['next'] % len(entry['variants'])]
+            entry['next'] += 1
+            return content
+
+    def get(self, key):
+        """
+        Returns a cached generation for 'key', or None if the model should be called.
+        """
+        if not self.enabled:
+            return None
+
+        content = self._pick(key)
+        if content is None:
+            try:
+                doc = mongo.db.generation_cache.find_one({'_id': key, 'expires_at': {'$gt': datetime.utcnow()}})
+            except PyMongoError as e:
+                logger.error("Generation cache error (read): %s", e)
+                doc = None
+            if doc and doc.get('variants'):
+                expires_in = (doc['expires_at'] - datetime.utcnow()).total_seconds()
+                self._remember(key, doc['variants'], time.time() + expires_in)
+                content = self._pick(key)
+
+        if content is None:
+            record_cache('generation', False)
+            return None
+        record_cache('generation', True)
+        # Callers may modify the result, so never hand out the cached object itself
+        return copy.deepcopy(content)
+
+    def put(self, key, content):
+        """
+        Stores a new variant for 'key' in both tiers, keeping at most 'variants' of them.
+        """
+        if not self.enabled:
+            return
+
+        content = copy.deepcopy(content)
+        now = datetime.utcnow()
+        try:
+            # An expired document must not keep its old variants and expiry date
+            mongo.db.generation_cache.delete_one({'_id': key, 'expires_at': {'$lte': now}})
+            doc = mongo.db.generation_cache.find_one_and_update(
+                {'_id': key},
+                {
+                    '$push': {'variants': {'$each': [content], '$slice': -self.variants}},
+                    '$setOnInsert': {'created_at': now, 'expires_at': now + timedelta(seconds=self.ttl)}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            variants = doc['variants']
+            expires_at = time.time() + (doc['expires_at'] - now).total_seconds()
+        except PyMongoError as e:
+            logger.error("Generation cache error (write): %s", e)
+            with self._lock:
+                entry = self._entries.get(key)
+                variants = (entry['variants'] if entry else []) + [content]
+            variants = variants[-self.variants:]
+            expires_at = time.time() + self.ttl
+        self._remember(key, variants, expires_at)
+
+# One in-memory tier per worker process
+generation_cache = GenerationCache()
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from app import bcrypt
+from app.services.metrics import (
+    PASSWORD_HASH_QUEUED, PASSWORD_HASH_REJECTIONS, PASSWORD_HASH_RUNNING, PASSWORD_HASH_WAIT
+)
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash did not finish in time."""
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool instead of the request thread.
+    bcrypt releases the GIL while hashing, so the pool caps how many cores a login burst
+    can take, while the rest of the worker's threads keep serving other requests.
+    Work beyond 'max_queue' waiting hashes is rejected straight away with HasherBusy, and a
+    hash still queued after 'timeout' seconds is cancelled. Queue depth and waits are
+    exported on /metrics.
+    """
+
+    def __init__(self):
+        self.max_workers = 2
+        self.max_queue = 32
+        self.timeout = 10
+        self.rounds = 12
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = 0 # submitted but not finished (queued + running)
+
+    def init_app(self, app):
+        self.max_workers = app.config.get('PASSWORD_HASH_WORKERS', self.max_workers)
+        self.max_queue = app.config.get('PASSWORD_HASH_MAX_QUEUE', self.max_queue)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+
+    def _get_executor(self):
+        # Created lazily (and re-created after a fork) so threads always belong to the serving process
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bcrypt')
+            self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                PASSWORD_HASH_REJECTIONS.inc()
+                raise HasherBusy('Password hashing queue is full')
+            self._pending += 1
+            executor = self._get_executor()
+        PASSWORD_HASH_QUEUED.inc()
+
+        submitted_at = time.monotonic()
+
+        def task():
+            PASSWORD_HASH_QUEUED.dec()
+            PASSWORD_HASH_RUNNING.inc()
+            PASSWORD_HASH_WAIT.observe(time.monotonic() - submitted_at)
+            try:
+                return fn(*args)
+            finally:
+                PASSWORD_HASH_RUNNING.dec()
+                with self._lock:
+                    self._pending -= 1
+
+        future = executor.submit(task)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            PASSWORD_HASH_REJECTIONS.inc()
+            # A hash still queued would take a thread after the client got its 503; a running
+            # one can't be stopped. A cancelled task never runs, so its bookkeeping is done here
+            if future.cancel():
+                PASSWORD_HASH_QUEUED.dec()
+                with self._lock:
+                    self._pending -= 1
+            raise HasherBusy('Password hashing timed out')
+
+    def hash(self, password):
+        """Returns a bcrypt hash of 'password' at the configured cost."""
+        return self._run(bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def verify(self, password_hash, password):
+        """Checks 'password' against a stored bcrypt hash."""
+        return self._run(bcrypt.check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if 'password_hash' was made with a different cost than the configured one."""
+        try:
+            # bcrypt hashes look like $2b$<cost>$<salt+hash>
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+# One pool per worker process
+password_hasher = PasswordHasher()
@@ -0,0 +1,157 @@
+import logging
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+# Every index the application relies on. create_app ensures these on startup,
+# so adding an index means adding an entry here.
+INDEXES = [
+    # signup/login look users up by email; unique also enforces one account per address
+    {'collection': 'users', 'keys': [('email', ASCENDING)], 'options': {'name': 'email_unique', 'unique': True}},
+    # Owner-scoped website listings, paginated by _id
+    {'collection': 'websites', 'keys': [('owner', ASCENDING), ('_id', ASCENDING)], 'options': {'name': 'owner_id'}},
+    # Sites shared with a user through the 'shared_with' list (multikey)
+    {'collection': 'websites', 'keys': [('shared_with', ASCENDING), ('_id', ASCENDING)],
+     'options': {'name': 'shared_with_id'}},
+    # Per-owner website listings, newest first
+    {'collection': 'websites', 'keys': [('owner', ASCENDING), ('last_updated', DESCENDING)],
+     'options': {'name': 'owner_last_updated'}},
+    # Dashboards sorted by recency
+    {'collection': 'websites', 'keys': [('last_updated', DESCENDING)], 'options': {'name': 'last_updated'}},
+    # Job recovery scans for stale 'running' and pending 'queued' jobs
+    {'collection': 'generation_jobs', 'keys': [('status', ASCENDING), ('started_at', ASCENDING)],
+     'options': {'name': 'status_started_at'}},
+    # The periodic sweep looks for running jobs whose lease expired
+    {'collection': 'generation_jobs', 'keys': [('status', ASCENDING), ('lease_expires_at', ASCENDING)],
+     'options': {'name': 'status_lease_expires_at'}},
+    # Cache collections: MongoDB deletes documents once 'expires_at' has passed
+    {'collection': 'generation_cache', 'keys': [('expires_at', ASCENDING)],
+     'options': {'name': 'expires_at_ttl', 'expireAfterSeconds': 0}},
+    # Shared rate limit buckets (RATE_LIMIT_BACKEND=mongo) are dropped once they would be full again
+    {'collection': 'rate_limits', 'keys': [('expires_at', ASCENDING)],
+     'options': {'name': 'expires_at_ttl', 'expireAfterSeconds': 0}},
+]
+
+# The query each route issues, with representative values, used to check query plans
+ROUTE_QUERIES = [
+    {'route': 'auth.signup / auth.login', 'collection': 'users', 'filter': {'email': 'user@example.com'}},
+    {'route': 'admin.list_users', 'collection': 'users', 'filter': {}, 'sort': [('_id', ASCENDING)]},
+    {'route': 'website.list_websites (Admin)', 'collection': 'websites', 'filter': {}, 'sort': [('_id', ASCENDING)]},
+    {'route': 'website.list_websites (Editor/Viewer)', 'collection': 'websites',
+     'filter': {'$or': [{'owner': '000000000000000000000000'}, {'shared_with': '000000000000000000000000'}]},
+     'sort': [('_id', ASCENDING)]},
+    {'route': 'website.list_websites (by owner, recent first)', 'collection': 'websites',
+     'filter': {'owner': '000000000000000000000000'}, 'sort': [('last_updated', DESCENDING)]},
+    {'route': 'website.get_website / preview.preview_website', 'collection': 'websites',
+     'filter': {'_id': '000000000000000000000000'}},
+    {'route': 'jobs.recover', 'collection': 'generation_jobs',
+     'filter': {'status': 'running', 'started_at': {'$lt': datetime(2000, 1, 1)}}},
+    {'route': 'jobs.sweep', 'collection': 'generation_jobs',
+     'filter': {'status': 'running', 'lease_expires_at': {'$lt': datetime(2000, 1, 1)}}},
+    {'route': 'generation_cache.get', 'collection': 'generation_cache',
+     'filter': {'_id': 'key', 'expires_at': {'$gt': datetime(2000, 1, 1)}}},
+]
+
+def ensure_indexes(db):
+    """
+    Creates every registered index. create_index is a no-op for an index that already
+    exists with the same definition, so this is safe to run on every start.
+    Returns the names of indexes that could not be created.
+    """
+    failed = []
+    for index in INDEXES:
+        try:
+            db[index['collection']].create_index(index['keys'], **index['options'])
+        except PyMongoError as e:
+            # e.g. duplicate emails already stored, or an index with the same name but other options
+            logger.warning("Could not create index %s.%s: %s", index['collection'], index['options']['name'], e)
+            failed.append(f"{index['collection']}.{index['options']['name']}")
+    return failed
+
+def find_missing_indexes(db):
+    """Returns 'collection.name' for registered indexes that do not exist."""
+    missing = []
+    for index in INDEXES:
+        existing = db[index['collection']].index_information()
+        if index['options']['name'] not in existing:
+            missing.append(f"{index['collection']}.{index['options']['name']}")
+    return missing
+
+def find_unused_indexes(db):
+    """
+    Returns (collection, name, ops) for indexes with no recorded use since the server started,
+    according to $indexStats. The _id index is never reported.
+    """
+    unused = []
+    collections = sorted({index['collection'] for index in INDEXES} | {'websites', 'users'})
+    for collection in collections:
+        for stats in db[collection].aggregate([{'$indexStats': {}}]):
+            if stats['name'] != '_id_' and stats['accesses']['ops'] == 0:
+                unused.append((collection, stats['name'], stats['accesses']['ops']))
+    return unused
+
+def _plan_stages(plan):
+    # Flattens a winning plan into [(stage, index name or None), ...] from the top down
+    stages = []
+    while plan:
+        stages.append((plan.get('stage'), plan.get('indexName')))
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+    return stages
+
+def explain_route_queries(db):
+    """
+    Explains every registered route query. Returns one dict per query with its plan stages.
+    """
+    plans = []
+    for query in ROUTE_QUERIES:
+        cursor = db[query['collection']].find(query['filter'])
+        if query.get('sort'):
+            cursor = cursor.sort(query['sort'])
+        explanation = cursor.explain()
+        stages = _plan_stages(explanation['queryPlanner']['winningPlan'])
+        plans.append({
+            'route': query['route'],
+            'collection': query['collection'],
+            'stages': stages,
+            'collection_scan': any(stage == 'COLLSCAN' for stage, _ in stages)
+        })
+    return plans
+
+indexes_cli = AppGroup('indexes', help='Manage the MongoDB indexes the application relies on.')
+
+@indexes_cli.command('ensure')
+def ensure_command():
+    """Creates any missing registered index."""
+    failed = ensure_indexes(mongo.db)
+    click.echo('All indexes ensured.' if not failed else f"Failed: {', '.join(failed)}")
+
+@indexes_cli.command('report')
+def report_command():
+    """Reports missing and unused indexes and the query plan of each route."""
+    missing = find_missing_indexes(mongo.db)
+    click.echo('Missing indexes:')
+    for name in missing or ['(none)']:
+        click.echo(f"  {name}")
+
+    click.echo('Unused indexes (no ops since server start):')
+    try:
+        unused = find_unused_indexes(mongo.db)
+        for collection, name, _ in unused:
+            click.echo(f"  {collection}.{name}")
+        if not unused:
+            click.echo('  (none)')
+    except PyMongoError as e:
+        click.echo(f"  unavailable: {e}")
+
+    click.echo('Route query plans:')
+    for plan in explain_route_queries(mongo.db):
+        flag = 'COLLSCAN' if plan['collection_scan'] else 'ok'
+        stages = ' <- '.join(f"{stage}({name})" if name else stage for stage, name in plan['stages'])
+        click.echo(f"  [{flag}] {plan['route']}: {stages}")
@@ -0,0 +1,415 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.services.async_db import async_mongo
+from app.services.generation import is_valid_generation
+from app.services.site_export import export_website_safely
+from app.services.view_model import attach_view_model
+
+logger = logging.getLogger(__name__)
+
+# Job states as stored in the 'status' field of generation_jobs
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+class GenerationJobQueue:
+    """
+    Runs website generations off the request thread.
+    Every job is persisted in the 'generation_jobs' collection before it is handed to a
+    bounded thread pool, so a restarted worker can pick up jobs that never finished.
+    Jobs are claimed with an atomic queued -> running transition, so the same job is
+    never generated twice even if several workers try to recover it.
+    A claimed job holds a lease ('lease_expires_at') that its process renews while it runs.
+    Every worker sweeps the collection periodically: jobs whose lease ran out (their worker
+    died or restarted) are re-queued and scheduled, and so are queued jobs nobody picked up.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_workers = 4
+        self.stale_after = 600
+        self.lease_seconds = 60
+        self.sweep_interval = 20
+        self.max_attempts = 3
+        self.backend = None
+        self._executor = None
+        self._pid = None
+        self._sweeper_pid = None
+        self._running = set()
+        self._scheduled = set() # ids waiting in or taken from this process's pool, until _run returns
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('GENERATION_WORKERS', self.max_workers)
+        self.stale_after = app.config.get('GENERATION_JOB_STALE_SECONDS', self.stale_after)
+        self.lease_seconds = app.config.get('GENERATION_JOB_LEASE_SECONDS', self.lease_seconds)
+        self.sweep_interval = app.config.get('GENERATION_JOB_SWEEP_SECONDS', self.sweep_interval)
+        self.max_attempts = app.config.get('GENERATION_JOB_MAX_ATTEMPTS', self.max_attempts)
+        self.backend = app.extensions['generation_backend']
+        app.extensions['generation_jobs'] = self
+
+    def _get_executor(self):
+        # Created lazily (and re-created after a fork) so threads always belong to the serving process
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='generation')
+                self._pid = os.getpid()
+                # Jobs scheduled in the parent's (or a shut down) pool will not run in this one
+                self._scheduled = set()
+            return self._executor
+
+    def _schedule(self, job_id):
+        """
+        Hands a job to this process's pool unless it is already waiting there or running, so
+        repeated sweeps of a backlog don't queue the same ids over and over. Returns whether
+        it was scheduled.
+        """
+        executor = self._get_executor()
+        with self._lock:
+            if job_id in self._scheduled:
+                return False
+            self._scheduled.add(job_id)
+        executor.submit(self._run, job_id)
+        return True
+
+    def submit(self, owner_id, business_type, industry):
+        """
+        Persists a new job and schedules it. Returns the job id as a string.
+        """
+        now = datetime.utcnow()
+        job = {
+            'owner': owner_id,
+            'business_type': business_type,
+            'industry': industry,
+            'status': QUEUED,
+            'attempts': 0,
+            'created_at': now,
+            'updated_at': now
+        }
+        result = mongo.db.generation_jobs.insert_one(job)
+        self.start_sweeper()
+        self._schedule(result.inserted_id)
+        return str(result.inserted_id)
+
+    def get(self, job_id):
+        """
+        Returns the stored job document, or None if it does not exist (or 'job_id' is not a valid id).
+        """
+        if not ObjectId.is_valid(job_id):
+            return None
+        return mongo.db.generation_jobs.find_one({'_id': ObjectId(job_id)})
+
+    def shutdown(self, wait=True):
+        """
+        Stops this process's thread pool, waiting for the jobs it has taken when 'wait' is set.
+        Jobs it never started stay queued for the next sweep; a later submit starts a new pool.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._scheduled = set()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def recover(self):
+        """
+        Re-queues jobs whose worker died mid-generation and schedules every queued job, then
+        starts this process's periodic sweep. Returns the number of jobs scheduled.
+        """
+        self.start_sweeper()
+        return self.sweep(queued_before=None)
+
+    def start_sweeper(self):
+        """Starts the thread renewing leases and sweeping jobs, once per process (also after a fork)."""
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            self._running = set()
+        threading.Thread(target=self._sweep_forever, name='generation-sweeper', daemon=True).start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.renew_leases()
+                # Queued jobs waiting longer than a lease were lost with their worker's thread pool
+                self.sweep(queued_before=datetime.utcnow() - timedelta(seconds=self.lease_seconds))
+            except Exception as e:
+                logger.error("Generation job sweep failed: %s", e)
+
+    def renew_leases(self):
+        """Extends the leases of the jobs this process is running."""
+        with self._lock:
+            running = list(self._running)
+        if running:
+            mongo.db.generation_jobs.update_many(
+                {'_id': {'$in': running}, 'status': RUNNING},
+                {'$set': {'lease_expires_at': datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+            )
+
+    def sweep(self, queued_before=None):
+        """
+        Re-queues running jobs whose lease expired (failing those out of attempts) and
+        schedules them, along with the queued jobs last updated before 'queued_before' (all
+        queued jobs if None). Jobs this process has scheduled already are skipped; those
+        scheduled by several processes are harmless, as only one claim succeeds.
+        Returns the number of jobs scheduled.
+        """
+        now = datetime.utcnow()
+        jobs = mongo.db.generation_jobs
+        expired = {'status': RUNNING, '$or': [
+            {'lease_expires_at': {'$lt': now}},
+            # Claimed before leases were recorded
+            {'lease_expires_at': {'$exists': False}, 'started_at': {'$lt': now - timedelta(seconds=self.stale_after)}}
+        ]}
+
+        jobs.update_many(
+            {**expired, 'attempts': {'$gte': self.max_attempts}},
+            {'$set': {'status': FAILED, 'error': 'Generation did not complete after several attempts', 'updated_at': now}}
+        )
+        requeued = jobs.update_many(expired, {'$set': {'status': QUEUED, 'updated_at': now}}).modified_count
+        if requeued:
+            logger.warning("Re-queued %d generation jobs whose worker stopped renewing them", requeued)
+
+        pending = {'status': QUEUED}
+        if queued_before is not None:
+            # The jobs just re-queued, and those queued for longer than any worker would take to claim them
+            pending['$or'] = [{'updated_at': now}, {'updated_at': {'$lt': queued_before}}]
+        scheduled = 0
+        for job in jobs.find(pending, {'_id': 1}):
+            if self._schedule(job['_id']):
+                scheduled += 1
+        return scheduled
+
+    def _claim(self, job_id):
+        now = datetime.utcnow()
+        return mongo.db.generation_jobs.find_one_and_update(
+            {'_id': job_id, 'status': QUEUED},
+            {'$set': {'status': RUNNING, 'started_at': now, 'updated_at': now,
+                      'lease_expires_at': now + timedelta(seconds=self.lease_seconds)},
+             '$inc': {'attempts': 1}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _finish(self, job_id, fields):
+        fields['updated_at'] = datetime.utcnow()
+        fields['finished_at'] = fields['updated_at']
+        mongo.db.generation_jobs.update_one({'_id': job_id}, {'$set': fields})
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            with self._lock:
+                self._running.add(job_id)
+            try:
+                job = self._claim(job_id)
+                if not job:
+                    # Already claimed by another worker, or finished
+                    return
+
+                try:
+                    generated_content = self.backend.generate(job['business_type'], job['industry'])
+                except Exception as e:
+                    # Upstream error details stay in the log; the job gets the usual message
+                    logger.error("Generation job %s: %s backend failed: %s", job_id, self.backend.name, e)
+                    generated_content = None
+                if not is_valid_generation(generated_content):
+                    self._finish(job_id, {
+                        'status': FAILED,
+                        'error': 'AI failed to generate valid services. Please try again or retry with different inputs.'
+                    })
+                    return
+
+                site_data = {
+                    'owner': job['owner'],
+                    'business_type': job['business_type'],
+                    'industry': job['industry'],
+                    'content': generated_content,
+                    'created_at': datetime.utcnow(),
+                    'last_updated': datetime.utcnow()
+                }
+                result = mongo.db.websites.insert_one(attach_view_model(site_data))
+                # insert_one added the new '_id' to site_data, so it can be exported as is
+                export_website_safely(site_data)
+                self._finish(job_id, {'status': DONE, 'website_id': str(result.inserted_id)})
+            except PyMongoError as e:
+                # Leave the job as it is; the sweep re-queues it once its lease has expired
+                logger.error("Generation job %s could not be persisted: %s", job_id, e)
+            except Exception as e:
+                logger.exception("Generation job %s failed: %s", job_id, e)
+                try:
+                    self._finish(job_id, {'status': FAILED, 'error': str(e)})
+                except PyMongoError as db_error:
+                    logger.error("Could not mark generation job %s as failed: %s", job_id, db_error)
+            finally:
+                with self._lock:
+                    self._running.discard(job_id)
+                    self._scheduled.discard(job_id)
+
+class AsyncGenerationJobQueue:
+    """
+    GenerationJobQueue for the ASGI entry point: the same 'generation_jobs' documents and
+    states, but each job is an asyncio task awaiting the backend and Motor instead of a pool
+    thread, so thousands of generations waiting on the model cost one process.
+    'max_concurrency' (ASYNC_GENERATION_CONCURRENCY) bounds the generations in flight; jobs
+    beyond it stay queued. Running jobs renew their lease from a heartbeat task; jobs whose
+    lease expires are re-queued by the WSGI queue's sweep, which create_app starts either way.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.backend = None
+        self.max_concurrency = 1000
+        self.lease_seconds = 60
+        self.heartbeat_interval = 20
+        self._semaphore = None
+        self._tasks = set()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_concurrency = app.config.get('ASYNC_GENERATION_CONCURRENCY', self.max_concurrency)
+        self.lease_seconds = app.config.get('GENERATION_JOB_LEASE_SECONDS', self.lease_seconds)
+        self.heartbeat_interval = app.config.get('GENERATION_JOB_SWEEP_SECONDS', self.heartbeat_interval)
+        self.backend = app.extensions['generation_backend']
+
+    async def submit(self, owner_id, business_type, industry):
+        """
+        Persists a new job and schedules it on the running event loop. Returns the job id as a string.
+        """
+        now = datetime.utcnow()
+        job = {
+            'owner': owner_id,
+            'business_type': business_type,
+            'industry': industry,
+            'status': QUEUED,
+            'attempts': 0,
+            'created_at': now,
+            'updated_at': now
+        }
+        result = await async_mongo.db.generation_jobs.insert_one(job)
+        task = asyncio.create_task(self._run(result.inserted_id))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return str(result.inserted_id)
+
+    async def get(self, job_id):
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await async_mongo.db.generation_jobs.find_one({'_id': ObjectId(job_id)})
+
+    async def shutdown(self):
+        """Cancels the jobs still running; they stay 'running' and are re-queued once their lease expires."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _claim(self, job_id):
+        now = datetime.utcnow()
+        return await async_mongo.db.generation_jobs.find_one_and_update(
+            {'_id': job_id, 'status': QUEUED},
+            {'$set': {'status': RUNNING, 'started_at': now, 'updated_at': now,
+                      'lease_expires_at': now + timedelta(seconds=self.lease_seconds)},
+             '$inc': {'attempts': 1}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _heartbeat(self, job_id):
+        # Renews the job's lease until cancelled, like GenerationJobQueue.renew_leases
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await async_mongo.db.generation_jobs.update_one(
+                    {'_id': job_id, 'status': RUNNING},
+                    {'$set': {'lease_expires_at': datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except PyMongoError as e:
+                logger.error("Could not renew the lease of generation job %s: %s", job_id, e)
+
+    async def _finish(self, job_id, fields):
+        fields['updated_at'] = datetime.utcnow()
+        fields['finished_at'] = fields['updated_at']
+        await async_mongo.db.generation_jobs.update_one({'_id': job_id}, {'$set': fields})
+
+    def _export(self, site_data):
+        # Rendering needs an app context; runs in a thread since it writes files
+        with self.app.app_context():
+            export_website_safely(site_data)
+
+    async def _run(self, job_id):
+        if self._semaphore is None:
+            # Created here so it belongs to the serving event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            try:
+                job = await self._claim(job_id)
+                if not job:
+                    return
+
+                heartbeat = asyncio.create_task(self._heartbeat(job_id))
+                try:
+                    generated_content = await self.backend.agenerate(job['business_type'], job['industry'])
+                except Exception as e:
+                    logger.error("Generation job %s: %s backend failed: %s", job_id, self.backend.name, e)
+                    generated_content = None
+                finally:
+                    heartbeat.cancel()
+                if not is_valid_generation(generated_content):
+                    await self._finish(job_id, {
+                        'status': FAILED,
+                        'error': 'AI failed to generate valid services. Please try again or retry with different inputs.'
+                    })
+                    return
+
+                site_data = {
+                    'owner': job['owner'],
+                    'business_type': job['business_type'],
+                    'industry': job['industry'],
+                    'content': generated_content,
+                    'created_at': datetime.utcnow(),
+                    'last_updated': datetime.utcnow()
+                }
+                result = await async_mongo.db.websites.insert_one(attach_view_model(site_data))
+                await asyncio.to_thread(self._export, site_data)
+                await self._finish(job_id, {'status': DONE, 'website_id': str(result.inserted_id)})
+            except PyMongoError as e:
+                logger.error("Generation job %s could not be persisted: %s", job_id, e)
+            except Exception as e:
+                logger.exception("Generation job %s failed: %s", job_id, e)
+                try:
+                    await self._finish(job_id, {'status': FAILED, 'error': str(e)})
+                except PyMongoError as db_error:
+                    logger.error("Could not mark generation job %s as failed: %s", job_id, db_error)
+
+def serialize_job(job):
+    """
+    Converts a job document into the JSON shape returned by the status endpoint.
+    """
+    return {
+        'job_id': job['_id'],
+        'status': job['status'],
+        'business_type': job.get('business_type'),
+        'industry': job.get('industry'),
+        'website_id': job.get('website_id'),
+        'error': job.get('error'),
+        'created_at': job.get('created_at'),
+        'finished_at': job.get('finished_at')
+    }
+
+# One queue per worker process
+generation_jobs = GenerationJobQueue()
+async_generation_jobs = AsyncGenerationJobQueue()
@@ -0,0 +1,73 @@
+import datetime
+import decimal
+import json
+import uuid
+
+from bson import Decimal128, ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson # Optional: without it the stdlib encoder is used
+except ImportError:
+    orjson = None
+
+def default(value):
+    """
+    Encodes the values MongoDB documents hold that JSON has no type for: ObjectId as its
+    hex string, dates as ISO 8601 (the form the API always returned) and decimals as strings.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal128, decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    # orjson encodes datetimes itself, in the same form as isoformat() for naive UTC values;
+    # non-string keys (e.g. the batch's integer indexes) are converted like json.dumps does
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        """Serializes 'obj' to compact UTF-8 JSON."""
+        return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+
+    def dumps(obj):
+        """Serializes 'obj' to compact JSON text."""
+        return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS).decode('utf-8')
+else:
+    def dumps_bytes(obj):
+        """Serializes 'obj' to compact UTF-8 JSON."""
+        return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def dumps(obj):
+        """Serializes 'obj' to compact JSON text."""
+        return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':'))
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider (used by jsonify) that serializes ObjectId, datetime and decimal
+    values directly, so routes return documents from MongoDB without converting them field
+    by field. With orjson installed, compact responses are encoded by orjson; pretty-printed
+    ones (debug mode) and calls with extra json.dumps arguments use the stdlib encoder.
+    Keys are not sorted: documents keep their stored field order.
+    """
+    sort_keys = False
+    default = staticmethod(default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return dumps(obj)
+        kwargs.setdefault('default', default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            body = self.dumps(obj, indent=2, separators=(', ', ': ')) + '\n'
+        else:
+            body = dumps_bytes(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
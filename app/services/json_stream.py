@@ -0,0 +1,73 @@
+import json
+
+class TopLevelMemberParser:
+    """
+    Incremental parser for a streamed JSON object.
+    Text is fed in arbitrary chunks; each time a top-level member ("key": value) is complete,
+    it is parsed on its own and returned, so callers can use e.g. 'title' or 'hero_section'
+    long before the closing brace arrives. Every character is scanned exactly once.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0 # next character to scan
+        self._member_start = None # start of the current top-level member in _buffer
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+
+    def feed(self, text):
+        """
+        Consumes a chunk of JSON text. Returns a list of (key, value) members completed by it.
+        Raises ValueError if a completed member is not valid JSON.
+        """
+        self._buffer += text
+        members = []
+        buffer = self._buffer
+        pos = self._pos
+
+        while pos < len(buffer) and not self.done:
+            char = buffer[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+                if self._depth == 1:
+                    if char != '{':
+                        raise ValueError('Expected a JSON object')
+                    self._member_start = pos + 1
+            elif char in '}]':
+                if self._depth == 1:
+                    members.extend(self._close_member(buffer, pos))
+                    self.done = True
+                self._depth -= 1
+            elif char == ',' and self._depth == 1:
+                members.extend(self._close_member(buffer, pos))
+                self._member_start = pos + 1
+            pos += 1
+
+        # Drop text that belongs to members already returned, so the buffer stays small
+        if self._member_start is not None and self._member_start > 0:
+            trim = min(self._member_start, pos)
+            self._buffer = buffer[trim:]
+            self._member_start -= trim
+            pos -= trim
+        self._pos = pos
+        return members
+
+    def _close_member(self, buffer, end):
+        text = buffer[self._member_start:end].strip()
+        if not text:
+            return []
+        try:
+            return list(json.loads('{' + text + '}').items())
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON member in stream: {e}")
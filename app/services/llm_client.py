@@ -0,0 +1,455 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from google.api_core.exceptions import (
+    DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable
+)
+
+from app.services.metrics import (
+    LLM_CIRCUIT_REJECTIONS, LLM_HEDGES, LLM_REPAIRS, LLM_RETRIES, record_llm_call
+)
+
+logger = logging.getLogger(__name__)
+
+# Upstream errors worth retrying; anything else (e.g. InvalidArgument) fails straight away
+RETRYABLE_ERRORS = (ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError)
+
+class CircuitOpenError(Exception):
+    """Raised without calling the model while the circuit breaker is open."""
+
+class InvalidGenerationError(ValueError):
+    """Raised when the model output cannot be parsed or repaired into schema-valid JSON."""
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker.
+    After 'failure_threshold' consecutive failures the circuit opens and calls fail fast
+    for 'reset_timeout' seconds. Then a single trial call is let through (half-open):
+    success closes the circuit again, failure re-opens it. A trial that ends without a
+    verdict (abandon()) re-opens it too, and one still unanswered after 'trial_timeout'
+    seconds is given up on, so another call can take its place.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    # What allow() returns to the call that makes the half-open trial
+    TRIAL = 'trial'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, trial_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = trial_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Returns a truthy value if a call may be made now: TRIAL for the half-open trial,
+        which the caller must end with record_success, record_failure or abandon.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and self._trial_in_flight and now - self._trial_started >= self.trial_timeout:
+                logger.warning("LLM: Circuit breaker trial unanswered after %ss, letting another call try", self.trial_timeout)
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_started = now
+                return self.TRIAL
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def abandon(self, ticket):
+        """
+        Ends a call that failed without telling whether the service is healthy (a
+        non-retryable error, invalid output, a disconnected client or a cancellation).
+        Only matters for the half-open trial ('ticket' is allow()'s result), which then
+        counts as failed: the circuit re-opens rather than staying half-open for good.
+        """
+        if ticket != self.TRIAL:
+            return
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._trial_in_flight:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+class LatencyTracker:
+    """Keeps the most recent call latencies to estimate a percentile."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent, min_samples=1):
+        """Returns the given latency percentile, or None with fewer than 'min_samples' samples."""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+_CODE_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_DANGLING_TAIL_RE = re.compile(r'(,\s*"(?:[^"\\]|\\.)*"\s*:?|,|:)\s*$')
+
+def repair_json(text):
+    """
+    Best-effort repair of model JSON output: strips code fences and surrounding prose,
+    removes trailing commas, and closes strings, arrays and objects cut off by the token limit
+    (dropping a trailing member that has no value yet).
+    """
+    text = _CODE_FENCE_RE.sub('', text.strip())
+    start = text.find('{')
+    if start == -1:
+        return text
+    text = text[start:]
+
+    # Find unclosed brackets and strings
+    stack = []
+    in_string = False
+    escaped = False
+    end = len(text)
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                # Anything after the top-level object is prose
+                end = index + 1
+                break
+
+    text = text[:end]
+    if stack:
+        if in_string:
+            text += '"'
+        text = _DANGLING_TAIL_RE.sub('', text.rstrip())
+        text += ''.join(reversed(stack))
+    return _TRAILING_COMMA_RE.sub(r'\1', text)
+
+_SCHEMA_TYPES = {
+    'STRING': str,
+    'NUMBER': (int, float),
+    'INTEGER': int,
+    'BOOLEAN': bool,
+    'ARRAY': list,
+    'OBJECT': dict
+}
+
+def validate_against_schema(value, schema, path='$'):
+    """
+    Validates a value against a Gemini response schema (OBJECT/ARRAY/STRING/... with
+    'properties', 'items' and 'required'). Returns a list of error messages; empty means valid.
+    """
+    errors = []
+    expected = _SCHEMA_TYPES.get(schema.get('type', '').upper())
+    if expected is not None and not isinstance(value, expected):
+        return [f"{path}: expected {schema['type']}"]
+
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value:
+                errors.append(f"{path}.{key}: missing")
+        for key, sub_schema in schema.get('properties', {}).items():
+            if key in value:
+                errors.extend(validate_against_schema(value[key], sub_schema, f"{path}.{key}"))
+    elif isinstance(value, list) and 'items' in schema:
+        for index, item in enumerate(value):
+            errors.extend(validate_against_schema(item, schema['items'], f"{path}[{index}]"))
+    return errors
+
+def parse_generation(text, schema):
+    """
+    Parses model output into a schema-valid dict, repairing it if needed.
+    Returns (data, repaired). Raises InvalidGenerationError if neither the raw
+    nor the repaired text is valid.
+    """
+    try:
+        data = json.loads(text)
+        if not validate_against_schema(data, schema):
+            return data, False
+    except json.JSONDecodeError:
+        pass
+
+    repaired = repair_json(text)
+    try:
+        data = json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise InvalidGenerationError(f"Unrepairable JSON from model: {e}")
+    errors = validate_against_schema(data, schema)
+    if errors:
+        raise InvalidGenerationError(f"Model output does not match schema: {'; '.join(errors[:5])}")
+    logger.info("LLM: Repaired malformed JSON from the model instead of discarding it.")
+    return data, True
+
+class ResilientClient:
+    """
+    Wraps a generative model with retries, a circuit breaker and optional hedging.
+    Retryable upstream errors are retried with full-jitter exponential backoff. Once the
+    breaker is open, calls raise CircuitOpenError without reaching the model. With hedging
+    enabled, a second identical request is started if the first has not answered within the
+    observed p95 latency, and whichever finishes first wins. Both run on a per-process pool
+    of LLM_HEDGE_MAX_WORKERS threads, and the delay counts from when the first one starts.
+    'model_factory' returns an object with generate_content(prompt, generation_config=...),
+    so a fake model can be plugged in for tests.
+    """
+
+    def __init__(self, model_factory=None):
+        self.model_factory = model_factory
+        self.max_retries = 3
+        self.backoff_base = 0.5
+        self.backoff_max = 8.0
+        self.hedge_enabled = False
+        self.hedge_percentile = 95
+        self.hedge_min_samples = 20
+        self.hedge_max_workers = 32
+        self.breaker = CircuitBreaker()
+        self.latencies = LatencyTracker()
+        self._executor = None
+        self._pid = None
+        self._executor_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_retries = app.config.get('LLM_MAX_RETRIES', self.max_retries)
+        self.backoff_base = app.config.get('LLM_BACKOFF_BASE', self.backoff_base)
+        self.backoff_max = app.config.get('LLM_BACKOFF_MAX', self.backoff_max)
+        self.hedge_enabled = app.config.get('LLM_HEDGE_ENABLED', self.hedge_enabled)
+        self.hedge_percentile = app.config.get('LLM_HEDGE_PERCENTILE', self.hedge_percentile)
+        self.hedge_max_workers = app.config.get('LLM_HEDGE_MAX_WORKERS') or \
+            2 * (app.config.get('BATCH_CONCURRENCY', 8) + app.config.get('GENERATION_WORKERS', 4))
+        self.breaker = CircuitBreaker(
+            failure_threshold=app.config.get('LLM_BREAKER_THRESHOLD', 5),
+            reset_timeout=app.config.get('LLM_BREAKER_RESET_SECONDS', 30),
+            trial_timeout=app.config.get('LLM_BREAKER_TRIAL_TIMEOUT_SECONDS', 60)
+        )
+
+    def _get_executor(self):
+        # Created lazily (and re-created after a fork) so threads always belong to the serving process
+        with self._executor_lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.hedge_max_workers, thread_name_prefix='llm-hedge')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _call(self, prompt, generation_config):
+        started = time.monotonic()
+        try:
+            response = self.model_factory().generate_content(prompt, generation_config=generation_config)
+            text = response.text
+        except Exception:
+            record_llm_call(time.monotonic() - started, 'error')
+            raise
+        elapsed = time.monotonic() - started
+        self.latencies.add(elapsed)
+        record_llm_call(elapsed, 'ok', response)
+        return text
+
+    def _call_hedged(self, prompt, generation_config):
+        threshold = self.latencies.percentile(self.hedge_percentile, self.hedge_min_samples)
+        if not self.hedge_enabled or threshold is None:
+            return self._call(prompt, generation_config)
+
+        executor = self._get_executor()
+        started = threading.Event()
+
+        def primary():
+            started.set()
+            return self._call(prompt, generation_config)
+
+        first = executor.submit(primary)
+        # Time spent waiting for a pool thread is not upstream latency, so it doesn't count towards the hedge
+        started.wait()
+        done, _ = wait([first], timeout=threshold)
+        if done:
+            return first.result()
+
+        LLM_HEDGES.inc()
+        second = executor.submit(self._call, prompt, generation_config)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _backoff(self, attempt):
+        # Full jitter: a random delay up to the exponential cap spreads retries from many workers
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def generate_text(self, prompt, generation_config):
+        """
+        Returns the raw response text, retrying retryable errors. Raises CircuitOpenError
+        when the breaker is open, or the last upstream error once retries are used up.
+        """
+        for attempt in range(self.max_retries + 1):
+            ticket = self.breaker.allow()
+            if not ticket:
+                LLM_CIRCUIT_REJECTIONS.inc()
+                raise CircuitOpenError('Generation service temporarily unavailable')
+            try:
+                text = self._call_hedged(prompt, generation_config)
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                LLM_RETRIES.inc()
+                delay = self._backoff(attempt)
+                logger.warning("LLM: %s, retrying in %.2fs (attempt %d)", type(e).__name__, delay, attempt + 1)
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.abandon(ticket)
+                raise
+            self.breaker.record_success()
+            return text
+
+    def generate_json(self, prompt, generation_config, schema):
+        """
+        Returns the response parsed and validated against 'schema', repaired if necessary.
+        Raises InvalidGenerationError if the output is beyond repair.
+        """
+        text = self.generate_text(prompt, generation_config)
+        data, repaired = parse_generation(text, schema)
+        if repaired:
+            LLM_REPAIRS.inc()
+        return data
+
+class AsyncResilientClient:
+    """
+    asyncio counterpart of ResilientClient for the ASGI entry point.
+    It shares the wrapped client's settings, circuit breaker and latency samples,
+    so both serving modes of a process see the same upstream health. Waiting calls, backoffs
+    and hedges are coroutines, so thousands of generations can be in flight on one thread.
+    The model must provide generate_content_async (as genai.GenerativeModel does).
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def _call(self, prompt, generation_config):
+        started = time.monotonic()
+        try:
+            response = await self.client.model_factory().generate_content_async(
+                prompt, generation_config=generation_config
+            )
+            text = response.text
+        except Exception:
+            record_llm_call(time.monotonic() - started, 'error')
+            raise
+        elapsed = time.monotonic() - started
+        self.client.latencies.add(elapsed)
+        record_llm_call(elapsed, 'ok', response)
+        return text
+
+    async def _call_hedged(self, prompt, generation_config):
+        client = self.client
+        threshold = client.latencies.percentile(client.hedge_percentile, client.hedge_min_samples)
+        if not client.hedge_enabled or threshold is None:
+            return await self._call(prompt, generation_config)
+
+        first = asyncio.ensure_future(self._call(prompt, generation_config))
+        done, _ = await asyncio.wait({first}, timeout=threshold)
+        if done:
+            return first.result()
+
+        LLM_HEDGES.inc()
+        second = asyncio.ensure_future(self._call(prompt, generation_config))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            # Unlike threads, the slower request can actually be abandoned
+            for future in pending:
+                future.cancel()
+
+    async def generate_text(self, prompt, generation_config):
+        """Async version of ResilientClient.generate_text."""
+        client = self.client
+        for attempt in range(client.max_retries + 1):
+            ticket = client.breaker.allow()
+            if not ticket:
+                LLM_CIRCUIT_REJECTIONS.inc()
+                raise CircuitOpenError('Generation service temporarily unavailable')
+            try:
+                text = await self._call_hedged(prompt, generation_config)
+            except RETRYABLE_ERRORS as e:
+                client.breaker.record_failure()
+                if attempt == client.max_retries:
+                    raise
+                LLM_RETRIES.inc()
+                delay = client._backoff(attempt)
+                logger.warning("LLM: %s, retrying in %.2fs (attempt %d)", type(e).__name__, delay, attempt + 1)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Includes CancelledError when the request goes away mid-call
+                client.breaker.abandon(ticket)
+                raise
+            client.breaker.record_success()
+            return text
+
+    async def generate_json(self, prompt, generation_config, schema):
+        """Async version of ResilientClient.generate_json."""
+        text = await self.generate_text(prompt, generation_config)
+        data, repaired = parse_generation(text, schema)
+        if repaired:
+            LLM_REPAIRS.inc()
+        return data
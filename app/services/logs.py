@@ -0,0 +1,38 @@
+import logging
+import random
+import sys
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes every WARNING and above, but only a 'rate' fraction of lower-level records,
+    so chatty INFO/DEBUG messages on hot paths cost little under load.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+def configure_logging(app):
+    """
+    Sends the application's log records ('app' and its modules) to stderr with
+    level LOG_LEVEL and INFO/DEBUG sampled at LOG_SAMPLE_RATE. Safe to call once per app.
+    """
+    logger = logging.getLogger('app')
+    logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+
+    handler = next((h for h in logger.handlers if getattr(h, '_app_handler', False)), None)
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s'))
+        handler._app_handler = True
+        logger.addHandler(handler)
+        # Keep records out of the root logger (and e.g. gunicorn's handlers) to avoid duplicates
+        logger.propagate = False
+
+    handler.filters = [SamplingFilter(app.config.get('LOG_SAMPLE_RATE', 1.0))]
+    return logger
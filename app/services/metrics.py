@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+
+from flask import g, request
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+)
+from prometheus_client import multiprocess
+from pymongo import monitoring
+
+# With PROMETHEUS_MULTIPROC_DIR set (see gunicorn.conf.py), every worker writes its samples
+# to files in that directory and /metrics aggregates them, whichever worker serves the scrape.
+# The variable must be set before prometheus_client is first imported.
+
+# Latency buckets (seconds) for requests and MongoDB commands
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Model calls take seconds, not milliseconds
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by endpoint',
+    ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+MONGO_COMMAND_DURATION = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command round trips, by collection and command',
+    ['collection', 'command'], buckets=LATENCY_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    'mongodb_command_failures_total', 'Failed MongoDB commands, by collection and command',
+    ['collection', 'command']
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    'mongodb_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection, by server',
+    ['server'], buckets=LATENCY_BUCKETS
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    'mongodb_pool_checkout_failures_total', 'Connection checkouts that failed, by server and reason (e.g. timeout)',
+    ['server', 'reason']
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    'mongodb_pool_checked_out_connections', 'Connections currently checked out of the pool, by server',
+    ['server'], multiprocess_mode='livesum'
+)
+LLM_REQUEST_DURATION = Histogram(
+    'llm_request_duration_seconds', 'Model calls, by outcome', ['outcome'], buckets=LLM_BUCKETS
+)
+LLM_TOKENS = Counter('llm_tokens_total', 'Tokens reported by the model, by kind (prompt/output)', ['kind'])
+LLM_RETRIES = Counter('llm_retries_total', 'Model calls retried after a transient error')
+LLM_HEDGES = Counter('llm_hedged_requests_total', 'Second requests sent because the first was slow')
+LLM_REPAIRS = Counter('llm_json_repairs_total', 'Model responses whose JSON had to be repaired')
+LLM_CIRCUIT_REJECTIONS = Counter('llm_circuit_rejections_total', 'Model calls refused while the circuit was open')
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups, by cache and result (hit/miss)', ['cache', 'result'])
+RATE_LIMITED_REQUESTS = Counter('rate_limited_requests_total', 'Requests refused with 429, by rate limit scope', ['scope'])
+PASSWORD_HASH_REJECTIONS = Counter('password_hash_rejections_total', 'Hashes refused because the pool was saturated')
+PASSWORD_HASH_RUNNING = Gauge(
+    'password_hash_running', 'bcrypt hashes being computed by the hashing pools', multiprocess_mode='livesum'
+)
+PASSWORD_HASH_QUEUED = Gauge(
+    'password_hash_queued', 'bcrypt hashes waiting for a thread of the hashing pools', multiprocess_mode='livesum'
+)
+PASSWORD_HASH_WAIT = Histogram(
+    'password_hash_wait_seconds', 'Time hashes waited in the queue before a thread took them', buckets=LATENCY_BUCKETS
+)
+
+def record_cache(cache, hit):
+    """Counts a lookup in 'cache'; the hit ratio is hits / (hits + misses)."""
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+def record_llm_call(seconds, outcome, response=None):
+    """Records a model call's duration and, when the response reports them, its token counts."""
+    LLM_REQUEST_DURATION.labels(outcome).observe(seconds)
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        LLM_TOKENS.labels('prompt').inc(getattr(usage, 'prompt_token_count', 0) or 0)
+        LLM_TOKENS.labels('output').inc(getattr(usage, 'candidates_token_count', 0) or 0)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    pymongo command listener timing every command per collection.
+    pymongo calls it synchronously on the thread issuing the command, so it only does
+    a dict operation and a histogram update.
+    """
+
+    def __init__(self):
+        self._pending = {} # request_id -> collection
+
+    @staticmethod
+    def _collection(event):
+        target = event.command.get(event.command_name)
+        if isinstance(target, str):
+            return target
+        # getMore names the collection separately; admin commands have none
+        return event.command.get('collection', '')
+
+    def started(self, event):
+        self._pending[event.request_id] = self._collection(event)
+
+    def succeeded(self, event):
+        collection = self._pending.pop(event.request_id, '')
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._pending.pop(event.request_id, '')
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    pymongo connection pool listener measuring how long operations wait to check out a
+    connection. Waits that grow towards MONGO_WAIT_QUEUE_TIMEOUT_MS mean the pool is too
+    small for the worker's concurrency (or the server is slow to hand back connections).
+    Checkout events are published on the thread that waits, so the start time is thread-local.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @staticmethod
+    def _server(event):
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _waited(self, event):
+        # pymongo >= 4.7 reports the wait itself; otherwise use the time since check_out_started
+        duration = getattr(event, 'duration', None)
+        if duration is not None:
+            return duration
+        started = getattr(self._local, 'started', None)
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        server = self._server(event)
+        MONGO_POOL_CHECKOUT_WAIT.labels(server).observe(self._waited(event))
+        MONGO_POOL_CHECKED_OUT.labels(server).inc()
+
+    def connection_check_out_failed(self, event):
+        server = self._server(event)
+        MONGO_POOL_CHECKOUT_WAIT.labels(server).observe(self._waited(event))
+        MONGO_POOL_CHECKOUT_FAILURES.labels(server, str(event.reason)).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(self._server(event)).dec()
+
+    # The remaining pool events are not measured
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+class RequestMetrics:
+    """
+    Times every request in before/after hooks, labelled by endpoint rather than path,
+    so ids in URLs don't create new series. For streamed responses (SSE, paginated
+    listings) this is the time until the response starts.
+    """
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        app.before_request(self._before)
+        app.after_request(self._after)
+
+    def _before(self):
+        g.request_started = time.perf_counter()
+
+    def _after(self, response):
+        started = g.get('request_started')
+        if started is not None:
+            HTTP_REQUEST_DURATION.labels(
+                request.endpoint or 'unmatched', request.method, str(response.status_code)
+            ).observe(time.perf_counter() - started)
+        return response
+
+def render_metrics():
+    """Returns (body, content type) of all metrics, aggregated over workers in multiprocess mode."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+# One listener of each kind per process, passed to the MongoClient in create_app
+mongo_command_metrics = MongoCommandMetrics()
+mongo_pool_metrics = MongoPoolMetrics()
+request_metrics = RequestMetrics()
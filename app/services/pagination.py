@@ -0,0 +1,61 @@
+from bson import ObjectId
+
+# Page size used when the client does not pass 'limit', and the largest one accepted
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+class PaginationError(ValueError):
+    """Raised for malformed 'limit'/'after' query parameters."""
+
+def parse_page_args(args):
+    """
+    Reads keyset pagination parameters from the query string.
+    'limit' is the page size; 'after' is the _id of the last item of the previous page.
+    Returns (limit, after) where 'after' is an ObjectId or None.
+    """
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise PaginationError("'limit' must be an integer")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise PaginationError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+
+    after = args.get('after')
+    if after:
+        if not ObjectId.is_valid(after):
+            raise PaginationError("'after' must be a valid id")
+        after = ObjectId(after)
+    else:
+        after = None
+    return limit, after
+
+def find_page(collection, query, projection, limit, after=None):
+    """
+    Runs a keyset-paginated query ordered by _id.
+    One extra document is fetched so the caller can tell whether another page exists.
+    """
+    if after is not None:
+        query = {'$and': [query, {'_id': {'$gt': after}}]} if query else {'_id': {'$gt': after}}
+    return collection.find(query, projection).sort('_id', 1).limit(limit + 1)
+
+def _page(docs, limit, serialize):
+    # The extra document only signals that there is a next page
+    items = docs[:limit]
+    return {
+        'items': [serialize(doc) for doc in items],
+        'next_after': items[-1]['_id'] if len(docs) > limit else None
+    }
+
+def read_page(cursor, limit, serialize):
+    """
+    Reads a page from a find_page cursor as {"items": [...], "next_after": <id or null>}.
+    The page is bounded (limit + 1 documents), so it is read whole before the response
+    starts: a cursor error then still becomes the route's 500 instead of a 200 with
+    truncated JSON. 'serialize' turns a document into the dict to return; ObjectId and
+    datetime values may be left as they are.
+    """
+    return _page(list(cursor), limit, serialize)
+
+async def aread_page(cursor, limit, serialize):
+    """Async version of read_page for Motor cursors."""
+    return _page([doc async for doc in cursor], limit, serialize)
@@ -0,0 +1,234 @@
+import copy
+import re
+
+class PatchError(ValueError):
+    """Raised for a patch that is malformed or touches fields it may not change."""
+
+MERGE_PATCH = 'application/merge-patch+json'
+JSON_PATCH = 'application/json-patch+json'
+
+def _check_key(key):
+    # Keys become parts of dotted MongoDB paths, so they must not smuggle in operators or extra levels
+    if not isinstance(key, str) or not key or '.' in key or key.startswith('$'):
+        raise PatchError(f"Invalid field name: {key!r}")
+    return key
+
+def _check_root(path, allowed_fields):
+    if path.split('.', 1)[0] not in allowed_fields:
+        raise PatchError(f"Field '{path.split('.', 1)[0]}' cannot be changed; allowed: {', '.join(allowed_fields)}")
+
+def _flatten_merge(patch, prefix, set_fields, unset_fields):
+    for key, value in patch.items():
+        path = f"{prefix}.{_check_key(key)}" if prefix else _check_key(key)
+        if value is None:
+            unset_fields[path] = ''
+        elif isinstance(value, dict):
+            # Merging an object is merging its members, so an empty one changes nothing
+            _flatten_merge(value, path, set_fields, unset_fields)
+        else:
+            set_fields[path] = value
+
+def merge_patch_to_update(patch, allowed_fields):
+    """
+    Translates a JSON merge patch (RFC 7396) into a MongoDB update touching only the patched
+    leaves: nested objects are merged key by key through dotted paths (an empty object is a
+    no-op), null removes a field ($unset), and any other value, including arrays, replaces the
+    field ($set). The update is empty if the patch changes nothing.
+    Returns (update, conditions); conditions is always empty for merge patches.
+    """
+    if not isinstance(patch, dict) or not patch:
+        raise PatchError('A merge patch must be a non-empty JSON object')
+
+    set_fields, unset_fields = {}, {}
+    _flatten_merge(patch, '', set_fields, unset_fields)
+    for path in list(set_fields) + list(unset_fields):
+        _check_root(path, allowed_fields)
+
+    update = {}
+    if set_fields:
+        update['$set'] = set_fields
+    if unset_fields:
+        update['$unset'] = unset_fields
+    return update, {}
+
+def _pointer_to_path(pointer):
+    # JSON Pointer (RFC 6901): '/content/services_section/items/0' -> 'content.services_section.items.0'
+    if not isinstance(pointer, str) or not pointer.startswith('/') or pointer == '/':
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    parts = [part.replace('~1', '/').replace('~0', '~') for part in pointer[1:].split('/')]
+    return '.'.join(_check_key(part) for part in parts), parts
+
+def _pointer_expression(parts):
+    """
+    Aggregation expression for the value at a JSON Pointer's parts. Numeric parts index
+    arrays ($arrayElemAt) and name members of objects ($getField), as in RFC 6901; dotted
+    field paths could not tell the two apart. A missing value evaluates as missing.
+    """
+    expression = '$$ROOT'
+    for part in parts:
+        member = {'$getField': {'field': {'$literal': part}, 'input': expression}}
+        if part.isdigit():
+            expression = {'$cond': [{'$isArray': expression}, {'$arrayElemAt': [expression, int(part)]}, member]}
+        else:
+            expression = member
+    return expression
+
+def json_patch_to_update(operations, allowed_fields):
+    """
+    Translates a JSON Patch (RFC 6902) into one MongoDB update plus filter conditions.
+    'add' and 'replace' become $set (or $push for an append with '-'), 'remove' becomes
+    $unset, and 'test' becomes a condition on the update's filter comparing the whole value
+    ($expr, so an array must equal the value rather than just contain it). 'replace' and
+    'remove' also require their path to exist. The whole patch thus applies atomically or
+    not at all. 'move' and 'copy' need the current values and are not supported, nor is
+    inserting into or removing from the middle of an array.
+    Returns (update, conditions).
+    """
+    if not isinstance(operations, list) or not operations:
+        raise PatchError('A JSON Patch must be a non-empty array of operations')
+
+    set_fields, unset_fields, push_fields, conditions, tests = {}, {}, {}, {}, []
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise PatchError('Each JSON Patch operation must be an object')
+        op = operation.get('op')
+        if op not in ('add', 'replace', 'remove', 'test'):
+            raise PatchError(f"Unsupported JSON Patch operation: {op!r}")
+        if op != 'remove' and 'value' not in operation:
+            raise PatchError(f"Operation '{op}' requires a 'value'")
+
+        path, parts = _pointer_to_path(operation.get('path'))
+        _check_root(path, allowed_fields)
+        if op == 'test':
+            tests.append({'$eq': [_pointer_expression(parts), {'$literal': operation['value']}]})
+            continue
+        if op in ('replace', 'remove'):
+            # RFC 6902: the target location must exist
+            conditions[path] = {'$exists': True}
+
+        if op == 'remove':
+            if parts[-1].isdigit():
+                raise PatchError('Removing array elements is not supported; replace the array instead')
+            unset_fields[path] = ''
+        elif op == 'add' and parts[-1] == '-':
+            parent = path.rsplit('.', 1)[0]
+            push_fields.setdefault(parent, {'$each': []})['$each'].append(operation['value'])
+        elif op == 'add' and parts[-1].isdigit():
+            raise PatchError('Inserting into the middle of an array is not supported; append with "-" or replace the array')
+        else:
+            set_fields[path] = operation['value']
+
+    # MongoDB rejects an update where one path is a prefix of another (or repeated across operators)
+    paths = list(set_fields) + list(unset_fields) + list(push_fields)
+    for index, first in enumerate(paths):
+        for second in paths[index + 1:]:
+            if first == second or second.startswith(first + '.') or first.startswith(second + '.'):
+                raise PatchError(f"Conflicting operations on '{first}' and '{second}'")
+
+    update = {}
+    if set_fields:
+        update['$set'] = set_fields
+    if unset_fields:
+        update['$unset'] = unset_fields
+    if push_fields:
+        update['$push'] = push_fields
+    if tests:
+        conditions['$expr'] = {'$and': tests}
+    return update, conditions
+
+_MISSING = object()
+
+def _index(container, part):
+    # MongoDB reads a numeric path part as an array index when the field holds an array
+    return int(part) if isinstance(container, list) and part.isdigit() else None
+
+def _parent(document, parts, create):
+    container = document
+    for part in parts:
+        index = _index(container, part)
+        if index is not None:
+            if index >= len(container):
+                if not create:
+                    return None
+                # Like MongoDB: pad with nulls up to the new element, which starts as an object
+                container.extend([None] * (index - len(container)))
+                container.append({})
+            container = container[index]
+        elif isinstance(container, dict):
+            if part not in container:
+                if not create:
+                    return None
+                container[part] = {}
+            container = container[part]
+        elif create:
+            raise PatchError(f"Cannot create field '{part}' in a value that is not an object")
+        else:
+            return None
+    if create and not isinstance(container, (dict, list)):
+        raise PatchError(f"Cannot create field '{parts[-1]}' in a value that is not an object")
+    return container
+
+def _assign(container, part, value):
+    index = _index(container, part)
+    if index is not None:
+        container.extend([None] * (index + 1 - len(container)))
+        container[index] = value
+    elif isinstance(container, dict):
+        container[part] = value
+    else:
+        raise PatchError(f"Cannot create field '{part}' in an array")
+
+def apply_update(document, update):
+    """
+    Applies the $set, $unset and $push operators of an update built by the functions above to
+    a copy of 'document' and returns the copy, so a caller can derive data (e.g. the view
+    model) from the result and write it in the same update. Paths follow MongoDB's rules:
+    missing objects are created, numeric parts index arrays, and $unset of an array element
+    leaves null. Raises PatchError where MongoDB would reject the path for this document.
+    """
+    document = copy.deepcopy(document)
+    for path, value in update.get('$set', {}).items():
+        parts = path.split('.')
+        _assign(_parent(document, parts[:-1], create=True), parts[-1], copy.deepcopy(value))
+    for path in update.get('$unset', {}):
+        parts = path.split('.')
+        container = _parent(document, parts[:-1], create=False)
+        index = _index(container, parts[-1])
+        if index is not None:
+            if index < len(container):
+                container[index] = None
+        elif isinstance(container, dict):
+            container.pop(parts[-1], None)
+    for path, push in update.get('$push', {}).items():
+        parts = path.split('.')
+        container = _parent(document, parts[:-1], create=True)
+        index = _index(container, parts[-1])
+        if index is not None:
+            current = container[index] if index < len(container) else _MISSING
+        else:
+            current = container.get(parts[-1], _MISSING) if isinstance(container, dict) else _MISSING
+        if current is _MISSING:
+            _assign(container, parts[-1], copy.deepcopy(push['$each']))
+        elif isinstance(current, list):
+            current.extend(copy.deepcopy(push['$each']))
+        else:
+            raise PatchError(f"Cannot append to '{path}', which is not an array")
+    return document
+
+# A version ETag, as sent by GET or with the encoding the compressor appended to it ("3-gzip")
+_VERSION_TAG_RE = re.compile(r'(\d+)(?:-(?:br|gzip))?')
+
+def parse_if_match(header_value):
+    """
+    Returns the version number expected by an If-Match header ('"3"', '"3-gzip"' or '3'), or None if absent.
+    Raises PatchError for anything else, including '*' and lists of tags.
+    """
+    if not header_value:
+        return None
+    value = header_value.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    match = _VERSION_TAG_RE.fullmatch(value.strip('"'))
+    if not match:
+        raise PatchError('If-Match must be the website version returned in the ETag header')
+    return int(match.group(1))
@@ -0,0 +1,80 @@
+import logging
+
+from flask import request
+from pymongo.read_preferences import (
+    Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+)
+
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+# Read preference modes accepted in MONGO_READ_PREFERENCES
+READ_MODES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest
+}
+
+def parse_read_preferences(value, max_staleness=-1):
+    """
+    Parses 'blueprint=mode,blueprint=mode' (e.g. 'preview_bp=secondaryPreferred') into
+    {blueprint name: read preference}. Non-primary modes get 'max_staleness' seconds
+    (-1 for no bound; MongoDB requires at least 90). Raises ValueError for an unknown mode.
+    """
+    preferences = {}
+    for entry in (value or '').split(','):
+        if not entry.strip():
+            continue
+        blueprint, _, mode = entry.partition('=')
+        mode = mode.strip()
+        if mode not in READ_MODES:
+            raise ValueError(f"Unknown read preference '{mode}' for '{blueprint.strip()}', expected one of: {', '.join(READ_MODES)}")
+        preferences[blueprint.strip()] = Primary() if mode == 'primary' else READ_MODES[mode](max_staleness=max_staleness)
+    return preferences
+
+class ReadRouting:
+    """
+    Per-blueprint read preferences for read-only queries that tolerate slightly stale data,
+    such as the public preview and the listings, so they can be served by secondaries and
+    stay off the primary that takes the writes.
+    Only queries made through read_db() are routed; everything else, including reads that
+    must see the request's own writes, stays on the primary. Blueprints without an entry
+    in MONGO_READ_PREFERENCES read from the primary too.
+    """
+
+    def __init__(self):
+        self.preferences = {}
+        self._databases = {}
+
+    def init_app(self, app):
+        self.preferences = parse_read_preferences(
+            app.config.get('MONGO_READ_PREFERENCES'), app.config.get('MONGO_MAX_STALENESS_SECONDS', -1)
+        )
+        self._databases = {}
+        for blueprint, preference in self.preferences.items():
+            logger.info("Reads of blueprint '%s' use %s", blueprint, preference)
+
+    def preference_for(self, blueprint):
+        """Returns the read preference configured for a blueprint, or None for the primary."""
+        return self.preferences.get(blueprint)
+
+    def db_for(self, blueprint):
+        """Returns mongo.db with the blueprint's read preference (the same Database object for each call)."""
+        preference = self.preferences.get(blueprint)
+        if preference is None:
+            return mongo.db
+        database = self._databases.get(blueprint)
+        if database is None:
+            # with_options shares the client and its connection pools
+            database = self._databases[blueprint] = mongo.db.with_options(read_preference=preference)
+        return database
+
+# One router per worker process
+read_routing = ReadRouting()
+
+def read_db():
+    """The database handle for the current request's stale-tolerant reads (see ReadRouting)."""
+    return read_routing.db_for(request.blueprint)
@@ -0,0 +1,72 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from app.services.metrics import record_cache
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered preview pages.
+    Only the newest rendering of each website is kept, tagged with the 'last_updated'
+    value it was rendered from, so a lookup with a newer timestamp simply misses.
+    Memory is bounded by the total size of the cached bodies, not the entry count.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # website_id -> (version, etag, body)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('PREVIEW_CACHE_MAX_BYTES', self.max_bytes)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get(self, website_id, version):
+        """
+        Returns (etag, body) for the rendering of 'website_id' at 'version', or None.
+        """
+        with self._lock:
+            entry = self._entries.get(website_id)
+            if entry is None or entry[0] != version:
+                record_cache('preview', False)
+                return None
+            self._entries.move_to_end(website_id)
+            record_cache('preview', True)
+            return entry[1], entry[2]
+
+    def put(self, website_id, version, etag, body):
+        with self._lock:
+            old = self._entries.pop(website_id, None)
+            if old is not None:
+                self._size -= len(old[2])
+            # A single page larger than the whole budget is not worth caching
+            if len(body) > self.max_bytes:
+                return
+            self._entries[website_id] = (version, etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[2])
+
+    def invalidate(self, website_id):
+        """Drops the cached rendering of 'website_id', if any."""
+        with self._lock:
+            old = self._entries.pop(website_id, None)
+            if old is not None:
+                self._size -= len(old[2])
+
+def make_etag(*parts):
+    """
+    Builds a strong ETag value from the parts that fully determine a rendered page.
+    """
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return digest[:32]
+
+# One cache per worker process
+preview_cache = RenderCache()
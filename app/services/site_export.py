@@ -0,0 +1,277 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime
+
+import click
+from bson import ObjectId
+from flask import render_template
+from flask.cli import with_appcontext
+
+from app.services.view_model import has_current_view, store_view_model, view_for
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli # Optional: without it only .gz variants are written
+except ImportError:
+    brotli = None
+
+# Blocks whose whitespace is significant (or may be, for scripts) and must not be collapsed
+_PRESERVED_BLOCK_RE = re.compile(r'(<(script|style|pre|textarea)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+_BETWEEN_TAGS_RE = re.compile(r'>\s+<')
+_WHITESPACE_RE = re.compile(r'\s+')
+_COMMENT_RE = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+
+# Content encodings we precompress, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def minify_html(html):
+    """
+    Conservative HTML minifier: drops comments and collapses whitespace between and inside
+    text nodes. Inside <script>, <style>, <pre> and <textarea> only line indentation is removed.
+    """
+    parts = _PRESERVED_BLOCK_RE.split(html)
+    out = []
+    # re.split with two groups yields [text, block, tag name, text, block, tag name, ...]
+    for index in range(0, len(parts), 3):
+        text = _COMMENT_RE.sub('', parts[index])
+        text = _BETWEEN_TAGS_RE.sub('><', text)
+        out.append(_WHITESPACE_RE.sub(' ', text))
+        if index + 1 < len(parts):
+            block = parts[index + 1]
+            out.append('\n'.join(line.strip() for line in block.splitlines() if line.strip()))
+    return ''.join(out).strip()
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class SiteExporter:
+    """
+    Precompiles preview pages to static files.
+    Each page is rendered once, minified and stored content-addressed under
+    objects/<aa>/<sha256>.html together with .gz and .br variants. A small pointer file
+    sites/<website_id>.json maps a website to its current object, so the public preview
+    route can serve bytes from disk without touching MongoDB or Jinja.
+    Pages carry the year in their footer, so a pointer written in an earlier year is ignored
+    and the site is exported again on its next preview.
+    EXPORT_DIR is local to each host while edits and deletes may happen on any of them, so
+    the preview routes still read the site's timestamp and only serve a pointer that is
+    current() for it.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.export_dir = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('EXPORT_ENABLED', self.enabled)
+        self.export_dir = app.config.get('EXPORT_DIR') or os.path.join(app.instance_path, 'exports')
+        app.extensions['site_exporter'] = self
+
+    def object_path(self, digest, suffix=''):
+        return os.path.join(self.export_dir, 'objects', digest[:2], f"{digest}.html{suffix}")
+
+    def pointer_path(self, website_id):
+        return os.path.join(self.export_dir, 'sites', f"{website_id}.json")
+
+    def render(self, website, year=None):
+        """
+        Renders and minifies the preview page of a website document. Needs an app context.
+        """
+        html = render_template('preview.html', view=view_for(website), current_year=year or datetime.utcnow().year)
+        return minify_html(html).encode('utf-8')
+
+    def export(self, website):
+        """
+        Writes the static files for a website document and points its pointer file at them.
+        Returns the content digest, or None when exporting is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        year = datetime.utcnow().year
+        body = self.render(website, year)
+        digest = hashlib.sha256(body).hexdigest()
+
+        # Content-addressed: identical pages share one set of files, and existing files are final
+        html_path = self.object_path(digest)
+        if not os.path.exists(html_path):
+            if brotli is not None:
+                _write_atomic(self.object_path(digest, '.br'), brotli.compress(body, quality=11))
+            _write_atomic(self.object_path(digest, '.gz'), gzip.compress(body, compresslevel=9, mtime=0))
+            # The plain file is written last, so its presence means every variant is complete
+            _write_atomic(html_path, body)
+
+        last_updated = website.get('last_updated') or website.get('created_at')
+        website_id = str(website['_id'])
+
+        # Never let a slower export of an older revision overwrite a newer pointer
+        current = self.lookup(website_id)
+        if current and last_updated and current.get('last_updated') and \
+                current['last_updated'] > last_updated.isoformat():
+            return current['digest']
+
+        _write_atomic(self.pointer_path(website_id), json.dumps({
+            'digest': digest,
+            'last_updated': last_updated.isoformat() if last_updated else None,
+            'year': year
+        }).encode('utf-8'))
+        return digest
+
+    def lookup(self, website_id):
+        """
+        Returns the pointer of an exported website ({'digest', 'last_updated', 'year'}) or None,
+        also when the page was exported in an earlier year and shows a stale footer year.
+        """
+        # Ids end up in file paths, so only well-formed ObjectIds are looked up
+        if not self.enabled or not ObjectId.is_valid(website_id):
+            return None
+        try:
+            with open(self.pointer_path(website_id), 'rb') as pointer_file:
+                pointer = json.loads(pointer_file.read())
+        except (OSError, ValueError):
+            return None
+        if pointer.get('year') != datetime.utcnow().year:
+            return None
+        return pointer
+
+    @staticmethod
+    def current(pointer, last_updated):
+        """
+        Tells whether a pointer was exported from the stored revision (or a newer one, when
+        the timestamp came from a lagging secondary) whose timestamp is 'last_updated'.
+        """
+        if last_updated is None:
+            return True
+        if not pointer.get('last_updated'):
+            return False
+        return datetime.fromisoformat(pointer['last_updated']) >= last_updated
+
+    def remove(self, website_id):
+        """
+        Unpublishes a website. Its object files stay until the next prune.
+        """
+        if not ObjectId.is_valid(website_id):
+            return
+        try:
+            os.remove(self.pointer_path(website_id))
+        except FileNotFoundError:
+            pass
+
+    def prune(self):
+        """
+        Deletes object files no pointer refers to any more. Returns the number of files removed.
+        """
+        sites_dir = os.path.join(self.export_dir, 'sites')
+        objects_dir = os.path.join(self.export_dir, 'objects')
+        referenced = set()
+        if os.path.isdir(sites_dir):
+            for name in os.listdir(sites_dir):
+                if name.endswith('.json'):
+                    pointer = self.lookup(name[:-len('.json')])
+                    if pointer:
+                        referenced.add(pointer['digest'])
+
+        removed = 0
+        if os.path.isdir(objects_dir):
+            for root, _, files in os.walk(objects_dir):
+                for name in files:
+                    # Skip files still being written by an export in progress
+                    if name.startswith('.tmp-'):
+                        continue
+                    if name.split('.', 1)[0] not in referenced:
+                        os.remove(os.path.join(root, name))
+                        removed += 1
+        return removed
+
+    def pick_encoding(self, digest, accept_encodings):
+        """
+        Chooses the best precompressed variant the client accepts.
+        Returns (path, content_encoding or None).
+        """
+        for encoding, suffix in ENCODINGS:
+            if accept_encodings[encoding]:
+                path = self.object_path(digest, suffix)
+                if os.path.exists(path):
+                    return path, encoding
+        return self.object_path(digest), None
+
+def export_website_safely(website):
+    """
+    Exports a website, logging instead of raising; a failed export only means
+    the preview route falls back to rendering.
+    """
+    try:
+        return site_exporter.export(website)
+    except Exception as e:
+        logger.warning("Static export failed for website %s: %s", website.get('_id'), e)
+        return None
+
+# --- Bulk re-export (flask export-sites) ---
+
+_worker_app = None
+
+def _init_export_worker(config):
+    # Each process builds its own app, and with it its own MongoDB client
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app(config)
+
+def _export_batch(website_ids):
+    from app import mongo
+    exported = 0
+    with _worker_app.app_context():
+        for website in mongo.db.websites.find({'_id': {'$in': website_ids}}):
+            # Sites written before view models existed (or by an older VIEW_MODEL_VERSION) get one now
+            if not has_current_view(website):
+                store_view_model(mongo.db.websites, website)
+            if export_website_safely(website):
+                exported += 1
+    return exported
+
+def export_all_websites(processes=None, batch_size=100):
+    """
+    Re-exports every website, spreading batches over a pool of processes.
+    Must be called inside an app context. Returns the number of websites exported.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from app import mongo
+
+    ids = [doc['_id'] for doc in mongo.db.websites.find({}, {'_id': 1})]
+    batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+    if not batches:
+        return 0
+
+    worker_config = {'GENERATION_RECOVER_ON_START': False}
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_export_worker,
+                             initargs=(worker_config,)) as pool:
+        return sum(pool.map(_export_batch, batches))
+
+@click.command('export-sites')
+@click.option('--processes', type=int, default=None, help='Worker processes (default: one per CPU).')
+@click.option('--prune', is_flag=True, help='Delete exported files no website refers to any more.')
+@with_appcontext
+def export_sites_command(processes, prune):
+    """Re-exports the static preview of every website, e.g. after preview.html or preview.css changed."""
+    exported = export_all_websites(processes=processes)
+    click.echo(f"Exported {exported} website(s) to {site_exporter.export_dir}")
+    if prune:
+        click.echo(f"Pruned {site_exporter.prune()} unreferenced file(s)")
+
+# One exporter per worker process
+site_exporter = SiteExporter()
@@ -0,0 +1,58 @@
+import gzip
+import hashlib
+import logging
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+# Stylesheet shared by every preview page, served fingerprinted from preview_bp
+PREVIEW_CSS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'preview.css')
+
+class PreviewStylesheet:
+    """
+    The static part of preview.html's styles, loaded once per worker.
+    Its URL carries a digest of the file, so browsers and CDNs may keep it forever
+    (Cache-Control: immutable) and a changed stylesheet is simply a new URL. The gzip
+    variant is compressed at startup rather than per request.
+    Exported pages embed the URL: after changing preview.css, run 'flask export-sites'.
+    """
+
+    def __init__(self, path=PREVIEW_CSS_PATH):
+        self.path = path
+        self.body = b''
+        self.gzipped = b''
+        self.digest = ''
+
+    def init_app(self, app):
+        with open(self.path, 'rb') as css_file:
+            self.body = css_file.read()
+        self.gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.digest = hashlib.sha256(self.body).hexdigest()[:16]
+        app.jinja_env.globals['preview_stylesheet_url'] = self.url
+        app.extensions['preview_stylesheet'] = self
+
+    @property
+    def url(self):
+        return f"/preview/assets/preview-{self.digest}.css"
+
+def configure_templates(app):
+    """
+    Keeps compiled templates in a Jinja bytecode cache (JINJA_BYTECODE_CACHE_DIR, by default
+    <instance folder>/jinja-cache), so new workers load preview.html's compiled code instead of
+    parsing it, then compiles preview.html up front so the first preview pays nothing.
+    """
+    if app.config.get('JINJA_BYTECODE_CACHE_ENABLED', True):
+        cache_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja-cache')
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        except OSError as e:
+            logger.warning("Jinja bytecode cache disabled, %s is not writable: %s", cache_dir, e)
+
+    preview_stylesheet.init_app(app)
+    app.jinja_env.get_template('preview.html')
+
+# One stylesheet per worker process
+preview_stylesheet = PreviewStylesheet()
@@ -0,0 +1,56 @@
+import threading
+import time
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at 'rate' tokens per second up to 'capacity'.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, rate, capacity):
+        with self._lock:
+            self.rate = float(rate)
+            self.capacity = float(capacity)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Takes 'tokens' if available. Returns (acquired, seconds until enough tokens would be available).
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True, 0.0
+            if self.rate <= 0:
+                return False, float('inf')
+            return False, (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Blocks until 'tokens' are available. Returns False if that would take longer than 'timeout'.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            acquired, wait = self.try_acquire(tokens)
+            if acquired:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def drain(self):
+        """Empties the bucket, e.g. after the upstream signalled that we are over quota."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = 0.0
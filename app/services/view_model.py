@@ -0,0 +1,115 @@
+import logging
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever build_view_model's output changes; stored view models of another
+# version are ignored (and rebuilt on the fly) until the site is written or re-exported.
+VIEW_MODEL_VERSION = 1
+
+# (theme key, CSS custom property, default) for the :root block of preview.html
+THEME_DEFAULTS = (
+    ('primary_color', '--primary-color', '#3498db'),
+    ('secondary_color', '--secondary-color', '#2c3e50'),
+    ('background_color', '--background-color', '#f4f7f6'),
+    ('text_color', '--text-color', '#333'),
+    ('heading_color', '--heading-color', '#2c3e50'),
+    ('font_family', '--font-family', 'Inter, sans-serif'),
+    ('section_bg_color', '--section-bg-color', '#ffffff'),
+    ('service_item_bg_color', '--service-item-bg-color', '#f9f9f9'),
+    ('border_color', '--border-color', '#eee'),
+    ('shadow_color', '--shadow-color', 'rgba(0, 0, 0, 0.1)')
+)
+
+def _section(content, name):
+    value = content.get(name)
+    return value if isinstance(value, dict) else {}
+
+def _text(section, key, default):
+    value = section.get(key)
+    return default if value is None else value
+
+def build_view_model(content):
+    """
+    Flattens a website's generated content into everything preview.html prints, with every
+    default already applied, so rendering is plain variable lookups.
+    'content' may be partial or malformed; missing pieces get the template's usual defaults.
+    """
+    if not isinstance(content, dict):
+        content = {}
+    hero = _section(content, 'hero_section')
+    about = _section(content, 'about_section')
+    services = _section(content, 'services_section')
+    contact = _section(content, 'contact_section')
+    theme = _section(content, 'theme')
+
+    items = services.get('items')
+    items = [item if isinstance(item, dict) else {} for item in items] if isinstance(items, list) else []
+    return {
+        'v': VIEW_MODEL_VERSION,
+        'title': _text(content, 'title', 'Website Preview'),
+        'footer_title': _text(content, 'title', 'AI Website Builder'),
+        'theme_css': ' '.join(
+            f"{prop}: {_text(theme, key, default)};" for key, prop, default in THEME_DEFAULTS
+        ),
+        'hero_heading': _text(hero, 'heading', 'Welcome to Our Website!'),
+        'hero_subheading': _text(hero, 'subheading', 'Your success is our priority.'),
+        'about_heading': _text(about, 'heading', 'About Us'),
+        'about_text': _text(about, 'text', 'Learn more about our company and what we do.'),
+        'services_heading': _text(services, 'heading', 'Our Services'),
+        'services': [
+            {
+                'title': _text(item, 'title', 'Service Title'),
+                'description': _text(item, 'description', 'Description of the service.')
+            }
+            for item in items
+        ],
+        'contact_heading': _text(contact, 'heading', 'Contact Us'),
+        'email': _text(contact, 'email', 'info@example.com'),
+        'phone': _text(contact, 'phone', '+1 (123) 456-7890'),
+        'address': _text(contact, 'address', '123 Business Rd, City, Country')
+    }
+
+def has_current_view(website):
+    """Whether the stored view model was built from the document's current content by this VIEW_MODEL_VERSION."""
+    view = website.get('view')
+    return isinstance(view, dict) and view.get('v') == VIEW_MODEL_VERSION and \
+        view.get('version') == website.get('version', 0)
+
+def view_for(website):
+    """
+    Returns the view model of a website document: the stored one if it is current,
+    otherwise a freshly built one.
+    """
+    if has_current_view(website):
+        return website['view']
+    return build_view_model(website.get('content'))
+
+def attach_view_model(site_data):
+    """Adds the view model to a new website document before it is inserted. Returns the document."""
+    view = build_view_model(site_data.get('content'))
+    view['version'] = site_data.get('version', 0)
+    site_data['view'] = view
+    return site_data
+
+def store_view_model(collection, website):
+    """
+    Stores the view model of a website document that was just updated (as returned by
+    find_one_and_update). The write only applies while the document is still at the same
+    version, so a slower writer never replaces the view model of a newer revision.
+    Failures are logged: readers then build the view model on the fly.
+    """
+    version = website.get('version', 0)
+    view = build_view_model(website.get('content'))
+    view['version'] = version
+    try:
+        collection.update_one(
+            {'_id': website['_id'], 'version': {'$in': [0, None]} if version == 0 else version},
+            {'$set': {'view': view}}
+        )
+    except PyMongoError as e:
+        logger.warning("Could not store the view model of website %s: %s", website.get('_id'), e)
+        return None
+    website['view'] = view
+    return view
@@ -0,0 +1,9 @@
+"""
+ASGI entry point, next to run.py (WSGI). Serve with e.g.
+    uvicorn asgi:app --workers 4
+or  gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+Needs the packages in requirements-asgi.txt in addition to requirements.txt.
+"""
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
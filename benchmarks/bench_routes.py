@@ -0,0 +1,286 @@
+"""
+End-to-end benchmark of the main routes.
+
+Builds the real app with create_app(), seeds a reproducible dataset, drives the routes
+through Flask's test client at the requested concurrency and reports throughput and
+p50/p95/p99 latency per route as JSON. Content comes from the local generation backend,
+so no Gemini quota or network is used.
+
+By default MongoDB is replaced by mongomock (pip install -r benchmarks/requirements.txt).
+Pass --mongo-uri to run against a real server instead; the database named in the URI
+must be empty unless --drop is given, in which case it is dropped first.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_routes --users 50 --sites 2000 --requests 500 --concurrency 8
+    python -m benchmarks.bench_routes --output before.json
+    python -m benchmarks.bench_routes --baseline before.json --max-regression 20
+
+With --baseline, a route whose p95 got more than --max-regression percent slower is
+reported and the exit status is 1, so the script can gate CI.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Allow running the file directly as well as with -m
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, mongo
+from app.services.backends import LocalBackend
+from app.services.hashing import password_hasher
+from app.services.indexes import ensure_indexes
+from app.services.jobs import generation_jobs
+
+PASSWORD = 'bench-password'
+
+BUSINESS_TYPES = ['bakery', 'law firm', 'gym', 'dental clinic', 'cafe', 'bookshop', 'florist', 'garage']
+INDUSTRIES = ['food', 'legal', 'fitness', 'healthcare', 'hospitality', 'retail', 'automotive']
+
+ROUTES = ['login', 'list_sites', 'list_sites_admin', 'get_site', 'preview', 'generate']
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(percent / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def build_app(args, export_dir):
+    overrides = {
+        'GENERATION_BACKEND': 'local',
+        'GENERATION_RECOVER_ON_START': False,
+        # Every virtual user would otherwise hit the generate and login limits within seconds
+        'RATE_LIMIT_ENABLED': False,
+        'MONGO_ENSURE_INDEXES': False,
+        'BCRYPT_LOG_ROUNDS': args.bcrypt_rounds,
+        'EXPORT_ENABLED': not args.no_export,
+        'EXPORT_DIR': export_dir,
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY') or 'bench-secret'
+    }
+    # In memory mode PyMongo still needs a URI to build its (unused) client; nothing connects to it
+    overrides['MONGO_URI'] = args.mongo_uri or 'mongodb://localhost:27017/bench'
+    app = create_app(overrides)
+
+    if not args.mongo_uri:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit('mongomock is not installed: pip install -r benchmarks/requirements.txt, or pass --mongo-uri')
+        mongo.cx = mongomock.MongoClient()
+        mongo.db = mongo.cx['bench']
+    elif args.drop:
+        mongo.cx.drop_database(mongo.db.name)
+    elif mongo.db.list_collection_names():
+        sys.exit(f"Database '{mongo.db.name}' is not empty; use an empty database or pass --drop")
+
+    ensure_indexes(mongo.db)
+    return app
+
+def seed(app, args):
+    """
+    Inserts users and websites. The same --seed always produces the same dataset.
+    Returns (user documents, website ids).
+    """
+    rng = random.Random(args.seed)
+    backend = LocalBackend()
+    now = datetime.utcnow()
+
+    with app.app_context():
+        # One hash for everyone: hashing is measured by the login route, not by seeding
+        password_hash = password_hasher.hash(PASSWORD)
+
+        users = [{
+            'email': f'bench{i}@example.com',
+            'password': password_hash,
+            'role': 'Admin' if i == 0 else 'Editor',
+            'created_at': now,
+            'last_login': now
+        } for i in range(args.users)]
+        mongo.db.users.insert_many(users)
+        user_ids = [str(user['_id']) for user in users]
+
+        sites = []
+        for i in range(args.sites):
+            business_type = rng.choice(BUSINESS_TYPES)
+            industry = rng.choice(INDUSTRIES)
+            created_at = now - timedelta(minutes=args.sites - i)
+            site = {
+                'owner': rng.choice(user_ids),
+                'business_type': business_type,
+                'industry': industry,
+                'content': backend.generate(business_type, industry),
+                'created_at': created_at,
+                'last_updated': created_at
+            }
+            if rng.random() < 0.2:
+                site['shared_with'] = rng.sample(user_ids, min(3, len(user_ids)))
+            sites.append(site)
+        if sites:
+            mongo.db.websites.insert_many(sites)
+
+    return users, [str(site['_id']) for site in sites]
+
+def login(client, email):
+    response = client.post('/auth/login', json={'email': email, 'password': PASSWORD})
+    if response.status_code != 200:
+        sys.exit(f"Login failed for {email}: {response.status_code} {response.get_data(as_text=True)}")
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+def make_requests(app, users, site_ids, args):
+    """
+    Returns {route: function(rng) -> (method, url, kwargs, expected status codes)}.
+    """
+    client = app.test_client()
+    admin_headers = login(client, users[0]['email'])
+    editor_headers = [login(client, user['email']) for user in users[1:1 + args.tokens]] or [admin_headers]
+
+    return {
+        'login': lambda rng: ('POST', '/auth/login',
+                              {'json': {'email': rng.choice(users)['email'], 'password': PASSWORD}}, (200,)),
+        'list_sites': lambda rng: ('GET', f'/api/?limit={args.page_size}',
+                                   {'headers': rng.choice(editor_headers)}, (200,)),
+        'list_sites_admin': lambda rng: ('GET', f'/api/?limit={args.page_size}', {'headers': admin_headers}, (200,)),
+        'get_site': lambda rng: ('GET', f'/api/{rng.choice(site_ids)}', {'headers': rng.choice(editor_headers)}, (200,)),
+        'preview': lambda rng: ('GET', f'/preview/{rng.choice(site_ids)}', {}, (200,)),
+        'generate': lambda rng: ('POST', '/api/generate',
+                                 {'headers': rng.choice(editor_headers),
+                                  'json': {'business_type': rng.choice(BUSINESS_TYPES),
+                                           'industry': rng.choice(INDUSTRIES)}}, (202,))
+    }
+
+def run_route(app, build_request, args, route_index):
+    """
+    Sends args.warmup unmeasured requests, then args.requests measured ones from
+    args.concurrency threads. Each request's latency includes reading the whole body.
+    """
+    local = threading.local()
+
+    def send(index):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        # Per-request RNG so the request mix does not depend on thread scheduling
+        rng = random.Random(args.seed * 1000003 + route_index * 10007 + index)
+        method, url, kwargs, expected = build_request(rng)
+        started = time.perf_counter()
+        response = local.client.open(url, method=method, **kwargs)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        return elapsed, response.status_code in expected
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(send, range(args.warmup)))
+        started = time.perf_counter()
+        results = list(pool.map(send, range(args.warmup, args.warmup + args.requests)))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed for elapsed, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    to_ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'throughput_rps': round(len(results) / wall, 1) if wall else None,
+        'mean_ms': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+        'max_ms': to_ms(latencies[-1]) if latencies else None
+    }
+
+def compare(report, baseline, max_regression):
+    """Returns a list of messages for routes whose p95 regressed beyond max_regression percent."""
+    regressions = []
+    for route, result in report['routes'].items():
+        before = baseline.get('routes', {}).get(route)
+        if not before or not before.get('p95_ms') or result['p95_ms'] is None:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        line = f"{route}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms ({change:+.1f}%)"
+        print(line, file=sys.stderr)
+        if change > max_regression:
+            regressions.append(line)
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the main routes end to end.')
+    parser.add_argument('--mongo-uri', help='Run against this MongoDB instead of mongomock')
+    parser.add_argument('--drop', action='store_true', help='Drop the --mongo-uri database before seeding')
+    parser.add_argument('--users', type=int, default=50, help='Users to seed (the first one is an Admin)')
+    parser.add_argument('--sites', type=int, default=2000, help='Websites to seed')
+    parser.add_argument('--tokens', type=int, default=10, help='Distinct non-admin users sending requests')
+    parser.add_argument('--requests', type=int, default=500, help='Measured requests per route')
+    parser.add_argument('--warmup', type=int, default=50, help='Unmeasured requests per route')
+    parser.add_argument('--concurrency', type=int, default=8, help='Threads sending requests')
+    parser.add_argument('--page-size', type=int, default=100, help="'limit' of listing requests")
+    parser.add_argument('--routes', default=','.join(ROUTES), help=f"Comma-separated subset of: {', '.join(ROUTES)}")
+    parser.add_argument('--bcrypt-rounds', type=int, default=4,
+                        help='bcrypt cost for the login route (production uses BCRYPT_LOG_ROUNDS, 12 by default)')
+    parser.add_argument('--no-export', action='store_true', help='Disable the static export, so previews are rendered')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the dataset and the request mix')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON report of a previous run to compare p95 latencies against')
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help='Allowed p95 slowdown per route, in percent, when comparing with --baseline')
+    args = parser.parse_args(argv)
+
+    args.routes = [route.strip() for route in args.routes.split(',') if route.strip()]
+    unknown = set(args.routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"Unknown routes: {', '.join(sorted(unknown))}")
+    if args.users < 1 or args.sites < 1:
+        parser.error('--users and --sites must be at least 1')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='bench-export-') as export_dir:
+        app = build_app(args, export_dir)
+        users, site_ids = seed(app, args)
+        requests = make_requests(app, users, site_ids, args)
+
+        report = {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'mongo': 'mongomock' if not args.mongo_uri else 'mongodb',
+                'config': {key: getattr(args, key) for key in (
+                    'users', 'sites', 'tokens', 'requests', 'warmup', 'concurrency',
+                    'page_size', 'bcrypt_rounds', 'no_export', 'seed')}
+            },
+            'routes': {}
+        }
+        # 'generate' runs last: its jobs keep inserting websites in the background
+        for route in (name for name in ROUTES if name in args.routes):
+            report['routes'][route] = run_route(app, requests[route], args, ROUTES.index(route))
+            print(f"{route}: {report['routes'][route]}", file=sys.stderr)
+        # Let the background generations finish their exports before the directory is removed
+        generation_jobs.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print(f"{len(regressions)} route(s) regressed by more than {args.max_regression}%", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Worker boot report.
+
+Starts a fresh interpreter with 'python -X importtime' that imports the app and calls
+create_app(), the work every gunicorn worker (or, with preload_app, the master) does at
+boot, and reports the total boot time plus the slowest imports as JSON. Cumulative times
+include a module's own imports, so top-level packages such as 'app.routes.website' show
+what importing them costs end to end.
+
+The app is built with the local generation backend and without index checks or job
+recovery, so no MongoDB server or Gemini key is needed.
+
+Usage (from the repository root):
+    python -m benchmarks.boot_report --top 25
+    python -m benchmarks.boot_report --output boot-before.json
+    python -m benchmarks.boot_report --baseline boot-before.json --max-regression 20
+
+With --baseline, a boot that got more than --max-regression percent slower is reported and
+the exit status is 1, so the script can gate CI.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT_SCRIPT = """
+import time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app({
+    'GENERATION_BACKEND': 'local',
+    'GENERATION_RECOVER_ON_START': False,
+    'MONGO_ENSURE_INDEXES': False,
+    'MONGO_URI': 'mongodb://localhost:27017/boot_report',
+    'JWT_SECRET_KEY': 'boot-report'
+})
+print('BOOT', imported - started, time.perf_counter() - imported)
+"""
+
+def parse_importtime(stderr):
+    """
+    Parses '-X importtime' output ('import time: self [us] | cumulative | imported package').
+    Returns {module: (self seconds, cumulative seconds)}.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+        except ValueError:
+            continue
+    return modules
+
+def run_boot():
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    # Keep the report's own metrics out of a running server's multiprocess directory
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.exit(f"Boot failed:\n{result.stderr[-4000:]}")
+    boot_line = next(line for line in result.stdout.splitlines() if line.startswith('BOOT '))
+    _, import_seconds, create_seconds = boot_line.split()
+    return wall, float(import_seconds), float(create_seconds), parse_importtime(result.stderr)
+
+def build_report(top):
+    wall, import_seconds, create_seconds, modules = run_boot()
+    slowest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[:top]
+    return {
+        'python': platform.python_version(),
+        'process_seconds': round(wall, 4),
+        'import_app_seconds': round(import_seconds, 4),
+        'create_app_seconds': round(create_seconds, 4),
+        'boot_seconds': round(import_seconds + create_seconds, 4),
+        'modules_imported': len(modules),
+        'slowest_imports': [
+            {'module': name, 'cumulative_seconds': round(cumulative, 4), 'self_seconds': round(own, 4)}
+            for name, (own, cumulative) in slowest
+        ],
+        # Whether the heavy optional stack was loaded at boot; it should only load on first generation
+        'google_generativeai_imported': 'google.generativeai' in modules
+    }
+
+def compare(report, baseline, max_regression):
+    """Returns a message if boot_seconds regressed beyond max_regression percent, else None."""
+    before = baseline.get('boot_seconds')
+    if not before:
+        return None
+    change = (report['boot_seconds'] - before) / before * 100
+    if change > max_regression:
+        return f"boot: {before:.3f}s -> {report['boot_seconds']:.3f}s ({change:+.1f}%)"
+    return None
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Report the boot time of an app worker and its slowest imports.')
+    parser.add_argument('--top', type=int, default=20, help='Slowest imports to list (by cumulative time)')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON report of a previous run to compare the boot time against')
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help='Allowed boot slowdown, in percent, when comparing with --baseline')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = build_report(args.top)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regression = compare(report, json.load(f), args.max_regression)
+        if regression:
+            print(f"Boot regressed by more than {args.max_regression}%: {regression}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -67,11 +67,13 @@ function getUserIdFromToken(token) {
 * @param {string} method - HTTP method (e.g., 'GET', 'POST', 'PUT', 'DELETE').
 * @param {object|null} body - JSON body for POST/PUT requests.
 * @param {boolean} requiresAuth - True if the request needs a JWT token.
+* @param {object} extraHeaders - Additional request headers (may override Content-Type).
 * @returns {Promise<object>} An object containing success status, message, and data.
 */
-async function apiRequest(url, method, body = null, requiresAuth = true) {
+async function apiRequest(url, method, body = null, requiresAuth = true, extraHeaders = {}) {
     const headers = {
         'Content-Type': 'application/json',
+        ...extraHeaders
     };
 
     if (requiresAuth) {
@@ -109,7 +111,7 @@ async function apiRequest(url, method, body = null, requiresAuth = true) {
                     }, 3000); // Show for 3 seconds before redirect
                 }
             }
-            return { success: false, message: data.msg || `API Error: ${response.statusText}` };
+            return { success: false, status: response.status, message: data.msg || `API Error: ${response.statusText}`, data: data };
         }
     } catch (error) {
         console.error(`API Request Error (${method} ${url}):`, error);
@@ -152,7 +154,160 @@ async function login(email, password) {
 * @returns {Promise<object>} Website generation response.
 */
 async function generateWebsite(business_type, industry) {
-    return apiRequest(`${BASE_URL}/api/generate`, 'POST', { business_type, industry });
+    const response = await apiRequest(`${BASE_URL}/api/generate`, 'POST', { business_type, industry });
+    if (!response.success || !response.data.job_id) {
+        return response;
+    }
+    // Generation runs in the background on the server; wait for the job to finish
+    return waitForGenerationJob(response.data.job_id);
+}
+
+/**
+* Generates a new website, receiving its sections as they are written by the AI.
+* Reads the Server-Sent Events stream of /api/generate/stream with fetch (EventSource can't send the JWT).
+* @param {string} business_type - Type of business.
+* @param {string} industry - Industry of the business.
+* @param {function} onSection - Called with (section, value) for every completed section.
+* @returns {Promise<object>} Final response, with data.id set to the new website ID on success.
+*/
+async function generateWebsiteStream(business_type, industry, onSection) {
+    const token = getToken();
+    if (!token) {
+        return { success: false, message: 'Authentication required. Please log in.' };
+    }
+
+    try {
+        const response = await fetch(`${BASE_URL}/api/generate/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${token}` },
+            body: JSON.stringify({ business_type, industry })
+        });
+        if (!response.ok) {
+            const data = await response.json();
+            return { success: false, message: data.msg || `API Error: ${response.statusText}` };
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    else if (line.startsWith('data: ')) eventData += line.slice(6);
+                });
+                const payload = JSON.parse(eventData || '{}');
+
+                if (eventName === 'section') {
+                    onSection(payload.section, payload.value);
+                } else if (eventName === 'done') {
+                    return { success: true, message: payload.msg, data: payload };
+                } else if (eventName === 'error') {
+                    return { success: false, message: payload.msg };
+                }
+            }
+        }
+        return { success: false, message: 'Generation stream ended unexpectedly.' };
+    } catch (error) {
+        console.error('Generation stream error:', error);
+        return { success: false, message: 'Network error or server unreachable. Please check your connection and ensure the backend server is running.' };
+    }
+}
+
+/**
+* Renders one streamed section into the live generation preview.
+* @param {HTMLElement} container - Preview container.
+* @param {string} section - Section name (e.g. 'title', 'hero_section').
+* @param {object|string} value - Section content.
+*/
+function renderPreviewSection(container, section, value) {
+    const block = document.createElement('div');
+    block.className = 'preview-section';
+    const heading = document.createElement('strong');
+    const text = document.createElement('p');
+
+    if (section === 'title') {
+        heading.textContent = value;
+    } else if (section === 'services_section') {
+        heading.textContent = value.heading || 'Services';
+        text.textContent = (value.items || []).map(item => item.title).join(' · ');
+    } else if (section === 'contact_section') {
+        heading.textContent = value.heading || 'Contact';
+        text.textContent = [value.email, value.phone, value.address].filter(Boolean).join(' | ');
+    } else if (section === 'theme') {
+        heading.textContent = 'Theme';
+        text.textContent = value.font_family || '';
+        block.style.borderLeft = `6px solid ${value.primary_color || '#3498db'}`;
+    } else {
+        heading.textContent = value.heading || section;
+        text.textContent = value.subheading || value.text || '';
+    }
+
+    block.appendChild(heading);
+    if (text.textContent) {
+        block.appendChild(text);
+    }
+    container.appendChild(block);
+}
+
+/**
+* Polls a generation job until it is done or failed.
+* @param {string} jobId - Job ID returned by /api/generate.
+* @param {number} intervalMs - Delay between polls.
+* @param {number} timeoutMs - Give up after this long.
+* @returns {Promise<object>} Final job status response.
+*/
+async function waitForGenerationJob(jobId, intervalMs = 1500, timeoutMs = 120000) {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+        const response = await apiRequest(`${BASE_URL}/api/jobs/${jobId}`, 'GET');
+        if (!response.success) {
+            return response;
+        }
+        if (response.data.status === 'done') {
+            return { success: true, message: 'Website created successfully', data: response.data };
+        }
+        if (response.data.status === 'failed') {
+            return { success: false, message: response.data.error || 'Website generation failed' };
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+    return { success: false, message: 'Website generation is taking longer than expected. Check back shortly.' };
+}
+
+/**
+* Fetches every page of a paginated listing endpoint.
+* The backend returns { items, next_after } pages; this follows next_after until it is null.
+* @param {string} url - The listing endpoint URL (without query string).
+* @param {number} pageSize - Items requested per page.
+* @returns {Promise<object>} { success, items } or the failed response.
+*/
+async function fetchAllPages(url, pageSize = 500) {
+    const items = [];
+    let after = null;
+    do {
+        const query = after ? `?limit=${pageSize}&after=${encodeURIComponent(after)}` : `?limit=${pageSize}`;
+        const response = await apiRequest(`${url}${query}`, 'GET');
+        if (!response.success) {
+            return response;
+        }
+        items.push(...response.data.items);
+        after = response.data.next_after;
+    } while (after);
+    return { success: true, items };
 }
 
 /**
@@ -160,10 +315,9 @@ async function generateWebsite(business_type, industry) {
 * @returns {Promise<object>} List of websites.
 */
 async function getWebsites() {
-    // Note: The backend's /api/ route returns a list directly, not nested under 'data' or 'websites'
-    const response = await apiRequest(`${BASE_URL}/api/`, 'GET');
+    const response = await fetchAllPages(`${BASE_URL}/api/`);
     if (response.success) {
-        return { success: true, websites: response.data }; // Assume response.data is the array of websites
+        return { success: true, websites: response.items };
     }
     return response;
 }
@@ -191,6 +345,62 @@ async function updateWebsite(id, updateData) {
     return apiRequest(`${BASE_URL}/api/${id}`, 'PUT', updateData);
 }
 
+/**
+* Partially updates a website with a JSON merge patch; only the given fields are written.
+* @param {string} id - Website ID.
+* @param {object} patch - Merge patch (e.g., { content: { title: "New Title" } }); null removes a field.
+* @param {number|null} version - Version the patch was made against; a concurrent change then fails with status 412.
+* @returns {Promise<object>} Update response, with the website's new version in data.version.
+*/
+async function patchWebsite(id, patch, version = null) {
+    const headers = { 'Content-Type': 'application/merge-patch+json' };
+    if (version !== null && version !== undefined) {
+        headers['If-Match'] = `"${version}"`;
+    }
+    return apiRequest(`${BASE_URL}/api/${id}`, 'PATCH', patch, true, headers);
+}
+
+/**
+* Builds a merge patch holding only the values of 'edited' that differ from 'original'.
+* @param {object} original - Content as loaded.
+* @param {object} edited - Content as edited (may cover only some fields).
+* @returns {object} The patch; empty if nothing changed.
+*/
+function buildMergePatch(original, edited) {
+    const patch = {};
+    Object.keys(edited).forEach(key => {
+        const before = original ? original[key] : undefined;
+        const after = edited[key];
+        if (after && typeof after === 'object' && !Array.isArray(after) && before && typeof before === 'object' && !Array.isArray(before)) {
+            const nested = buildMergePatch(before, after);
+            if (Object.keys(nested).length > 0) {
+                patch[key] = nested;
+            }
+        } else if (JSON.stringify(before) !== JSON.stringify(after)) {
+            patch[key] = after;
+        }
+    });
+    return patch;
+}
+
+/**
+* Asks the AI to rewrite one section of a website (e.g. 'services_section' or 'theme'); the rest is kept.
+* @param {string} id - Website ID.
+* @param {string} section - Top-level content section to regenerate.
+* @param {number|null} version - Version the request is based on; a concurrent change then fails with status 412.
+* @returns {Promise<object>} Response with the new section value in data.value and the new version in data.version.
+*/
+async function regenerateSection(id, section, version = null) {
+    const headers = {};
+    if (version !== null && version !== undefined) {
+        headers['If-Match'] = `"${version}"`;
+    }
+    return apiRequest(`${BASE_URL}/api/${id}/regenerate/${section}`, 'POST', null, true, headers);
+}
+
+// Website currently open in the edit modal: { id, version, content }
+let editingWebsite = null;
+
 /**
 * Deletes a website by ID.
 * @param {string} id - Website ID.
@@ -217,9 +427,9 @@ async function assignRole(userId, role) {
 * @returns {Promise<object>} List of users.
 */
 async function listUsers() {
-    const response = await apiRequest(`${BASE_URL}/admin/users`, 'GET');
+    const response = await fetchAllPages(`${BASE_URL}/admin/users`);
     if (response.success) {
-        return { success: true, users: response.data }; // Assume response.data is the array of users
+        return { success: true, users: response.items };
     }
     return response;
 }
@@ -254,6 +464,7 @@ function openEditWebsiteModal(siteId) {
     getWebsiteById(siteId).then(response => {
         if (response.success && response.website && response.website.content) {
             const content = response.website.content;
+            editingWebsite = { id: siteId, version: response.website.version, content: content };
             editWebsiteId.value = siteId;
             editTitle.value = content.title || '';
             
@@ -277,7 +488,33 @@ function openEditWebsiteModal(siteId) {
     });
 }
 
+async function regenerateSectionFromEditor(section) {
+    const editWebsiteMessage = document.getElementById('editWebsiteMessage');
+    if (!editingWebsite) {
+        return;
+    }
+    editWebsiteMessage.className = 'message';
+    editWebsiteMessage.textContent = 'Regenerating with AI...';
+
+    const response = await regenerateSection(editingWebsite.id, section, editingWebsite.version);
+    if (response.status === 412) {
+        editWebsiteMessage.className = 'message error';
+        editWebsiteMessage.textContent = 'This website was changed by someone else while you were editing. Please reopen it to see the latest version.';
+        return;
+    }
+    if (response.success) {
+        editingWebsite.version = response.data.version;
+        editingWebsite.content[section] = response.data.value;
+        editWebsiteMessage.className = 'message success';
+        editWebsiteMessage.textContent = response.message;
+    } else {
+        editWebsiteMessage.className = 'message error';
+        editWebsiteMessage.textContent = response.message;
+    }
+}
+
 function closeEditWebsiteModal() {
+    editingWebsite = null;
     document.getElementById('editWebsiteModal').style.display = 'none';
     document.getElementById('editWebsiteForm').reset(); // Clear form fields
 }
@@ -414,11 +651,17 @@ document.addEventListener('DOMContentLoaded', async () => {
         const generateMessageDiv = document.getElementById('generateMessage');
         const loader = document.getElementById('loader');
 
+        const generatePreview = document.getElementById('generatePreview');
+
         loader.style.display = 'block';
         generateMessageDiv.textContent = ''; // Clear previous messages
         generateMessageDiv.className = 'message'; // Reset class
+        generatePreview.innerHTML = ''; // Clear the previous live preview
 
-        const response = await generateWebsite(business_type, industry);
+        // Show each section as soon as the AI has written it
+        const response = await generateWebsiteStream(business_type, industry, (section, value) => {
+            renderPreviewSection(generatePreview, section, value);
+        });
 
         loader.style.display = 'none';
         if (response.success) {
@@ -521,19 +764,16 @@ document.addEventListener('DOMContentLoaded', async () => {
         const siteId = document.getElementById('editWebsiteId').value;
         const editWebsiteMessage = document.getElementById('editWebsiteMessage');
 
-        const updatedContent = {
+        const editedContent = {
             title: document.getElementById('editTitle').value,
             hero_section: {
                 heading: document.getElementById('editHeroHeading').value,
-                subheading: document.getElementById('editHeroSubheading').value,
-                // image_description is AI-generated, not directly editable here
-                image_description: '' // Placeholder, will be overwritten by existing if not provided
+                subheading: document.getElementById('editHeroSubheading').value
             },
             about_section: {
                 heading: document.getElementById('editAboutHeading').value,
                 text: document.getElementById('editAboutText').value
             },
-            // services_section is not directly editable in this modal
             contact_section: {
                 email: document.getElementById('editContactEmail').value,
                 phone: document.getElementById('editContactPhone').value,
@@ -541,26 +781,30 @@ document.addEventListener('DOMContentLoaded', async () => {
             }
         };
 
-        // Fetch existing content to merge, especially for image_description in hero_section
-        const existingSiteResponse = await getWebsiteById(siteId);
-        if (existingSiteResponse.success && existingSiteResponse.website && existingSiteResponse.website.content) {
-            const existingContent = existingSiteResponse.website.content;
-            if (existingContent.hero_section && existingContent.hero_section.image_description) {
-                updatedContent.hero_section.image_description = existingContent.hero_section.image_description;
-            }
-            // Merge existing services_section as it's not edited in this modal
-            if (existingContent.services_section) {
-                updatedContent.services_section = existingContent.services_section;
-            }
-        } else {
+        if (!editingWebsite || editingWebsite.id !== siteId) {
             editWebsiteMessage.className = 'message error';
-            editWebsiteMessage.textContent = 'Could not fetch original content for merge. Saving partial update.';
+            editWebsiteMessage.textContent = 'Website data is not loaded. Please reopen the editor.';
+            return;
+        }
+
+        // Send only what changed; untouched fields (e.g. services, image descriptions) are left alone by the server
+        const contentPatch = buildMergePatch(editingWebsite.content, editedContent);
+        if (Object.keys(contentPatch).length === 0) {
+            editWebsiteMessage.className = 'message';
+            editWebsiteMessage.textContent = 'No changes to save.';
+            return;
         }
 
+        const response = await patchWebsite(siteId, { content: contentPatch }, editingWebsite.version);
 
-        const response = await updateWebsite(siteId, { content: updatedContent });
+        if (response.status === 412) {
+            editWebsiteMessage.className = 'message error';
+            editWebsiteMessage.textContent = 'This website was changed by someone else while you were editing. Please reopen it to see the latest version.';
+            return;
+        }
 
         if (response.success) {
+            editingWebsite.version = response.data.version;
             editWebsiteMessage.className = 'message success';
             editWebsiteMessage.textContent = response.message;
             loadWebsites(); // Reload websites list to show changes
@@ -0,0 +1,46 @@
+# Gunicorn settings for run:app. Command line flags still override anything set here.
+import os
+import shutil
+import tempfile
+
+# Workers share their Prometheus samples through this directory, so /metrics reports the
+# whole server rather than the one worker that answered. It must exist before the app (and
+# with it prometheus_client) is imported, which with preload_app happens before any server
+# hook runs, so it is emptied and created here. Gunicorn reads this file again on a reload
+# (SIGHUP); by then the master and its workers hold files in it, so it is emptied only once.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'website-builder-metrics'))
+if os.environ.get('_METRICS_DIR_CLEARED_BY') != str(os.getpid()):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.environ['_METRICS_DIR_CLEARED_BY'] = str(os.getpid())
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+def child_exit(server, worker):
+    # Drop the live gauges of a dead worker; its counters and histograms stay in the totals
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+# Load the app once in the master and fork workers from it: module imports, template
+# compilation and index checks happen once per server instead of once per worker, and
+# workers start (and restart) in milliseconds. GUNICORN_PRELOAD=false restores per-worker loading.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+workers = int(os.getenv('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1))
+
+# Recovering generation jobs starts threads, which must belong to the workers, not the master
+_recover_in_workers = preload_app and os.getenv('GENERATION_RECOVER_ON_START', 'true').lower() == 'true'
+if preload_app:
+    os.environ['GENERATION_RECOVER_ON_START'] = 'false'
+
+def pre_fork(server, worker):
+    if preload_app:
+        # Don't hand the master's MongoDB sockets and monitor threads to the child; it reconnects on first use
+        from app import mongo
+        if mongo.cx is not None:
+            mongo.cx.close()
+
+def post_worker_init(worker):
+    if _recover_in_workers:
+        from app.services.jobs import generation_jobs
+        try:
+            generation_jobs.recover()
+        except Exception as e:
+            worker.log.warning("Could not recover pending generation jobs: %s", e)
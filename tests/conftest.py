@@ -0,0 +1,22 @@
+import pytest
+
+@pytest.fixture
+def app(tmp_path):
+    """The Flask app on an in-memory MongoDB (mongomock) with the local generation backend."""
+    mongomock = pytest.importorskip('mongomock')
+    from app import create_app, mongo
+    from app.middleware.identity import token_cache
+
+    app = create_app({
+        'JWT_SECRET_KEY': 'test-secret-key-of-at-least-32-bytes',
+        'MONGO_URI': 'mongodb://localhost:27017/test',
+        'MONGO_ENSURE_INDEXES': False,
+        'GENERATION_BACKEND': 'local',
+        'GENERATION_RECOVER_ON_START': False,
+        'RATE_LIMIT_ENABLED': False,
+        'EXPORT_DIR': str(tmp_path)
+    })
+    mongo.cx = mongomock.MongoClient()
+    mongo.db = mongo.cx['test']
+    token_cache.clear()
+    return app
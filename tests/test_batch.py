@@ -0,0 +1,46 @@
+from google.api_core.exceptions import ResourceExhausted
+
+from app.services.batch import BatchGenerator
+from app.services.llm_client import CircuitOpenError
+from app.services.token_bucket import TokenBucket
+
+VALID = {'services_section': {'items': [{'title': 'A', 'description': 'B'}]}}
+
+class ScriptedBackend:
+    name = 'scripted'
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def generate(self, business_type, industry):
+        result = self.results[min(self.calls, len(self.results) - 1)]
+        self.calls += 1
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+def make_generator(backend):
+    generator = BatchGenerator()
+    generator.backend = backend
+    generator.bucket = TokenBucket(rate=1000, capacity=1000)
+    return generator
+
+def test_generates_valid_content():
+    generator = make_generator(ScriptedBackend(VALID))
+    assert generator._generate_one('Bakery', 'Food') == (VALID, None)
+
+def test_quota_error_is_not_retried_on_top_of_the_client_and_drains_the_bucket():
+    backend = ScriptedBackend(ResourceExhausted('quota'), VALID)
+    generator = make_generator(backend)
+    content, error = generator._generate_one('Bakery', 'Food')
+    assert content is None and 'quota' in error
+    # The Gemini client has already retried; the batch makes no calls of its own
+    assert backend.calls == 1
+    assert not generator.bucket.try_acquire()[0]
+
+def test_open_circuit_and_invalid_output_fail_the_item():
+    assert make_generator(ScriptedBackend(CircuitOpenError()))._generate_one('a', 'b')[0] is None
+    assert make_generator(ScriptedBackend({'title': 'No services'}))._generate_one('a', 'b') == (
+        None, 'AI failed to generate valid services'
+    )
@@ -0,0 +1,74 @@
+import gzip
+
+import pytest
+from flask import Flask, make_response
+
+from app.middleware.compression import (
+    ResponseCompressor, choose_encoding, encoded_etag, etag_matches, strip_encoding_suffix
+)
+
+BODY = b'{"items": []}' + b' ' * 2048
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    compressor = ResponseCompressor()
+    compressor.init_app(app)
+
+    @app.route('/strong')
+    def strong():
+        response = make_response(BODY)
+        response.mimetype = 'application/json'
+        response.set_etag('7')
+        return response
+
+    @app.route('/weak')
+    def weak():
+        response = make_response(BODY)
+        response.mimetype = 'application/json'
+        response.set_etag('7', weak=True)
+        return response
+
+    @app.route('/small')
+    def small():
+        response = make_response(b'{}')
+        response.mimetype = 'application/json'
+        return response
+
+    return app.test_client()
+
+def test_compressed_response_gets_its_own_strong_etag(client):
+    response = client.get('/strong', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == ('7-gzip', False)
+    assert gzip.decompress(response.get_data()) == BODY
+    assert 'Accept-Encoding' in response.vary
+
+def test_identity_response_keeps_the_etag(client):
+    response = client.get('/strong', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_etag() == ('7', False)
+
+def test_weak_etag_is_shared_by_all_encodings(client):
+    response = client.get('/weak', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == ('7', True)
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_etag_suffix_round_trip():
+    assert strip_encoding_suffix(encoded_etag('abc', 'br')) == 'abc'
+    assert strip_encoding_suffix('abc') == 'abc'
+
+@pytest.mark.parametrize('header, expected', [
+    ('"7"', True), ('"7-gzip"', True), ('W/"7-br"', True), ('"6", "7-gzip"', True), ('*', True),
+    ('"6"', False), ('"7-deflate"', False), ('', False)
+])
+def test_etag_matches_any_encoding_of_the_tag(header, expected):
+    assert etag_matches(header, '7') is expected
+
+def test_choose_encoding_prefers_the_best_quality():
+    assert choose_encoding({'gzip': 1.0, 'br': 0.5}) == 'gzip'
+    assert choose_encoding({'gzip': 0, 'br': 0}) is None
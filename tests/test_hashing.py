@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from app.services.hashing import HasherBusy, PasswordHasher
+from app.services.metrics import PASSWORD_HASH_QUEUED
+
+def make_hasher(max_workers=1, max_queue=1, timeout=5):
+    hasher = PasswordHasher()
+    hasher.max_workers = max_workers
+    hasher.max_queue = max_queue
+    hasher.timeout = timeout
+    return hasher
+
+def test_runs_work_on_the_pool():
+    assert make_hasher()._run(lambda a, b: a + b, 2, 3) == 5
+
+def test_rejects_work_beyond_the_queue():
+    hasher = make_hasher(max_workers=1, max_queue=0)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait()
+
+    thread = threading.Thread(target=hasher._run, args=(block,))
+    thread.start()
+    started.wait()
+    try:
+        with pytest.raises(HasherBusy):
+            hasher._run(lambda: None)
+    finally:
+        release.set()
+        thread.join()
+
+def test_timed_out_queued_hash_is_cancelled_and_frees_its_slot():
+    hasher = make_hasher(max_workers=1, max_queue=1, timeout=0.05)
+    release = threading.Event()
+    started = threading.Event()
+    ran = []
+
+    def block():
+        started.set()
+        release.wait()
+
+    def run_blocking():
+        # Times out as well, but a running hash can't be cancelled
+        with pytest.raises(HasherBusy):
+            hasher._run(block)
+
+    thread = threading.Thread(target=run_blocking)
+    thread.start()
+    started.wait()
+    queued_before = PASSWORD_HASH_QUEUED._value.get()
+
+    with pytest.raises(HasherBusy):
+        hasher._run(lambda: ran.append(True))
+    assert PASSWORD_HASH_QUEUED._value.get() == queued_before
+
+    release.set()
+    thread.join()
+    hasher._get_executor().shutdown(wait=True)
+    assert ran == []
+    assert hasher._pending == 0
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app import mongo
+from app.services.jobs import DONE, FAILED, QUEUED, RUNNING, GenerationJobQueue, generation_jobs
+
+@pytest.mark.parametrize('job_id', ['bad', '', '123', 'zzzzzzzzzzzzzzzzzzzzzzzz'])
+def test_get_returns_none_for_invalid_ids(job_id):
+    # Answered without a query, so the status route responds 404 rather than 500
+    assert GenerationJobQueue().get(job_id) is None
+
+class RecordingExecutor:
+    """Stands in for the thread pool: records the scheduled jobs, which run only when asked."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, job_id):
+        self.submitted.append((fn, job_id))
+
+    def run_all(self):
+        submitted, self.submitted = self.submitted, []
+        for fn, job_id in submitted:
+            fn(job_id)
+
+@pytest.fixture
+def queue(app, monkeypatch):
+    executor = RecordingExecutor()
+    monkeypatch.setattr(generation_jobs, '_get_executor', lambda: executor)
+    monkeypatch.setattr(generation_jobs, 'start_sweeper', lambda: None)
+    monkeypatch.setattr(generation_jobs, '_scheduled', set())
+    monkeypatch.setattr(generation_jobs, 'executor', executor, raising=False)
+    return generation_jobs
+
+def _insert_job(**fields):
+    now = datetime.utcnow()
+    job = {'owner': 'u1', 'business_type': 'bakery', 'industry': 'food', 'status': QUEUED,
+           'attempts': 0, 'created_at': now, 'updated_at': now, **fields}
+    return mongo.db.generation_jobs.insert_one(job).inserted_id
+
+def test_submitted_job_is_claimed_and_creates_the_website(app, queue):
+    with app.app_context():
+        job_id = queue.submit('u1', 'bakery', 'food')
+        assert queue.get(job_id)['status'] == QUEUED
+        queue.executor.run_all()
+        job = queue.get(job_id)
+
+    assert job['status'] == DONE
+    assert job['attempts'] == 1
+    website = mongo.db.websites.find_one({'_id': ObjectId(job['website_id'])})
+    assert website['owner'] == 'u1'
+    assert website['content']['services_section']['items']
+
+def test_backend_failure_fails_the_job(app, queue, monkeypatch):
+    def broken(business_type, industry):
+        raise RuntimeError('upstream down')
+
+    monkeypatch.setattr(queue.backend, 'generate', broken)
+    with app.app_context():
+        job_id = queue.submit('u1', 'bakery', 'food')
+        queue.executor.run_all()
+        job = queue.get(job_id)
+    assert job['status'] == FAILED
+    assert 'upstream down' not in job['error']
+
+def test_job_claimed_elsewhere_is_not_run_twice(app, queue):
+    job_id = _insert_job(status=RUNNING, attempts=1, lease_expires_at=datetime.utcnow() + timedelta(minutes=1))
+    with app.app_context():
+        queue._run(job_id)
+    assert mongo.db.generation_jobs.find_one({'_id': job_id})['attempts'] == 1
+
+def test_sweep_requeues_jobs_whose_lease_expired(app, queue):
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    job_id = _insert_job(status=RUNNING, attempts=1, lease_expires_at=expired)
+    with app.app_context():
+        assert queue.sweep(queued_before=datetime.utcnow() - timedelta(minutes=1)) == 1
+        assert mongo.db.generation_jobs.find_one({'_id': job_id})['status'] == QUEUED
+        queue.executor.run_all()
+    job = mongo.db.generation_jobs.find_one({'_id': job_id})
+    assert job['status'] == DONE
+    assert job['attempts'] == 2
+
+def test_sweep_fails_expired_jobs_out_of_attempts(app, queue):
+    job_id = _insert_job(status=RUNNING, attempts=queue.max_attempts,
+                         lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+    with app.app_context():
+        assert queue.sweep() == 0
+    job = mongo.db.generation_jobs.find_one({'_id': job_id})
+    assert job['status'] == FAILED
+    assert job['error'] == 'Generation did not complete after several attempts'
+
+def test_sweep_leaves_live_leases_alone(app, queue):
+    job_id = _insert_job(status=RUNNING, attempts=1, lease_expires_at=datetime.utcnow() + timedelta(minutes=1))
+    with app.app_context():
+        assert queue.sweep() == 0
+    assert mongo.db.generation_jobs.find_one({'_id': job_id})['status'] == RUNNING
+
+def test_repeated_sweeps_schedule_a_waiting_job_once(app, queue):
+    old = datetime.utcnow() - timedelta(hours=1)
+    _insert_job(updated_at=old)
+    with app.app_context():
+        assert queue.sweep(queued_before=datetime.utcnow()) == 1
+        assert queue.sweep(queued_before=datetime.utcnow()) == 0
+        assert len(queue.executor.submitted) == 1
+        # Once it has run, the id may be scheduled again (e.g. after being re-queued)
+        queue.executor.run_all()
+        assert queue._scheduled == set()
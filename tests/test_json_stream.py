@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from app.services.json_stream import TopLevelMemberParser
+
+DOCUMENT = json.dumps({
+    'title': 'Bakery, "fresh" {daily}',
+    'hero_section': {'headline': 'Bread', 'items': [1, 2, {'a': '}'}]},
+    'escaped': 'back\\slash \\" quote',
+    'count': 3,
+    'empty': {}
+})
+
+def _feed_in_chunks(text, size):
+    parser = TopLevelMemberParser()
+    members = []
+    for start in range(0, len(text), size):
+        members.extend(parser.feed(text[start:start + size]))
+    return parser, members
+
+@pytest.mark.parametrize('size', [1, 2, 7, 64, len(DOCUMENT)])
+def test_members_match_the_whole_document_for_any_chunking(size):
+    parser, members = _feed_in_chunks(DOCUMENT, size)
+    assert parser.done
+    assert members == list(json.loads(DOCUMENT).items())
+
+def test_member_is_returned_as_soon_as_it_is_complete():
+    parser = TopLevelMemberParser()
+    assert parser.feed('{"title": "Home", "hero') == [('title', 'Home')]
+    assert parser.feed('": {"headline": "Hi"}') == []
+    assert parser.feed('}') == [('hero', {'headline': 'Hi'})]
+    assert parser.done
+
+def test_buffer_only_keeps_the_member_in_progress():
+    parser = TopLevelMemberParser()
+    parser.feed('{"a": "' + 'x' * 1000 + '", "b": [1, ')
+    assert len(parser._buffer) < 20
+
+def test_text_after_the_closing_brace_is_ignored():
+    parser = TopLevelMemberParser()
+    assert parser.feed('{"a": 1}\n```') == [('a', 1)]
+    assert parser.feed('trailing') == []
+
+def test_empty_object_has_no_members():
+    parser, members = _feed_in_chunks('{ }', 1)
+    assert parser.done
+    assert members == []
+
+def test_top_level_array_is_rejected():
+    with pytest.raises(ValueError):
+        TopLevelMemberParser().feed('[1, 2]')
+
+def test_invalid_member_raises_value_error():
+    parser = TopLevelMemberParser()
+    with pytest.raises(ValueError):
+        parser.feed('{"a": tru, "b": 1}')
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from google.api_core.exceptions import InvalidArgument, ServiceUnavailable
+
+from app.services.llm_client import (
+    AsyncResilientClient, CircuitBreaker, CircuitOpenError, InvalidGenerationError, ResilientClient,
+    parse_generation, repair_json
+)
+
+SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {'title': {'type': 'STRING'}, 'items': {'type': 'ARRAY', 'items': {'type': 'STRING'}}},
+    'required': ['title']
+}
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGenerativeModel:
+    """
+    Scripted stand-in for genai.GenerativeModel, for exercising ResilientClient.
+    Each call consumes the next script entry: a string is returned as the response text,
+    an exception instance is raised. 'delay' adds latency to every call.
+    """
+
+    def __init__(self, script, delay=0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        with self._lock:
+            entry = self.script[min(self.calls, len(self.script) - 1)]
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if isinstance(entry, Exception):
+            raise entry
+        return FakeResponse(entry)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        with self._lock:
+            entry = self.script[min(self.calls, len(self.script) - 1)]
+            self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if isinstance(entry, Exception):
+            raise entry
+        return FakeResponse(entry)
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def make_client(model, breaker=None, max_retries=2):
+    client = ResilientClient(lambda: model)
+    client.max_retries = max_retries
+    client.backoff_base = 0
+    if breaker is not None:
+        client.breaker = breaker
+    return client
+
+# --- repair_json ---
+
+def test_repair_strips_fences_and_prose():
+    text = 'Here you go:\n```json\n{"title": "A"}\n```\nEnjoy!'
+    assert json.loads(repair_json(text)) == {'title': 'A'}
+
+def test_repair_closes_truncated_output():
+    assert json.loads(repair_json('{"title": "Cut sho')) == {'title': 'Cut sho'}
+    # A cut-off array element may be a cut-off key as well, so it is dropped
+    assert json.loads(repair_json('{"title": "A", "items": ["x", "y')) == {'title': 'A', 'items': ['x']}
+
+def test_repair_drops_dangling_member_and_trailing_commas():
+    assert json.loads(repair_json('{"title": "A", "items": ["x",], "other":')) == {'title': 'A', 'items': ['x']}
+
+def test_parse_generation_reports_repairs():
+    assert parse_generation('{"title": "A"}', SCHEMA) == ({'title': 'A'}, False)
+    assert parse_generation('{"title": "A",', SCHEMA) == ({'title': 'A'}, True)
+
+def test_parse_generation_rejects_schema_mismatch():
+    with pytest.raises(InvalidGenerationError):
+        parse_generation('{"items": []}', SCHEMA)
+
+# --- CircuitBreaker ---
+
+def test_breaker_opens_after_threshold_and_lets_one_trial_through(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.services.llm_client.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    assert not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow() == CircuitBreaker.TRIAL
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() is True
+
+def test_failed_trial_reopens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.services.llm_client.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+def test_abandoned_trial_reopens_instead_of_blocking_forever(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.services.llm_client.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    now[0] += 30
+    breaker.abandon(breaker.allow())
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] += 30
+    assert breaker.allow() == CircuitBreaker.TRIAL
+
+def test_abandon_ignores_calls_that_were_not_the_trial(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.services.llm_client.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    ticket = breaker.allow()
+    open_breaker(breaker)
+    now[0] += 30
+    assert breaker.allow() == CircuitBreaker.TRIAL
+    breaker.abandon(ticket)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+def test_unanswered_trial_times_out(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.services.llm_client.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, trial_timeout=60)
+    open_breaker(breaker)
+    now[0] += 30
+    assert breaker.allow() == CircuitBreaker.TRIAL
+    now[0] += 59
+    assert not breaker.allow()
+    now[0] += 1
+    assert breaker.allow() == CircuitBreaker.TRIAL
+
+# --- ResilientClient ---
+
+def test_retries_transient_errors():
+    model = FakeGenerativeModel([ServiceUnavailable('down'), ServiceUnavailable('down'), '{"title": "A"}'])
+    assert make_client(model).generate_json('prompt', {}, SCHEMA) == {'title': 'A'}
+    assert model.calls == 3
+
+def test_gives_up_after_max_retries():
+    model = FakeGenerativeModel([ServiceUnavailable('down')])
+    with pytest.raises(ServiceUnavailable):
+        make_client(model, max_retries=1).generate_text('prompt', {})
+    assert model.calls == 2
+
+def test_non_retryable_error_is_not_retried():
+    model = FakeGenerativeModel([InvalidArgument('bad'), 'never'])
+    with pytest.raises(InvalidArgument):
+        make_client(model).generate_text('prompt', {})
+    assert model.calls == 1
+
+def test_open_circuit_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    model = FakeGenerativeModel(['{"title": "A"}'])
+    with pytest.raises(CircuitOpenError):
+        make_client(model, breaker).generate_text('prompt', {})
+    assert model.calls == 0
+
+@pytest.mark.parametrize('error', [InvalidArgument('bad'), ValueError('boom')])
+def test_trial_failing_with_any_error_releases_the_breaker(error):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    client = make_client(FakeGenerativeModel([error]), breaker)
+    with pytest.raises(type(error)):
+        client.generate_text('prompt', {})
+    assert breaker.state == CircuitBreaker.OPEN
+
+    client.model_factory = lambda: FakeGenerativeModel(['ok'])
+    assert client.generate_text('prompt', {}) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_cancelled_async_trial_releases_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    client = AsyncResilientClient(make_client(FakeGenerativeModel(['ok'], delay=10), breaker))
+
+    async def cancel_trial():
+        task = asyncio.ensure_future(client.generate_text('prompt', {}))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() == CircuitBreaker.TRIAL
+
+# --- Hedging ---
+
+def make_hedging_client(model, threshold, max_workers):
+    client = make_client(model)
+    client.hedge_enabled = True
+    client.hedge_max_workers = max_workers
+    for _ in range(client.hedge_min_samples):
+        client.latencies.add(threshold)
+    return client
+
+def test_slow_call_is_hedged():
+    model = FakeGenerativeModel(['ok'], delay=0.2)
+    client = make_hedging_client(model, threshold=0.01, max_workers=2)
+    assert client.generate_text('prompt', {}) == 'ok'
+    assert model.calls == 2
+
+def test_time_queued_for_a_pool_thread_does_not_trigger_a_hedge():
+    model = FakeGenerativeModel(['ok'], delay=0.01)
+    client = make_hedging_client(model, threshold=0.1, max_workers=1)
+    # Keeps the only pool thread busy for longer than the hedge threshold
+    client._get_executor().submit(time.sleep, 0.3)
+    assert client.generate_text('prompt', {}) == 'ok'
+    assert model.calls == 1
+
+def test_hedge_pool_is_sized_from_config(app):
+    client = ResilientClient()
+    client.init_app(app)
+    assert client.hedge_max_workers == 2 * (app.config['BATCH_CONCURRENCY'] + app.config['GENERATION_WORKERS'])
+    app.config['LLM_HEDGE_MAX_WORKERS'] = 5
+    client.init_app(app)
+    assert client._get_executor()._max_workers == 5
+
+# --- Streaming ---
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+class FakeStreamingModel:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        return iter(FakeChunk(chunk) for chunk in self.chunks)
+
+def test_disconnected_stream_trial_releases_the_breaker(monkeypatch):
+    from app.services import generation
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    monkeypatch.setattr(generation.gemini_client, 'breaker', breaker)
+    monkeypatch.setattr(generation.generation_cache, 'enabled', False)
+    monkeypatch.setattr(generation, 'get_model', lambda: FakeStreamingModel(['{"title": "A",', ' "hero_section": {}}']))
+
+    sections = generation.stream_gemini_sections('Bakery', 'Food')
+    assert next(sections) == ('title', 'A')
+    # What the SSE response does when the client goes away
+    sections.close()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() == CircuitBreaker.TRIAL
@@ -0,0 +1,22 @@
+from app import create_app
+
+def _app(tmp_path, **config):
+    return create_app({
+        'JWT_SECRET_KEY': 'test-secret-key-of-at-least-32-bytes',
+        'MONGO_URI': 'mongodb://localhost:27017/test',
+        'MONGO_ENSURE_INDEXES': False,
+        'GENERATION_RECOVER_ON_START': False,
+        'EXPORT_DIR': str(tmp_path),
+        **config
+    })
+
+def test_metrics_endpoint_is_off_by_default(app):
+    assert app.test_client().get('/metrics').status_code == 404
+
+def test_metrics_endpoint_requires_the_token(tmp_path):
+    client = _app(tmp_path, METRICS_ENABLED=True, METRICS_TOKEN='scrape-secret').test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert b'# TYPE' in response.data
@@ -0,0 +1,102 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.services.json_provider import dumps
+from app.services.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PaginationError, aread_page, find_page, parse_page_args, read_page
+)
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def sort(self, key, direction):
+        self.calls.append(('sort', key, direction))
+        return self
+
+    def limit(self, count):
+        self.calls.append(('limit', count))
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    def __aiter__(self):
+        async def generate():
+            for doc in self.docs:
+                yield doc
+        return generate()
+
+class FakeCollection:
+    def __init__(self):
+        self.cursor = FakeCursor([])
+
+    def find(self, query, projection):
+        self.query, self.projection = query, projection
+        return self.cursor
+
+IDS = [ObjectId() for _ in range(3)]
+DOCS = [{'_id': oid, 'title': f'Site {index}', 'created_at': datetime(2030, 1, index + 1)} for index, oid in enumerate(IDS)]
+
+def _serialize(doc):
+    return {'id': doc['_id'], 'title': doc['title'], 'created_at': doc['created_at']}
+
+def test_parse_page_args_defaults():
+    assert parse_page_args({}) == (DEFAULT_PAGE_SIZE, None)
+
+def test_parse_page_args_reads_limit_and_after():
+    assert parse_page_args({'limit': '5', 'after': str(IDS[0])}) == (5, IDS[0])
+
+@pytest.mark.parametrize('args', [
+    {'limit': 'ten'}, {'limit': '0'}, {'limit': str(MAX_PAGE_SIZE + 1)}, {'after': 'not-an-id'}
+])
+def test_parse_page_args_rejects_malformed_values(args):
+    with pytest.raises(PaginationError):
+        parse_page_args(args)
+
+def test_find_page_fetches_one_extra_document_in_id_order():
+    collection = FakeCollection()
+    find_page(collection, {'owner': 'u1'}, {'title': 1}, 10)
+    assert collection.query == {'owner': 'u1'}
+    assert collection.projection == {'title': 1}
+    assert collection.cursor.calls == [('sort', '_id', 1), ('limit', 11)]
+
+def test_find_page_continues_after_the_given_id():
+    collection = FakeCollection()
+    find_page(collection, {'owner': 'u1'}, None, 10, after=IDS[0])
+    assert collection.query == {'$and': [{'owner': 'u1'}, {'_id': {'$gt': IDS[0]}}]}
+    find_page(collection, {}, None, 10, after=IDS[0])
+    assert collection.query == {'_id': {'$gt': IDS[0]}}
+
+def test_read_page_signals_the_next_page_with_the_last_id():
+    page = read_page(FakeCursor(DOCS), 2, _serialize)
+    assert [item['title'] for item in page['items']] == ['Site 0', 'Site 1']
+    assert page['next_after'] == IDS[1]
+
+def test_read_page_last_page_has_no_next_after():
+    page = read_page(FakeCursor(DOCS), 3, _serialize)
+    assert len(page['items']) == 3
+    assert page['next_after'] is None
+    assert read_page(FakeCursor([]), 3, _serialize) == {'items': [], 'next_after': None}
+
+def test_page_is_encoded_by_the_json_provider():
+    page = json.loads(dumps(read_page(FakeCursor(DOCS), 2, _serialize)))
+    assert page['items'][0] == {'id': str(IDS[0]), 'title': 'Site 0', 'created_at': '2030-01-01T00:00:00'}
+    assert page['next_after'] == str(IDS[1])
+
+def test_cursor_errors_are_raised_before_the_response_is_built():
+    class FailingCursor(FakeCursor):
+        def __iter__(self):
+            yield DOCS[0]
+            raise RuntimeError('connection reset')
+
+    with pytest.raises(RuntimeError):
+        read_page(FailingCursor(DOCS), 2, _serialize)
+
+def test_aread_page_reads_the_same_page():
+    assert asyncio.run(aread_page(FakeCursor(DOCS), 2, _serialize)) == read_page(FakeCursor(DOCS), 2, _serialize)
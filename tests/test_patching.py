@@ -0,0 +1,157 @@
+import pytest
+
+from app.services.patching import (
+    PatchError, apply_update, json_patch_to_update, merge_patch_to_update, parse_if_match
+)
+
+ALLOWED = ('content', 'business_type', 'industry')
+
+# --- Merge patch (RFC 7396) ---
+
+def test_merge_patch_sets_leaves_and_unsets_nulls():
+    update, conditions = merge_patch_to_update(
+        {'content': {'title': 'New', 'hero_section': {'heading': None}}, 'industry': 'Food'}, ALLOWED
+    )
+    assert update == {
+        '$set': {'content.title': 'New', 'industry': 'Food'},
+        '$unset': {'content.hero_section.heading': ''}
+    }
+    assert conditions == {}
+
+def test_merge_patch_replaces_arrays_whole():
+    update, _ = merge_patch_to_update({'content': {'services_section': {'items': [{'title': 'A'}]}}}, ALLOWED)
+    assert update == {'$set': {'content.services_section.items': [{'title': 'A'}]}}
+
+@pytest.mark.parametrize('patch', [{'content': {}}, {'content': {'hero_section': {}}}])
+def test_merge_patch_with_empty_object_changes_nothing(patch):
+    update, _ = merge_patch_to_update(patch, ALLOWED)
+    assert update == {}
+
+def test_merge_patch_keeps_siblings_of_empty_objects():
+    update, _ = merge_patch_to_update({'content': {'hero_section': {}, 'title': 'T'}}, ALLOWED)
+    assert update == {'$set': {'content.title': 'T'}}
+
+@pytest.mark.parametrize('patch', [
+    {'owner': 'someone'},
+    {'content': {'$where': 'x'}},
+    {'content': {'a.b': 1}},
+    {},
+    [],
+])
+def test_merge_patch_rejects_forbidden_or_malformed_patches(patch):
+    with pytest.raises(PatchError):
+        merge_patch_to_update(patch, ALLOWED)
+
+# --- JSON Patch (RFC 6902) ---
+
+def test_json_patch_add_and_append():
+    update, conditions = json_patch_to_update([
+        {'op': 'add', 'path': '/content/title', 'value': 'T'},
+        {'op': 'add', 'path': '/content/services_section/items/-', 'value': {'title': 'A'}},
+        {'op': 'add', 'path': '/content/services_section/items/-', 'value': {'title': 'B'}},
+    ], ALLOWED)
+    assert update == {
+        '$set': {'content.title': 'T'},
+        '$push': {'content.services_section.items': {'$each': [{'title': 'A'}, {'title': 'B'}]}}
+    }
+    assert conditions == {}
+
+def test_json_patch_replace_and_remove_require_the_path_to_exist():
+    update, conditions = json_patch_to_update([
+        {'op': 'replace', 'path': '/content/services_section/items/0', 'value': {'title': 'A'}},
+        {'op': 'remove', 'path': '/content/hero_section/subheading'},
+    ], ALLOWED)
+    assert update == {
+        '$set': {'content.services_section.items.0': {'title': 'A'}},
+        '$unset': {'content.hero_section.subheading': ''}
+    }
+    assert conditions == {
+        'content.services_section.items.0': {'$exists': True},
+        'content.hero_section.subheading': {'$exists': True}
+    }
+
+def test_json_patch_test_compares_the_whole_value():
+    _, conditions = json_patch_to_update([
+        {'op': 'test', 'path': '/content/tags', 'value': ['a']},
+        {'op': 'test', 'path': '/content/items/1/title', 'value': 'B'},
+    ], ALLOWED)
+    tags = {'$getField': {'field': {'$literal': 'tags'}, 'input':
+            {'$getField': {'field': {'$literal': 'content'}, 'input': '$$ROOT'}}}}
+    items = {'$getField': {'field': {'$literal': 'items'}, 'input':
+             {'$getField': {'field': {'$literal': 'content'}, 'input': '$$ROOT'}}}}
+    second = {'$cond': [
+        {'$isArray': items},
+        {'$arrayElemAt': [items, 1]},
+        {'$getField': {'field': {'$literal': '1'}, 'input': items}}
+    ]}
+    title = {'$getField': {'field': {'$literal': 'title'}, 'input': second}}
+    # Not a plain {'content.tags': ['a']} filter, which would also match ['a', 'b'] or [['a'], 'c']
+    assert conditions == {'$expr': {'$and': [
+        {'$eq': [tags, {'$literal': ['a']}]},
+        {'$eq': [title, {'$literal': 'B'}]},
+    ]}}
+
+@pytest.mark.parametrize('operations', [
+    [{'op': 'move', 'from': '/content/a', 'path': '/content/b'}],
+    [{'op': 'add', 'path': '/content/items/1', 'value': 'x'}],
+    [{'op': 'remove', 'path': '/content/items/1'}],
+    [{'op': 'replace', 'path': '/content/title'}],
+    [{'op': 'add', 'path': '/owner', 'value': 'x'}],
+    [{'op': 'add', 'path': 'content/title', 'value': 'x'}],
+    [{'op': 'add', 'path': '/content', 'value': {}}, {'op': 'add', 'path': '/content/title', 'value': 'x'}],
+    [],
+])
+def test_json_patch_rejects_unsupported_or_conflicting_operations(operations):
+    with pytest.raises(PatchError):
+        json_patch_to_update(operations, ALLOWED)
+
+def test_json_pointer_escapes():
+    update, _ = json_patch_to_update([{'op': 'add', 'path': '/content/a~1b~0c', 'value': 1}], ALLOWED)
+    assert update == {'$set': {'content.a/b~c': 1}}
+
+# --- If-Match ---
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None), ('', None), ('"3"', 3), ('W/"4"', 4), ('5', 5), ('"6-gzip"', 6), ('"7-br"', 7)
+])
+def test_parse_if_match(header, expected):
+    assert parse_if_match(header) == expected
+
+@pytest.mark.parametrize('header', ['*', '"a"', '"1", "2"', '"1-deflate"'])
+def test_parse_if_match_rejects_other_tags(header):
+    with pytest.raises(PatchError):
+        parse_if_match(header)
+
+# --- Applying an update in memory ---
+
+DOCUMENT = {'content': {'title': 'Old', 'services_section': {'items': [{'title': 'A'}, {'title': 'B'}]}}}
+
+def test_apply_update_matches_what_mongodb_would_store():
+    update, _ = json_patch_to_update([
+        {'op': 'replace', 'path': '/content/services_section/items/1/title', 'value': 'B2'},
+        {'op': 'add', 'path': '/content/hero_section/headline', 'value': 'Hi'},
+        {'op': 'remove', 'path': '/content/title'}
+    ], ALLOWED)
+    assert apply_update(DOCUMENT, update) == {'content': {
+        'services_section': {'items': [{'title': 'A'}, {'title': 'B2'}]},
+        'hero_section': {'headline': 'Hi'}
+    }}
+    # The document itself is left alone
+    assert DOCUMENT['content']['title'] == 'Old'
+
+def test_apply_update_appends_and_pads_arrays():
+    update, _ = json_patch_to_update([{'op': 'add', 'path': '/content/services_section/items/-', 'value': {'title': 'C'}}], ALLOWED)
+    assert [item['title'] for item in apply_update(DOCUMENT, update)['content']['services_section']['items']] == ['A', 'B', 'C']
+    padded = apply_update({'items': [1]}, {'$set': {'items.3.name': 'x'}})
+    assert padded == {'items': [1, None, None, {'name': 'x'}]}
+
+def test_apply_update_unset_of_missing_path_is_a_no_op():
+    assert apply_update(DOCUMENT, {'$unset': {'content.about_section.text': ''}}) == DOCUMENT
+
+@pytest.mark.parametrize('update', [
+    {'$set': {'content.title.text': 'x'}},
+    {'$push': {'content.title': {'$each': [1]}}}
+])
+def test_apply_update_rejects_paths_mongodb_would_reject(update):
+    with pytest.raises(PatchError):
+        apply_update(DOCUMENT, update)
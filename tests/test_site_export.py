@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.services import site_export
+from app.services.site_export import SiteExporter, minify_html
+
+@pytest.fixture
+def year(monkeypatch):
+    current = [2030]
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime(current[0], 6, 1)
+
+    monkeypatch.setattr(site_export, 'datetime', FrozenDatetime)
+    return current
+
+@pytest.fixture
+def exporter(tmp_path, monkeypatch):
+    exporter = SiteExporter()
+    exporter.export_dir = str(tmp_path)
+    # Stands in for render_template, which needs an app context
+    monkeypatch.setattr(exporter, 'render', lambda website, year=None: f"<p>{website['title']} {year}</p>".encode())
+    return exporter
+
+def _website(title='Home', last_updated=datetime(2030, 1, 1)):
+    return {'_id': ObjectId(), 'title': title, 'last_updated': last_updated}
+
+def test_export_writes_object_and_pointer(exporter, year):
+    website = _website()
+    digest = exporter.export(website)
+    pointer = exporter.lookup(str(website['_id']))
+    assert pointer == {'digest': digest, 'last_updated': '2030-01-01T00:00:00', 'year': 2030}
+    with open(exporter.object_path(digest), 'rb') as html_file:
+        assert html_file.read() == b'<p>Home 2030</p>'
+
+def test_pointer_from_an_earlier_year_is_ignored_and_re_exported(exporter, year):
+    website = _website()
+    old_digest = exporter.export(website)
+    year[0] = 2031
+    assert exporter.lookup(str(website['_id'])) is None
+
+    new_digest = exporter.export(website)
+    assert new_digest != old_digest
+    assert exporter.lookup(str(website['_id']))['year'] == 2031
+
+def test_older_revision_does_not_overwrite_newer_pointer(exporter, year):
+    website = _website(last_updated=datetime(2030, 3, 1))
+    newer = exporter.export(website)
+    stale = dict(website, title='Old', last_updated=datetime(2030, 2, 1))
+    assert exporter.export(stale) == newer
+
+def test_prune_keeps_referenced_objects(exporter, year):
+    kept = _website()
+    exporter.export(kept)
+    dropped = _website(title='Gone')
+    exporter.export(dropped)
+    exporter.remove(str(dropped['_id']))
+    assert exporter.prune() >= 1
+    assert exporter.lookup(str(kept['_id'])) is not None
+
+def test_lookup_rejects_malformed_ids(exporter):
+    assert exporter.lookup('../../etc/passwd') is None
+
+def test_minify_keeps_preformatted_blocks():
+    html = '<div>\n  <p>  Hello   world </p>\n</div>\n<pre>\n  a\n    b\n</pre><!-- note -->'
+    # Lines inside <pre> lose only their indentation
+    assert minify_html(html) == '<div><p> Hello world </p></div> <pre>\na\nb\n</pre>'
+
+def test_pointer_is_current_for_its_revision_or_an_older_one():
+    pointer = {'digest': 'abc', 'last_updated': '2030-01-02T00:00:00', 'year': 2030}
+    assert SiteExporter.current(pointer, datetime(2030, 1, 2))
+    # A secondary that has not seen the latest edit yet
+    assert SiteExporter.current(pointer, datetime(2030, 1, 1))
+    # Edited through another host since this one exported it
+    assert not SiteExporter.current(pointer, datetime(2030, 1, 2, 0, 0, 1))
+    assert not SiteExporter.current(dict(pointer, last_updated=None), datetime(2030, 1, 2))
+    assert SiteExporter.current(dict(pointer, last_updated=None), None)
@@ -0,0 +1,54 @@
+import pytest
+
+from app.services.token_bucket import TokenBucket
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('app.services.token_bucket.time.monotonic', lambda: now[0])
+    monkeypatch.setattr('app.services.token_bucket.time.sleep', lambda seconds: now.__setitem__(0, now[0] + seconds))
+    return now
+
+def test_starts_full_and_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire()[0] for _ in range(4)] == [True, True, True, False]
+    assert bucket.try_acquire() == (False, 0.5)
+    clock[0] += 0.5
+    assert bucket.try_acquire() == (True, 0.0)
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    bucket.try_acquire(2)
+    clock[0] += 60
+    assert bucket.try_acquire(2)[0]
+    assert not bucket.try_acquire()[0]
+
+def test_acquire_waits_for_tokens(clock):
+    bucket = TokenBucket(rate=4, capacity=1)
+    assert bucket.acquire()
+    started = clock[0]
+    assert bucket.acquire()
+    assert clock[0] - started == pytest.approx(0.25)
+
+def test_acquire_gives_up_past_timeout(clock):
+    bucket = TokenBucket(rate=1, capacity=1)
+    bucket.acquire()
+    assert not bucket.acquire(timeout=0.5)
+    assert bucket.acquire(timeout=1)
+
+def test_drain_empties_the_bucket(clock):
+    bucket = TokenBucket(rate=1, capacity=5)
+    bucket.drain()
+    assert bucket.try_acquire() == (False, 1.0)
+
+def test_zero_rate_never_refills(clock):
+    bucket = TokenBucket(rate=0, capacity=1)
+    bucket.try_acquire()
+    assert bucket.try_acquire() == (False, float('inf'))
+    assert not bucket.acquire(timeout=10)
+
+def test_configure_shrinks_tokens_to_new_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=10)
+    bucket.configure(rate=1, capacity=2)
+    assert bucket.try_acquire(2)[0]
+    assert not bucket.try_acquire()[0]
@@ -0,0 +1,146 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+
+from app import mongo
+from app.services.view_model import attach_view_model, has_current_view, view_for
+
+CONTENT = {
+    'title': 'Bakery',
+    'hero_section': {'heading': 'Fresh bread', 'subheading': 'Every morning'},
+    'services_section': {'items': [{'title': 'Bread'}, {'title': 'Cakes'}]}
+}
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def _headers(app, user_id='u1', role='Editor', **extra):
+    with app.app_context():
+        token = create_access_token(identity={'id': user_id, 'role': role})
+    return {'Authorization': f'Bearer {token}', **extra}
+
+def _insert_site(owner='u1'):
+    now = datetime(2030, 1, 1)
+    site = attach_view_model({
+        'owner': owner, 'business_type': 'bakery', 'industry': 'food', 'content': CONTENT,
+        'created_at': now, 'last_updated': now, 'version': 0
+    })
+    return str(mongo.db.websites.insert_one(site).inserted_id)
+
+def _stored(site_id):
+    return mongo.db.websites.find_one({'_id': ObjectId(site_id)})
+
+def test_put_accepts_a_document_from_get_and_ignores_server_fields(app, client):
+    site_id = _insert_site()
+    site = client.get(f'/api/{site_id}', headers=_headers(app)).get_json()
+    # Without 'content' the top-level fields are written
+    del site['content']
+    site.update(industry='retail', owner='someone-else', version=42, created_at='2000-01-01')
+
+    response = client.put(f'/api/{site_id}', json=site, headers=_headers(app))
+    assert response.status_code == 200
+    stored = _stored(site_id)
+    assert stored['industry'] == 'retail'
+    assert stored['owner'] == 'u1'
+    assert stored['version'] == 1
+    assert stored['created_at'] == datetime(2030, 1, 1)
+
+def test_put_with_only_server_fields_changes_nothing(app, client):
+    site_id = _insert_site()
+    response = client.put(f'/api/{site_id}', json={'owner': 'someone-else', 'view': {}}, headers=_headers(app))
+    assert response.status_code == 400
+    assert _stored(site_id)['owner'] == 'u1'
+
+def test_put_stores_the_view_model_with_the_new_content(app, client):
+    site_id = _insert_site()
+    response = client.put(f'/api/{site_id}', json={'content': {'title': 'Patisserie'}}, headers=_headers(app))
+    assert response.status_code == 200
+    stored = _stored(site_id)
+    assert has_current_view(stored)
+    assert stored['view']['title'] == 'Patisserie'
+
+def test_patch_stores_the_view_model_in_the_same_write(app, client):
+    site_id = _insert_site()
+    response = client.patch(
+        f'/api/{site_id}', json={'content': {'hero_section': {'heading': 'Warm rolls'}}},
+        headers=_headers(app, **{'If-Match': '"0"'})
+    )
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 1
+    stored = _stored(site_id)
+    assert has_current_view(stored)
+    assert view_for(stored)['hero_heading'] == 'Warm rolls'
+    assert stored['content']['hero_section']['subheading'] == 'Every morning'
+
+def test_patch_with_a_stale_version_fails_with_412(app, client):
+    site_id = _insert_site()
+    headers = _headers(app, **{'If-Match': '"3"'})
+    response = client.patch(f'/api/{site_id}', json={'industry': 'retail'}, headers=headers)
+    assert response.status_code == 412
+    assert response.get_json()['version'] == 0
+    assert _stored(site_id)['industry'] == 'food'
+
+def test_patch_replacing_a_missing_path_fails_with_409(app, client):
+    site_id = _insert_site()
+    response = client.patch(
+        f'/api/{site_id}', json=[{'op': 'replace', 'path': '/content/about_section', 'value': {}}],
+        headers=_headers(app, **{'Content-Type': 'application/json-patch+json'})
+    )
+    assert response.status_code == 409
+    assert _stored(site_id)['version'] == 0
+
+def test_patch_retries_on_a_version_written_in_between(app, client, monkeypatch):
+    site_id = _insert_site()
+    find_one = mongo.db.websites.find_one
+    calls = []
+
+    def find_one_racing(*args, **kwargs):
+        site = find_one(*args, **kwargs)
+        if not calls:
+            # Another writer commits right after the first read
+            mongo.db.websites.update_one({'_id': ObjectId(site_id)}, {'$inc': {'version': 1}})
+        calls.append(1)
+        return site
+
+    monkeypatch.setattr(mongo.db.websites, 'find_one', find_one_racing)
+    response = client.patch(f'/api/{site_id}', json={'content': {'title': 'Retried'}}, headers=_headers(app))
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 2
+    stored = find_one({'_id': ObjectId(site_id)})
+    assert has_current_view(stored)
+    assert stored['view']['title'] == 'Retried'
+
+def test_editor_cannot_patch_someone_elses_site(app, client):
+    site_id = _insert_site(owner='u2')
+    response = client.patch(f'/api/{site_id}', json={'industry': 'retail'}, headers=_headers(app))
+    assert response.status_code == 403
+
+def test_regenerate_section_stores_the_view_model(app, client):
+    site_id = _insert_site()
+    response = client.post(f'/api/{site_id}/regenerate/hero_section', headers=_headers(app))
+    assert response.status_code == 200
+    stored = _stored(site_id)
+    assert has_current_view(stored)
+    assert stored['view']['hero_heading'] == stored['content']['hero_section']['heading']
+
+def test_list_websites_returns_pages(app, client):
+    site_ids = [_insert_site() for _ in range(3)]
+    first = client.get('/api/?limit=2', headers=_headers(app)).get_json()
+    assert [item['_id'] for item in first['items']] == site_ids[:2]
+    second = client.get(f"/api/?limit=2&after={first['next_after']}", headers=_headers(app)).get_json()
+    assert [item['_id'] for item in second['items']] == site_ids[2:]
+    assert second['next_after'] is None
+
+def test_list_websites_cursor_error_is_a_500(app, client, monkeypatch):
+    _insert_site()
+
+    def failing_cursor():
+        raise RuntimeError('connection reset')
+        yield
+
+    monkeypatch.setattr('app.routes.website.find_page', lambda *args: failing_cursor())
+    response = client.get('/api/', headers=_headers(app))
+    assert response.status_code == 500